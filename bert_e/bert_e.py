@@ -14,39 +14,103 @@
 # limitations under the License.
 
 import argparse
+import itertools
 import logging
+import threading
 from collections import OrderedDict, deque
+from contextlib import nullcontext
 from datetime import datetime
 from os.path import exists
-from queue import Queue
+from queue import Empty, Queue
 from urllib.parse import quote_plus
 
 from .exceptions import (BertE_Exception, InternalException, JobFailure,
                          SilentException, TemplateException,
                          UnsupportedTokenType)
 from .git_host import client_factory
-from .job import CommitJob, JobDispatcher, PullRequestJob
+from .job import (CommitJob, CompletedJob, JobDispatcher, JobHistory,
+                  PullRequestJob)
+from .lib.cache import Cache
+from .lib.deadline import Deadline, DeadlineExceeded
 from .lib.git import Repository as GitRepository
+from .lib.maintenance import Maintenance
+from .lib.metrics import Counter, Histogram
 from .settings import setup_settings
 from .workflow import gitwaterflow as gwf
-from .workflow.gitwaterflow.branches import QueueBranch, QueueIntegrationBranch
+from .workflow.gitwaterflow.commit_index import CommitIndex
+from .workflow.gitwaterflow.fingerprint import Outcomes
+from .workflow.gitwaterflow.jira import prefetch_issues
+from .workflow.gitwaterflow.speculation import Speculation
+from .workflow.gitwaterflow.branches import (QueueBranch,
+                                             QueueIntegrationBranch,
+                                             ValidatedQueues)
 
 SHA1_LENGTH = [12, 40]
 LOG = logging.getLogger(__name__)
 
+JOB_DURATION = Histogram(
+    'bert_e_job_duration_seconds',
+    'Duration of the jobs, by job type and final status.',
+    ['type', 'status'],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+MERGED_PULL_REQUESTS = Counter(
+    'bert_e_merged_pull_requests_total',
+    'Pull requests merged by Bert-E.')
+REQUEUED_JOBS = Counter(
+    'bert_e_requeued_jobs_total',
+    'Jobs run again after they ran out of time, by job type.',
+    ['type'])
+
+# number of times a job that runs out of time is run, at most
+MAX_JOB_ATTEMPTS = 3
+
+# time, in seconds, prefetched Jira issues are kept for their job
+JIRA_ISSUE_TTL = 300
+
+# branches that narrow clones always fetch: Bert-E pushes them, and leases
+# their remote-tracking branches
+INTEGRATION_BRANCHES = ('q/*', 'w/*')
+
+_STATUS_GENERATIONS = itertools.count(1)
+
+
+def client_args(settings):
+    """Return the arguments of the git host client for `settings`."""
+    return (
+        settings.repository_host,
+        settings.robot.username,
+        settings.robot_password,
+        settings.robot_email,
+        settings.github_app_id,
+        settings.github_installation_id,
+        settings.github_private_key,
+    )
+
 
 class BertE(JobDispatcher):
-    def __init__(self, settings):
+    # Changes each time the inspectable status or the job lists are updated
+    status_generation = 0
+    # Durable webhook inbox, set by the server when enabled
+    inbox = None
+    # Scheduler running the jobs, when shared with other instances
+    scheduler = None
+    # Delay, in seconds, before a job that ran out of time is run again,
+    # doubled at each attempt
+    requeue_delay = 60
+
+    def __init__(self, settings, client=None, object_store=None):
+        """Set up Bert-E on the repository described by `settings`.
+
+        Args:
+            settings (SettingsDict): settings of the repository.
+            client (AbstractClient): git host client to use, shared with
+                other instances; a new one is created by default.
+            object_store (str): path of the git object store shared with
+                other instances, if any.
+
+        """
         self.settings = settings
-        self.client = client_factory(
-            settings.repository_host,
-            settings.robot.username,
-            settings.robot_password,
-            settings.robot_email,
-            settings.github_app_id,
-            settings.github_installation_id,
-            settings.github_private_key,
-        )
+        self.client = client or client_factory(*client_args(settings))
         if settings.repository_host == 'bitbucket':
             self.settings.robot.account_id = self.client.get_user_id()
         self.project_repo = self.client.get_repository(
@@ -54,34 +118,83 @@ class BertE(JobDispatcher):
             slug=settings.repository_slug
         )
         settings['use_queue'] = not settings.disable_queues
+        branches = settings.fetch_branches
+        if branches:
+            branches = list(branches) + [
+                pattern for pattern in INTEGRATION_BRANCHES
+                if pattern not in branches]
 
         self.git_repo = GitRepository(
             self.project_repo.git_url,
-            mask_pwd=quote_plus(settings.robot_password)
+            mask_pwd=quote_plus(settings.robot_password),
+            object_store=object_store,
+            branches=branches,
+            clone_filter=settings.clone_filter
         )
         self.tmpdir = self.git_repo.tmp_directory
-        gwf.setup({key: True for key in settings.cmd_line_options})
+        self.maintenance = None
+        if settings.git_maintenance_budget > 0:
+            self.maintenance = Maintenance(
+                self.git_repo.cache_path, settings.git_maintenance_budget,
+                name='%s/%s' % (settings.repository_owner,
+                                settings.repository_slug))
+        self.speculation = None
+        if settings.speculative_evaluation:
+            self.speculation = Speculation()
+        self.outcomes = None
+        if settings.evaluation_fingerprints:
+            self.outcomes = Outcomes()
+        self.commit_index = None
+        if settings.commit_index:
+            self.commit_index = CommitIndex()
+            self.git_repo.push_hooks.append(self.commit_index.update_heads)
+        self.jira_issues = None
+        if settings.prefetch_jira_issues:
+            self.jira_issues = Cache(ttl=JIRA_ISSUE_TTL)
+        # the cmd_line_options are applied to each job, see handle_options
+        gwf.setup()
 
         self.task_queue = Queue()
-        self.tasks_done = deque(maxlen=1000)
+        self.tasks_done = JobHistory(maxlen=1000)
         self.status = {}  # TODO: implement a proper status class
+        self.validated_queues = ValidatedQueues()
 
-    def process_task(self):
+    def process_task(self, timeout=None):
         """Pop one task off of the task queue and process it.
 
         This method is called in an infinite loop and a dedicated thread when
         BertE is being run as a server.
 
-        """
-        job = self.status['current job'] = self.task_queue.get()
+        Args:
+            timeout (float): time to wait for a task, None to wait forever.
+
+        Returns:
+            The job processed, None if no task came in time.
 
+        """
+        try:
+            job = self.task_queue.get(timeout=timeout)
+        except Empty:
+            return None
+        self.status['current job'] = job
+        self.status_changed()
+
+        budget = self.settings.job_time_budget
+        deadline = Deadline(budget) if budget > 0 else None
+        out_of_time = False
         try:
-            self.process(job)
+            with job.trace.activate(), \
+                    deadline.activate() if deadline else nullcontext():
+                self.process(job)
         except Exception as err:
             job.status = type(err).__name__
             job.details = None
 
-            if not isinstance(err, (BertE_Exception, InternalException)):
+            if isinstance(err, DeadlineExceeded):
+                out_of_time = True
+                job.details = str(err)
+                LOG.warning("Job '%s' ran out of time: %s", job, err)
+            elif not isinstance(err, (BertE_Exception, InternalException)):
                 LOG.exception("Job '%s' finished with an error.", job)
                 job.details = str(err)
             elif isinstance(err, JobFailure):
@@ -91,49 +204,251 @@ class BertE(JobDispatcher):
         finally:
             job.complete()
             self.task_queue.task_done()
-            LOG.info("It took Bert-E %s to handle job %s (%s)",
-                     datetime.now() - job.start_time, job, job.status)
-            self.tasks_done.appendleft(job)
+            JOB_DURATION.observe(job.duration.total_seconds(), type=job.type,
+                                 status=job.status or 'unknown')
+            LOG.info("It took Bert-E %s to handle job %s (%s) [%s]",
+                     datetime.now() - job.start_time, job, job.status,
+                     job.trace)
+            self.tasks_done.appendleft(CompletedJob(job))
             self.status.pop('current job')
+            self.status_changed()
+        # the inbox entries of a requeued job are acknowledged once it is
+        # run again, so that it is replayed if Bert-E restarts meanwhile
+        if not (out_of_time and self.requeue(job)) and self.inbox is not None:
+            self.inbox.ack(job.inbox_entries)
         return job
 
+    def requeue(self, job):
+        """Run a job that ran out of time again, once the other jobs had
+        their turn.
+
+        The job is queued again after a delay that doubles with each attempt,
+        and given up after MAX_JOB_ATTEMPTS attempts.
+
+        Returns:
+            bool: True if the job will be run again.
+
+        """
+        if job.attempt >= MAX_JOB_ATTEMPTS:
+            LOG.error("Job '%s' ran out of time %d times, giving up",
+                      job, job.attempt)
+            return False
+        try:
+            new_job = job.requeue()
+        except Exception:
+            LOG.exception("Failed to requeue job '%s'", job)
+            return False
+        if new_job is None:
+            return False
+        new_job.inbox_entries = job.inbox_entries
+        delay = self.requeue_delay * 2 ** (job.attempt - 1)
+        LOG.info("Job '%s' will run again in %ds", job, delay)
+        REQUEUED_JOBS.inc(type=job.type)
+        timer = threading.Timer(delay, self.put_requeued_job, [new_job])
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def put_requeued_job(self, job):
+        """Put a job that ran out of time back in the task queue.
+
+        Its inbox entries are acknowledged if a similar job is already queued.
+
+        """
+        if not self.put_job(job) and self.inbox is not None:
+            self.inbox.ack(job.inbox_entries)
+
+    def idle(self):
+        """Make use of the time there is no job to process.
+
+        Must not be called while a job is processed, as both use the git
+        clone.
+
+        Returns:
+            bool: True if some work was done.
+
+        """
+        maintained = self.maintain()
+        reconciled = self.reconcile_commit_index()
+        return self.speculate() or maintained or reconciled
+
+    def maintain(self):
+        """Run the maintenance of the git cache that is due, if enabled.
+
+        Returns:
+            bool: True if maintenance tasks were run.
+
+        """
+        if self.maintenance is None:
+            return False
+        try:
+            return bool(self.maintenance.run())
+        except Exception:
+            LOG.exception('Failed to maintain the git cache')
+            return False
+
+    def reconcile_commit_index(self):
+        """Rebuild the index of the commits from the remote heads and the
+        open pull requests, if enabled and due.
+
+        Returns:
+            bool: True if the index was rebuilt.
+
+        """
+        if self.commit_index is None or not self.commit_index.due():
+            return False
+        try:
+            self.commit_index.reconcile(
+                self.git_repo.get_remote_heads(refresh_cache=True),
+                list(self.project_repo.get_pull_requests()))
+        except Exception:
+            LOG.exception('Failed to reconcile the index of the commits')
+            return False
+        return True
+
+    def prefetch_jira_issues(self, job):
+        """Fetch the Jira issues of the pull request of a job and of the
+        pull requests waiting in the task queue, if enabled.
+
+        The issues are fetched with a single search and kept for the jobs of
+        these pull requests.
+
+        """
+        if self.jira_issues is None or not isinstance(job, PullRequestJob):
+            return
+        with self.task_queue.mutex:
+            queued = list(self.task_queue.queue)
+        pull_requests = [job.pull_request] + [
+            queued_job.pull_request for queued_job in queued
+            if isinstance(queued_job, PullRequestJob)]
+        try:
+            prefetch_issues(self, pull_requests)
+        except Exception:
+            LOG.exception('Failed to prefetch the Jira issues')
+
+    def speculate(self):
+        """Pre-evaluate the pull requests handled recently, if enabled,
+        until a job comes in.
+
+        Returns:
+            bool: True if a pull request was evaluated.
+
+        """
+        if self.speculation is None:
+            return False
+        pr_id = self.speculation.next_candidate()
+        if pr_id is None:
+            return False
+        evaluated = False
+        checked = set()
+        self.git_repo.reset()
+        try:
+            # each pull request is checked once per call
+            while pr_id is not None and pr_id not in checked and \
+                    self.task_queue.empty():
+                checked.add(pr_id)
+                try:
+                    job = PullRequestJob(
+                        bert_e=self,
+                        pull_request=self.project_repo.get_pull_request(
+                            int(pr_id)))
+                    evaluated = gwf.speculate(job) or evaluated
+                except BertE_Exception as err:
+                    # the next job will stop at the same point
+                    LOG.debug('Pull request #%s not pre-evaluated: %r',
+                              pr_id, err)
+                    self.git_repo.reset()
+                except Exception:
+                    LOG.exception('Failed to pre-evaluate pull request #%s',
+                                  pr_id)
+                    # the work copy may be in any state
+                    self.git_repo.reset()
+                pr_id = self.speculation.next_candidate()
+        finally:
+            self.git_repo.reset()
+        return evaluated
+
     def get_job_as_json(self, job_id):
         """Get a single job from the task queue or done queue."""
         current_job = self.status.get('current job', None)
         if current_job and str(current_job.id) == job_id:
-            return current_job.as_json()
+            return current_job.as_json(spans=True)
 
         for job in self.task_queue.queue:
             if str(job.id) == job_id:
-                return job.as_json()
+                return job.as_json(spans=True)
 
-        for job in self.tasks_done:
-            if str(job.id) == job_id:
-                return job.as_json()
+        job = self.tasks_done.get(job_id)
+        if job is not None:
+            return job.as_json(spans=True)
 
         return None
 
-    def get_jobs_as_json(self):
-        """Get list of all jobs as JSON."""
+    def get_jobs_as_json(self, limit=None, cursor=None, status=None,
+                         job_type=None, since=None):
+        """Get a list of jobs as JSON.
+
+        The current and pending jobs come first, then the completed jobs,
+        most recent first. The list of completed jobs can be browsed page
+        by page, see JobHistory.page.
+
+        Args:
+            limit (int): maximum number of completed jobs listed.
+            cursor (int): cursor of the page of completed jobs to list; the
+                current and pending jobs are only listed with the first one.
+            status (str): only list the jobs with this status.
+            job_type (str): only list the jobs of this type.
+            since (datetime): only list the jobs started since then.
+
+        Returns:
+            tuple: the JSON list of jobs, and the cursor of the next page of
+                completed jobs, None if there is none.
+
+        """
+        def match(job):
+            return ((status is None or job.status == status) and
+                    (job_type is None or job.type == job_type) and
+                    (since is None or job.start_time >= since))
+
         jobs = []
-        current_job = self.status.get('current job', None)
-        if current_job:
-            jobs = [current_job.as_json()]
-        for job in self.task_queue.queue:
-            jobs.append(job.as_json())
-        for job in self.tasks_done:
-            jobs.append(job.as_json())
-        return "[" + ",".join(jobs) + "]"
+        if cursor is None:
+            current_job = self.status.get('current job', None)
+            if current_job:
+                jobs.append(current_job)
+            jobs.extend(self.task_queue.queue)
+            jobs = [job for job in jobs if match(job)]
+        done, next_cursor = self.tasks_done.page(limit, cursor, match)
+        jobs = [job.as_json() for job in jobs + done]
+        return "[" + ",".join(jobs) + "]", next_cursor
+
+    def is_superseded(self, job):
+        """Return True if a newer job on the same pull request is waiting in
+        the task queue.
+
+        Jobs requested by a user through the API are never superseded.
+
+        """
+        if job.user:
+            return False
+        return any(job == queued for queued in list(self.task_queue.queue))
 
     def put_job(self, job):
         """Put a job and ensure there is not any similar job in the
         tasks queue.
+
+        Returns:
+            bool: False if a similar job was already queued.
+
         """
         if job not in self.task_queue.queue:
             self.task_queue.put(job)
+            self.status_changed()
             LOG.info('Adding job %r', job)
-        else:
-            LOG.info('Job %r already present in the queue. Skipping.')
+            if self.scheduler is not None:
+                self.scheduler.notify()
+            return True
+        LOG.info('Job %r already present in the queue. Skipping.', job)
+        return False
 
     def process(self, job):
         """High-level job-processing method."""
@@ -141,6 +456,7 @@ class BertE(JobDispatcher):
         # can't handle this yet, so we explicitely reset the repo before any
         # new run.
         self.git_repo.reset()
+        self.prefetch_jira_issues(job)
         try:
             return self.dispatch(job)
         except SilentException as err:
@@ -150,6 +466,9 @@ class BertE(JobDispatcher):
         except TemplateException as err:
             return self._process_error(err)
 
+        except DeadlineExceeded:
+            raise
+
         except Exception as err:
             LOG.exception("Exception raised: %s", err)
             raise
@@ -210,6 +529,8 @@ class BertE(JobDispatcher):
         """
         merged_prs = self.status.setdefault('merged PRs', deque(maxlen=5))
         merged_prs.append({'id': pr_id, 'merge_time': datetime.now()})
+        MERGED_PULL_REQUESTS.inc()
+        self.status_changed()
 
     def update_queue_status(self, queue_collection):
         """Set the inspectable merge queue status.
@@ -237,6 +558,16 @@ class BertE(JobDispatcher):
                 status[branch.pr_id].append((version,
                                              branch.get_latest_commit()))
         self.status['merge queue'] = status
+        self.status_changed()
+
+    def status_changed(self):
+        """Signal a change of the status or the job lists.
+
+        Views derived from them (e.g. the status page) are recomputed the
+        next time they are requested.
+
+        """
+        self.status_generation = next(_STATUS_GENERATIONS)
 
 
 def setup_parser():
@@ -593,3 +593,7 @@ class JobFailure(SilentException):
 
 class QueueBuildFailed(SilentException):
     code = 309
+
+
+class Superseded(SilentException):
+    code = 310
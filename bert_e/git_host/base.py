@@ -19,6 +19,7 @@ Typical implementations would be Bitbucket, Github or Gitlab.
 """
 
 import logging
+import re
 import time
 
 import requests
@@ -26,8 +27,11 @@ import requests
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
 from typing import Iterable
+from urllib.parse import urlsplit
 from requests import Session
 
+from bert_e.lib import deadline, trace
+from bert_e.lib.metrics import Counter, Gauge
 from bert_e.lib.schema import (load as load_schema,
                                validate as validate_schema,
                                dumps as dump_schema)
@@ -35,6 +39,33 @@ from ..exceptions import FlakyGitHost
 
 LOG = logging.getLogger(__name__)
 
+API_REQUESTS = Counter(
+    'bert_e_api_requests_total',
+    'Git host API requests, by endpoint and response status code.',
+    ['method', 'endpoint', 'status'])
+API_REQUEST_SECONDS = Counter(
+    'bert_e_api_request_seconds_total',
+    'Time spent in git host API requests, by endpoint.',
+    ['method', 'endpoint'])
+API_RATE_LIMIT_REMAINING = Gauge(
+    'bert_e_api_rate_limit_remaining',
+    'Remaining git host API calls in the current rate limit window.')
+
+# Path segments that would give each object its own time series.
+_ENDPOINT_PATTERNS = [
+    (re.compile(r'/(refs|branches)/.+$'), r'/\1/:ref'),
+    (re.compile(r'/[0-9a-f]{7,40}(?=/|$)'), '/:sha'),
+    (re.compile(r'/\d+(?=/|$)'), '/:id'),
+]
+
+
+def endpoint(url):
+    """Return the path of an API URL, with object identifiers masked."""
+    path = urlsplit(url).path
+    for pattern, replacement in _ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
 
 class Error(Exception):
     """Base class for git host api related errors."""
@@ -64,8 +95,17 @@ class BertESession(Session):
     def request(self, method, url, **kwargs):
         max_attempts = 2
         for attempt in range(1, max_attempts + 1):
+            # bounded by the job's remaining time budget
+            kwargs['timeout'] = deadline.timeout(kwargs.get('timeout'))
             try:
-                response = super().request(method, url, **kwargs)
+                start = time.monotonic()
+                with trace.span('api', '{} {}'.format(
+                        method.upper(), urlsplit(url).path)):
+                    response = super().request(method, url, **kwargs)
+                self._record(method, url, response.status_code, start)
+                remaining = response.headers.get('X-RateLimit-Remaining')
+                if isinstance(remaining, str) and remaining.isdigit():
+                    API_RATE_LIMIT_REMAINING.set(int(remaining))
                 LOG.info("request: {method} {url} {status} {time}".format(
                     method=response.request.method,
                     url=response.request.url,
@@ -73,7 +113,10 @@ class BertESession(Session):
                     time=response.elapsed.microseconds
                 ))
             except Exception:
+                self._record(method, url, 'error', start)
                 LOG.error('{method} {url}'.format(method=method, url=url))
+                # a request cut short by the deadline did not fail
+                deadline.check()
                 raise
 
             if response.status_code not in [429, 500, 502]:
@@ -81,7 +124,7 @@ class BertESession(Session):
 
             nap = 30 * attempt
             LOG.error('sleeping {nap}s'.format(nap=nap))
-            time.sleep(nap)
+            deadline.sleep(nap)
             if attempt < max_attempts:
                 LOG.error('retrying request {method} {url}'.format(
                     method=method, url=url))
@@ -93,6 +136,13 @@ class BertESession(Session):
 
         return response
 
+    @staticmethod
+    def _record(method, url, status, start):
+        method, path = method.upper(), endpoint(url)
+        API_REQUESTS.inc(method=method, endpoint=path, status=status)
+        API_REQUEST_SECONDS.inc(time.monotonic() - start, method=method,
+                                endpoint=path)
+
 
 class AbstractGitHostObject(metaclass=ABCMeta):
     """Abstract githaost defining schema validation"""
@@ -1,4 +1,4 @@
-from bert_e.lib.lru_cache import LRUCache
-from collections import defaultdict, OrderedDict
+from bert_e.lib.cache import CacheFamily
 
-BUILD_STATUS_CACHE = defaultdict(LRUCache)  # type: OrderedDict[str, LRUCache]
+# build statuses of commits, by build key
+BUILD_STATUS_CACHE = CacheFamily()
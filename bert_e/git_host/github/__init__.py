@@ -15,14 +15,15 @@ import json
 import logging
 import time
 from functools import lru_cache
-from collections import defaultdict, namedtuple
+from collections import namedtuple
 from itertools import groupby
 from jwt import JWT, jwk_from_pem
 
 from requests import HTTPError
 from urllib.parse import quote_plus as quote
 
-from bert_e.lib.lru_cache import LRUCache
+from bert_e.lib.cache import Cache, CacheFamily
+from bert_e.lib.metrics import Counter
 from . import schema
 from .. import base, cache, factory
 
@@ -35,6 +36,19 @@ class Error(base.Error):
 
 CacheEntry = namedtuple('CacheEntry', ['obj', 'etag', 'date'])
 
+# bound of the size of the responses kept for each request method
+QUERY_CACHE_WEIGHT = 64 * 1024 ** 2
+
+
+def _response_size(entry):
+    return len(entry.obj.content or b'')
+
+
+BOT_STATUS_WRITES_AVOIDED = Counter(
+    'bert_e_bot_status_writes_avoided_total',
+    'Bot statuses not sent, as the same one was published on the same '
+    'commit already.')
+
 
 @factory.api_client('github')
 class Client(base.AbstractClient):
@@ -58,7 +72,11 @@ class Client(base.AbstractClient):
         self.email = email
         self.org = org
         self.base_url = base_url.rstrip('/')
-        self.query_cache = defaultdict(LRUCache)
+        self.query_cache = CacheFamily(max_weight=QUERY_CACHE_WEIGHT,
+                                       weigher=_response_size)
+        # last bot status published on each pull request and commit, with
+        # the check run holding it
+        self.bot_statuses = Cache()
         self.accept_header = accept_header
 
         self.session.headers.update(self.headers)
@@ -850,10 +868,25 @@ class PullRequest(base.AbstractGitHostObject, base.AbstractPullRequest):
         else:
             conclusion = None
 
-        self._add_checkrun(
-            name='bert-e', status=status, conclusion=conclusion,
-            title=title, summary=summary
-        )
+        statuses = getattr(self.client, 'bot_statuses', None)
+        key = (self.repo.owner, self.repo.slug, self.id, self.src_commit)
+        published = (status, conclusion, title, summary)
+        known = statuses.get(key) if statuses is not None else None
+        if known is not None and known[0] == published:
+            LOG.debug("Bot status '%s' already published", title)
+            BOT_STATUS_WRITES_AVOIDED.inc()
+            return
+        if known is not None and known[0][0] != 'completed':
+            # completed check runs can't be set in progress again
+            check_run = self._update_checkrun(
+                known[1], status=status, conclusion=conclusion,
+                title=title, summary=summary)
+        else:
+            check_run = self._add_checkrun(
+                name='bert-e', status=status, conclusion=conclusion,
+                title=title, summary=summary)
+        if statuses is not None:
+            statuses.set(key, (published, check_run.id))
 
     def _add_checkrun(
             self, name: str, status: str, conclusion: str | None,
@@ -876,6 +909,25 @@ class PullRequest(base.AbstractGitHostObject, base.AbstractPullRequest):
             owner=self.repo.owner, repo=self.repo.slug
         )
 
+    def _update_checkrun(
+            self, check_run_id: int, status: str, conclusion: str | None,
+            title: str, summary: str):
+        data = {
+            'status': status,
+            'output': {
+                'title': title,
+                'summary': summary,
+            },
+        }
+        if conclusion is not None:
+            data['conclusion'] = conclusion
+        LOG.debug(data)
+        return CheckRun.update(
+            client=self.client,
+            data=data,
+            owner=self.repo.owner, repo=self.repo.slug, id=check_run_id
+        )
+
     def get_comments(self):
         return Comment.list(self.client, url=self.data['comments_url'])
 
@@ -1025,6 +1077,7 @@ class CheckRun(base.AbstractGitHostObject):
 
     SCHEMA = schema.CheckRun
     CREATE_SCHEMA = schema.CreateCheckRun
+    UPDATE_SCHEMA = schema.UpdateCheckRun
 
     @property
     def name(self) -> str:
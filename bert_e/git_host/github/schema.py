@@ -132,6 +132,12 @@ class CreateCheckRun(GitHubSchema):
     output = fields.Nested(Output)
 
 
+class UpdateCheckRun(GitHubSchema):
+    status = fields.Str()
+    conclusion = fields.Str(allow_none=True)
+    output = fields.Nested(Output)
+
+
 class WorkflowRun(GitHubSchema):
     id = fields.Integer()
     head_sha = fields.Str()
@@ -18,6 +18,8 @@ possibly short-lived information needed to process it.
 
 """
 
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 from typing import Callable
@@ -28,6 +30,10 @@ from marshmallow import Schema, fields
 from bert_e.lib.dispatcher import Dispatcher
 from bert_e.lib.settings_dict import SettingsDict
 from bert_e.lib.schema import dumps as dump_schema
+from bert_e.lib.trace import Trace
+
+# number of spans kept in the trace of a completed job, the longest ones
+HISTORY_SPANS = 50
 
 
 class JobSchema(Schema):
@@ -40,6 +46,7 @@ class JobSchema(Schema):
     url = fields.Url(dump_only=True, allow_none=True)
     user = fields.Str(dump_only=True, allow_none=True)
     settings = fields.Dict()
+    trace = fields.Dict(dump_only=True)
 
 
 class Job:
@@ -55,10 +62,28 @@ class Job:
         self.details = ''
         self.type = self.__class__.__name__
         self.user = user
+        self.trace = Trace()
+        # ids of the webhook inbox entries that led to this job
+        self.inbox_entries = []
+        # number of times the job was run, see requeue()
+        self.attempt = 1
 
     def complete(self):
         self.end_time = datetime.now()
 
+    def requeue(self):
+        """Return a new job to run this one again, None if it can't be.
+
+        Used when the job ran out of time, to run it again once the other
+        jobs had their turn.
+
+        """
+        return None
+
+    def _requeued(self, job):
+        job.attempt = self.attempt + 1
+        return job
+
     @property
     def duration(self) -> timedelta:
         if not self.end_time:
@@ -78,7 +103,7 @@ class Job:
     def done(self):
         return self.end_time is not None
 
-    def as_dict(self):
+    def as_dict(self, spans=False):
         return {
             'id': self.id,
             'start_time': self.start_time,
@@ -88,23 +113,19 @@ class Job:
             'type': self.type,
             'user': self.user,
             'url': self.url,
-            'settings': self.settings.maps[0]
+            'settings': self.settings.maps[0],
+            'trace': self.trace.as_dict(spans=spans),
         }
 
-    def as_json(self):
-        data = self.as_dict()
+    def as_json(self, spans=False):
+        """Serialize the job.
 
-        def set2list(value):
-            if isinstance(value, set):
-                return list(value)
-            return value
-
-        # sets are not serializable, so convert sets that may come from PR
-        # options such as after_pull_requests to lists
-        settings = {k: set2list(v) for k, v in data['settings'].items()}
-        data['settings'] = settings
+        Args:
+            spans (bool): include the detail of the job's trace (every git
+                command and API call), and not only its per-phase summary.
 
-        return dump_schema(JobSchema, data)
+        """
+        return _dump(self.as_dict(spans=spans))
 
     def __str__(self):
         return '{}(id={})'.format(type(self).__name__, self.id)
@@ -120,6 +141,152 @@ class Job:
         )
 
 
+def _dump(data):
+    """Serialize the data of a job (see Job.as_dict)."""
+    def serializable(value):
+        if isinstance(value, set):
+            return list(value)
+        if isinstance(value, (str, int, float, list, dict, type(None))):
+            return value
+        return str(value)
+
+    # sets are not serializable, so convert sets that may come from PR
+    # options such as after_pull_requests to lists, and objects such as the
+    # branches set by jobs to their name
+    settings = {k: serializable(v) for k, v in data['settings'].items()}
+    data['settings'] = settings
+
+    return dump_schema(JobSchema, data)
+
+
+class CompletedJob(object):
+    """Compact record of a completed job, as kept in Bert-E's history.
+
+    It only holds what is shown of the job (see Job.as_dict): the job's pull
+    request, git state, settings chain and reference to Bert-E are released,
+    and only the phase totals and the longest spans of its trace are kept.
+
+    """
+    __slots__ = ('id', 'start_time', 'end_time', 'status', 'details', 'type',
+                 'user', 'url', 'settings', 'trace', '_str', '_json')
+
+    done = True
+    duration = Job.duration
+
+    def __init__(self, job):
+        self.id = job.id
+        self.start_time = job.start_time
+        self.end_time = job.end_time
+        self.status = job.status
+        self.details = job.details
+        self.type = job.type
+        self.user = job.user
+        self.url = job.url
+        self.settings = dict(job.settings.maps[0])
+        self.trace = job.trace
+        self.trace.compact(max_spans=HISTORY_SPANS)
+        self._str = str(job)
+        # the record doesn't change anymore: serialize it once and for all
+        self._json = Job.as_json(self)
+
+    def as_json(self, spans=False):
+        if spans:
+            return Job.as_json(self, spans=True)
+        return self._json
+
+    def as_dict(self, spans=False):
+        return {
+            'id': self.id,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'status': self.status,
+            'details': self.details,
+            'type': self.type,
+            'user': self.user,
+            'url': self.url,
+            'settings': self.settings,
+            'trace': self.trace.as_dict(spans=spans),
+        }
+
+    def __str__(self):
+        return self._str
+
+    def __repr__(self):
+        return 'CompletedJob({}, start_time={}, url={})'.format(
+            self._str, self.start_time, self.url)
+
+
+class JobHistory(object):
+    """History of the completed jobs, most recent first.
+
+    The jobs are numbered in the order they are added, so that the history
+    can be browsed page by page (see `page`) while new jobs are added, and
+    indexed by id.
+
+    Args:
+        maxlen (int): number of jobs kept; the oldest ones are dropped.
+
+    """
+
+    def __init__(self, maxlen=1000):
+        self.maxlen = maxlen
+        self._jobs = deque(maxlen=maxlen)
+        self._by_id = {}
+        # number of the most recent job
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def appendleft(self, job):
+        """Add a job to the history."""
+        with self._lock:
+            if len(self._jobs) == self.maxlen:
+                self._by_id.pop(str(self._jobs[-1].id), None)
+            self._jobs.appendleft(job)
+            self._by_id[str(job.id)] = job
+            self._last += 1
+
+    def get(self, job_id):
+        """Return the job of the given id, None if it isn't in the history."""
+        return self._by_id.get(str(job_id))
+
+    def page(self, limit=None, cursor=None, match=None):
+        """Return some of the jobs, and the cursor to get the next ones.
+
+        Args:
+            limit (int): maximum number of jobs returned, all of them if None.
+            cursor (int): cursor returned with the previous page, None to
+                start with the most recent job.
+            match (callable): only return the jobs it returns True for.
+
+        Returns:
+            tuple: the list of jobs, and the cursor of the next page, None if
+                there is none.
+
+        """
+        with self._lock:
+            jobs = list(self._jobs)
+            last = self._last
+        start = 0 if cursor is None else max(last - cursor, 0)
+        found = []
+        for index in range(start, len(jobs)):
+            job = jobs[index]
+            if match is not None and not match(job):
+                continue
+            if limit is not None and len(found) == limit:
+                return found, last - index
+            found.append(job)
+        return found, None
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __iter__(self):
+        return iter(list(self._jobs))
+
+    def __getitem__(self, index):
+        return self._jobs[index]
+
+
 class RepoJob(Job):
     """Job related to a repository."""
     def __init__(self, project_repo=None, git_repo=None, **kwargs):
@@ -129,6 +296,11 @@ class RepoJob(Job):
             repo=git_repo or self.bert_e.git_repo, cascade=None
         )
 
+    def complete(self):
+        super().complete()
+        # release the cascade and branches the job worked on
+        self.git = SimpleNamespace(repo=self.git.repo, cascade=None)
+
 
 class PullRequestJob(RepoJob):
     """Job triggered when a pull request was updated."""
@@ -137,6 +309,8 @@ class PullRequestJob(RepoJob):
         self.pull_request = pull_request
         self.git.src_branch = None
         self.git.dst_branch = None
+        # reactor the options of the pull request were read with, once read
+        self.reactor = None
 
     @property
     def active_options(self):
@@ -154,6 +328,14 @@ class PullRequestJob(RepoJob):
         return self.bert_e.settings.pull_request_base_url.format(
             pr_id=self.pull_request.id)
 
+    def requeue(self):
+        # the pull request may have changed in the meantime
+        return self._requeued(PullRequestJob(
+            bert_e=self.bert_e,
+            pull_request=self.project_repo.get_pull_request(
+                int(self.pull_request.id))
+        ))
+
     def __str__(self):
         return "Webhook for pull request #{}".format(self.pull_request.id)
 
@@ -174,6 +356,10 @@ class CommitJob(RepoJob):
         return self.bert_e.settings.commit_base_url.format(
             commit_id=self.commit)
 
+    def requeue(self):
+        return self._requeued(CommitJob(bert_e=self.bert_e,
+                                        commit=self.commit))
+
     def __str__(self):
         return "Webhook for commit {}".format(self.commit[:8])
 
@@ -189,6 +375,10 @@ class QueuesJob(RepoJob):
         super().__init__(**kwargs)
         self.force_merge = force_merge
 
+    def requeue(self):
+        return self._requeued(QueuesJob(bert_e=self.bert_e,
+                                        force_merge=self.force_merge))
+
     def __str__(self):
         return "QueuesJob"
 
@@ -0,0 +1,199 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Thread-safe cache with *Least Recently Used* (LRU) eviction and expiry.
+
+A `Cache` is bounded in number of entries and, optionally, in total weight
+(e.g. the size of the cached responses); the least recently added or
+accessed entries are evicted first. Entries may expire after a time to live.
+
+Lookups that found nothing can be cached as well (negative caching): an
+entry set with `set_absent` is returned as `ABSENT`, which tells that the
+value is known not to exist, until it expires.
+
+Caches are shared between the webhook handlers and the worker thread: every
+operation is atomic. Each cache keeps counters of its hits, misses and
+evictions, exported as metrics by the server.
+
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Absent(object):
+    """Value of the entries of known missing values."""
+
+    def __repr__(self):
+        return 'ABSENT'
+
+
+ABSENT = _Absent()
+
+# default time to live of the entries set, see Cache.set
+DEFAULT = object()
+
+
+class Cache(object):
+    """Thread-safe LRU cache, with time to live and weight bounds.
+
+    Args:
+        size (int): maximum number of entries. Defaults to 1000.
+        ttl (float): time, in seconds, entries are kept. Forever if None.
+        negative_ttl (float): time, in seconds, the entries of missing values
+            (see set_absent) are kept. Defaults to `ttl`.
+        max_weight (float): maximum total weight of the entries, unbounded if
+            None.
+        weigher (callable): returns the weight of a value. All values weigh
+            1 by default.
+
+    """
+
+    def __init__(self, size=1000, ttl=None, negative_ttl=DEFAULT,
+                 max_weight=None, weigher=None):
+        self._size = size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is DEFAULT else negative_ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        # key -> (value, expiry time or None, weight)
+        self._entries = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Get an item from the cache.
+
+        Args:
+            - key (hashable): key of the item to get.
+            - default: default value to return if key is absent or expired.
+
+        Returns:
+            The value associated to the key, ABSENT if it is known to be
+            missing, or the default value.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and \
+                    entry[1] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, val, ttl=DEFAULT):
+        """Add an item into the cache.
+
+        If key is already present, move it to top and replace its value.
+        Else, make room in the cache for the new value, by evicting the least
+        recently used entries.
+
+        Args:
+            - key (hashable): key of the new object
+            - val: value to associate to the key
+            - ttl (float): time, in seconds, the item is kept, if not the
+              cache's.
+
+        Returns:
+            val.
+
+        """
+        if ttl is DEFAULT:
+            ttl = self.ttl
+        weight = self.weigher(val) if self.weigher else 1
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (val, expires, weight)
+            self._weight += weight
+            self._shrink(self._size)
+        return val
+
+    def set_absent(self, key):
+        """Record that the value of a key is missing, for `negative_ttl`."""
+        if self.negative_ttl == 0:
+            return
+        self.set(key, ABSENT, ttl=self.negative_ttl)
+
+    def pop(self, key, default=None):
+        """Remove an item from the cache, and return its value."""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def weight(self):
+        """Total weight of the entries."""
+        return self._weight
+
+    @property
+    def size(self) -> int:
+        """Size of the cache."""
+        return self._size
+
+    @size.setter
+    def size(self, val: int):
+        """Setting the size property of the cache allows to redimension it."""
+        with self._lock:
+            self._size = val
+            self._shrink(val)
+
+    def _remove(self, key):
+        val, _, weight = self._entries.pop(key)
+        self._weight -= weight
+        return val
+
+    def _shrink(self, size):
+        while self._entries and (
+                len(self._entries) > size or
+                self.max_weight is not None and
+                self._weight > self.max_weight):
+            _, (_, _, weight) = self._entries.popitem(last=False)
+            self._weight -= weight
+            self.evictions += 1
+
+
+class CacheFamily(dict):
+    """Caches by name, created on first use with the same options.
+
+    Args:
+        **options: the options of the caches (see Cache).
+
+    """
+
+    def __init__(self, **options):
+        super().__init__()
+        self.options = options
+
+    def __missing__(self, name):
+        # setdefault is atomic: threads asking for a new cache at once all
+        # get the same one
+        return self.setdefault(name, Cache(**self.options))
@@ -0,0 +1,129 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time budget of the job being processed.
+
+A `Deadline` is activated for the current thread while a job is processed,
+the same way its trace is, so that low-level code (git commands, HTTP
+sessions, retries) can bound its waits by what is left of the job's budget:
+
+    >>> with Deadline(600).activate():
+    ...     cmd('git fetch', timeout=timeout(300))
+    ...     sleep(120)
+
+Each operation gets the lesser of its own limit and the remaining budget.
+Once the budget is spent, `DeadlineExceeded` is raised instead of waiting.
+
+Outside of an active deadline, `timeout()` returns the operation's own limit
+and `sleep()` just sleeps.
+
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """The time budget of the job is spent."""
+    pass
+
+
+class Deadline(object):
+    """Time budget of a job.
+
+    Args:
+        budget (float): time, in seconds, the job may take.
+
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+
+    @property
+    def remaining(self):
+        """Time, in seconds, left before the deadline."""
+        return max(self.expires - time.monotonic(), 0)
+
+    def check(self):
+        """Raise DeadlineExceeded if the budget is spent."""
+        if self.remaining <= 0:
+            raise DeadlineExceeded(
+                'The time budget of the job (%ds) is spent' % self.budget)
+
+    def timeout(self, limit=None):
+        """Return the lesser of `limit` and the remaining budget.
+
+        Raises:
+            DeadlineExceeded: if the budget is spent.
+
+        """
+        self.check()
+        if limit is None:
+            return self.remaining
+        return min(limit, self.remaining)
+
+    def sleep(self, delay):
+        """Sleep `delay` seconds, if it ends before the deadline.
+
+        Raises:
+            DeadlineExceeded: if the deadline would pass while sleeping.
+
+        """
+        if delay >= self.remaining:
+            raise DeadlineExceeded(
+                'The time budget of the job (%ds) leaves no time to wait %ds'
+                % (self.budget, delay))
+        time.sleep(delay)
+
+    @contextmanager
+    def activate(self):
+        """Make this deadline the current thread's deadline."""
+        previous = getattr(_local, 'deadline', None)
+        _local.deadline = self
+        try:
+            yield self
+        finally:
+            _local.deadline = previous
+
+
+def current():
+    """Return the deadline active in the current thread, or None."""
+    return getattr(_local, 'deadline', None)
+
+
+def check():
+    """Raise DeadlineExceeded if the active deadline, if any, has passed."""
+    deadline = current()
+    if deadline is not None:
+        deadline.check()
+
+
+def timeout(limit=None):
+    """Return the lesser of `limit` and the active deadline's remaining
+    budget, `limit` if there is no active deadline."""
+    deadline = current()
+    if deadline is None:
+        return limit
+    return deadline.timeout(limit)
+
+
+def sleep(delay):
+    """Sleep `delay` seconds, within the active deadline, if any."""
+    deadline = current()
+    if deadline is None:
+        time.sleep(delay)
+    else:
+        deadline.sleep(delay)
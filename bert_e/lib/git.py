@@ -14,23 +14,58 @@
 
 import logging
 import os
+import re
 import time
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from fnmatch import fnmatchcase
 from shlex import quote
 from shutil import rmtree
 from tempfile import mkdtemp
 
+from . import deadline, trace
+from .metrics import Histogram
 from .simplecmd import CommandError, cmd
 
 LOG = logging.getLogger(__name__)
 
+GIT_COMMAND_DURATION = Histogram(
+    'bert_e_git_command_duration_seconds',
+    'Duration of git subprocesses, by git subcommand.',
+    ['command'])
+
+RefUpdate = namedtuple('RefUpdate', 'name old new')
+
 
 class Repository(object):
-    def __init__(self, url, mask_pwd=''):
+    """Local clone of a remote git repository.
+
+    Args:
+        url (str): url of the remote repository.
+        mask_pwd (str): password to mask in command logs.
+        object_store (str): path of a bare repository shared by several
+            repositories, whose objects are borrowed (through git
+            alternates) instead of being stored by each of them.
+        branches (iterable): glob patterns of the branches to fetch, along
+            with the tags. Other branches are only fetched on demand, with
+            fetch_branch(). Defaults to None, which mirrors all the refs of
+            the remote repository.
+        clone_filter (str): object filter of a partial clone, blob:none for
+            instance. The objects left out are fetched when git needs them,
+            e.g. the blobs of the files touched by a merge. A partial clone
+            doesn't borrow objects from `object_store`.
+
+    """
+    def __init__(self, url, mask_pwd='', object_store=None, branches=None,
+                 clone_filter=None):
         self._url = url
         self.tmp_directory = None
         self.reset()
         self._mask_pwd = mask_pwd
+        self.object_store = object_store
+        self.branches = tuple(branches) if branches else None
+        self.clone_filter = clone_filter or None
+        # callables given the RefUpdates of each push, see push_changes
+        self.push_hooks = []
 
     def __enter__(self):
         return self
@@ -45,6 +80,12 @@ class Repository(object):
         self.cmd_directory = self.tmp_directory
         self._remote_heads = defaultdict(set)
         self._remote_branches = dict()
+        self._remote_shas = defaultdict(set)
+        self._fetched_branches = set()
+        self._partial_cache = None
+        self._git_cache = None
+        # results of the merges, see Branch.merge
+        self.merge_results = None
 
     def delete(self):
         def onerror_cb(func, path, excinfo):
@@ -53,27 +94,72 @@ class Repository(object):
                 'Exception %s raised while removing %s.', errtype, path
             )
 
+        if self._partial_cache:
+            self._move_packs(self._partial_cache)
         rmtree(self.tmp_directory, onerror=onerror_cb)
         self.tmp_directory = None
         self.cmd_directory = None
 
-    def clone(self):
-        """Clone the repository locally."""
-        repo_slug = self._url.split('/')[-1].replace('.git', '')
+    @property
+    def slug(self):
+        """Name of the remote repository, as found in its url."""
+        return self._url.split('/')[-1].replace('.git', '')
 
+    @property
+    def cache_path(self):
+        """Path of the cache of the repository, in ~/.bert-e."""
         top = os.path.expanduser('~/.bert-e/')
-        try:
-            os.mkdir(top)
-        except OSError:
-            pass
-        git_cache = os.path.join(top, repo_slug + '.git')
+        if self.object_store:
+            # repositories sharing a store may have the same slug
+            top = os.path.join(top, self.owner)
+        return os.path.join(top, self.slug + '.git')
+
+    def fetch(self):
+        """Create or update the cache of the repository in ~/.bert-e.
+
+        The cache is only fetched once between two calls to reset().
+
+        Returns:
+            The path of the cache.
+
+        """
+        if self._git_cache:
+            return self._git_cache
+        repo_slug = self.slug
+
+        git_cache = self.cache_path
+        top = os.path.dirname(git_cache)
+        os.makedirs(top, exist_ok=True)
         if not os.path.isdir(git_cache):
             # fixme: isdir() is not a good test of repo existence
             # Clone the git cache in ~/.bert-e/<repo>.git
-            self.cmd('git clone --mirror %s', self._url, cwd=top)
-        else:
+            if self.object_store and not self.clone_filter:
+                self._fill_object_store(repo_slug)
+            if self.branches is not None:
+                self._init_cache(git_cache)
+            elif self.clone_filter:
+                # filters are ignored by local clones, hence --no-local
+                self.cmd('git clone --mirror --no-local --filter=%s %s',
+                         self.clone_filter, self._url, cwd=top)
+            elif self.object_store:
+                self.cmd('git clone --mirror --reference %s %s',
+                         self.object_store, self._url, cwd=top)
+            else:
+                self.cmd('git clone --mirror %s', self._url, cwd=top)
+        elif self.branches is None:
             # Update the git cache
             self.cmd('git fetch --prune', cwd=git_cache)
+        if self.branches is not None:
+            refspecs = self._refspecs() + ['+refs/tags/*:refs/tags/*']
+            self.cmd('git fetch --prune --no-tags origin' +
+                     ' %s' * len(refspecs), *refspecs, cwd=git_cache)
+        self._git_cache = git_cache
+        return git_cache
+
+    def clone(self):
+        """Clone the repository locally."""
+        repo_slug = self.slug
+        git_cache = self.fetch()
 
         # all commands will now execute from repo directory
         self.cmd_directory = os.path.join(self.tmp_directory, repo_slug)
@@ -95,8 +181,135 @@ class Repository(object):
         # original repo
         self.cmd('git remote remove origin')
         self.cmd('git remote add origin %s', self._url)
+        clone_filter = self._get_clone_filter(git_cache)
+        if clone_filter:
+            # the work copy is as partial as the cache it is cloned from
+            self._set_promisor(clone_filter)
+            self._partial_cache = git_cache
+        if self.branches is not None:
+            # keep the next fetches from origin narrow as well
+            self.cmd('git config --unset-all remote.origin.fetch')
+            for refspec in self._refspecs('refs/remotes/origin/'):
+                self.cmd('git config --add remote.origin.fetch %s', refspec)
         # Update the list of remote branches (required if we use 'branch -r')
-        self.cmd('git remote update origin')
+        # from the cache, which was just fetched
+        self.cmd('git fetch --no-tags %s %s',
+                 git_cache, '+refs/heads/*:refs/remotes/origin/*')
+
+    @property
+    def owner(self):
+        """Owner of the remote repository, as found in its url."""
+        return re.split('[/:]', self._url.rstrip('/'))[-2]
+
+    def _refspecs(self, destination='refs/heads/'):
+        """Return the refspecs fetching the branches of the clone."""
+        return ['+refs/heads/{0}:{1}{0}'.format(pattern, destination)
+                for pattern in self.branches or ('*',)]
+
+    def _init_cache(self, git_cache):
+        """Create an empty cache, to fetch some of the branches in.
+
+        It is configured as a mirror, so that it can still be used if the
+        clone stops being narrow.
+
+        """
+        self.cmd('git init --bare %s', git_cache)
+        self.cmd('git remote add --mirror=fetch origin %s', self._url,
+                 cwd=git_cache)
+        if self.clone_filter:
+            self._set_promisor(self.clone_filter, cwd=git_cache)
+        elif self.object_store:
+            alternates = os.path.join(git_cache, 'objects', 'info',
+                                      'alternates')
+            with open(alternates, 'w') as alternates_file:
+                alternates_file.write(os.path.join(
+                    os.path.abspath(self.object_store), 'objects') + '\n')
+
+    def _get_clone_filter(self, git_cache):
+        """Return the filter of the cache if it is a partial clone."""
+        packs = os.path.join(git_cache, 'objects', 'pack')
+        if not any(name.endswith('.promisor') for name in os.listdir(packs)):
+            return None
+        try:
+            return self.cmd('git config remote.origin.partialclonefilter',
+                            cwd=git_cache).strip()
+        except CommandError:
+            return None
+
+    def _set_promisor(self, clone_filter, cwd=None):
+        """Fetch the objects missing from the clone from origin."""
+        cwd = cwd or self.cmd_directory
+        self.cmd('git config core.repositoryformatversion 1', cwd=cwd)
+        self.cmd('git config remote.origin.promisor true', cwd=cwd)
+        self.cmd('git config remote.origin.partialclonefilter %s',
+                 clone_filter, cwd=cwd)
+
+    def keep_objects(self):
+        """Keep the objects created in the work copy in its cache.
+
+        The next work copies, cloned from the cache, find them there even if
+        no branch points to them, until they are pruned.
+
+        """
+        self.cmd('git repack -q')
+        self._move_packs(self.fetch())
+
+    def _move_packs(self, git_cache):
+        """Move the packs of the work copy that its cache doesn't have.
+
+        Blobs are fetched by partial work copies when they are needed, and
+        would be fetched again for the next work copy otherwise.
+
+        """
+        work_packs = os.path.join(self.cmd_directory, '.git', 'objects',
+                                  'pack')
+        cache_packs = os.path.join(git_cache, 'objects', 'pack')
+        try:
+            names = set(os.listdir(work_packs)) - set(os.listdir(cache_packs))
+            # git finds packs through their index, move them last
+            for name in sorted(names, key=lambda name: name.endswith('.idx')):
+                os.replace(os.path.join(work_packs, name),
+                           os.path.join(cache_packs, name))
+        except OSError as err:
+            LOG.warning('Failed to move the packs of %s to %s: %s',
+                        self.cmd_directory, git_cache, err)
+
+    def _fill_object_store(self, repo_slug):
+        """Fetch the repository's branches into the shared object store.
+
+        Repositories sharing most of their history only download and store
+        it once: the following clones find it in the store.
+
+        """
+        if not os.path.isdir(self.object_store):
+            self.cmd('git init --bare %s', self.object_store)
+        refspecs = self._refspecs(
+            'refs/repositories/{}/{}/'.format(self.owner, repo_slug))
+        self.cmd('git fetch --no-tags %s' + ' %s' * len(refspecs),
+                 self._url, *refspecs, cwd=self.object_store)
+
+    def fetch_branch(self, name):
+        """Fetch a branch that the clone doesn't hold.
+
+        This is meant for the source branches of pull requests, which don't
+        match the branches of a narrow clone. Does nothing if the branch was
+        already fetched, and ignores branches that don't exist remotely.
+
+        Args:
+            name (str): name of the branch.
+
+        """
+        if (self.branches is None or name in self._fetched_branches or
+                any(fnmatchcase(name, pattern) for pattern in self.branches)):
+            return
+        try:
+            self.cmd('git fetch --no-tags origin %s %s',
+                     '+refs/heads/{0}:refs/heads/{0}'.format(name),
+                     '+refs/heads/{0}:refs/remotes/origin/{0}'.format(name))
+        except CommandError:
+            LOG.debug('Branch %s could not be fetched', name)
+            return
+        self._fetched_branches.add(name)
 
     def config(self, key, value):
         self.cmd('git config %s %s', key, value)
@@ -104,6 +317,11 @@ class Repository(object):
     def _get_remote_branches(self, force=False):
         """Put remote branch information in cache.
 
+        The branches are read from the cache of the repository, which is
+        fetched if it wasn't yet. They are listed from the remote repository
+        when a refresh is forced, or when the cache doesn't hold all of them
+        (see `branches`).
+
         Args:
             - Force (bool): force cache refresh. Defaults to False.
 
@@ -112,14 +330,20 @@ class Repository(object):
         if not force and (self._remote_branches or self._remote_heads):
             return
         self._remote_heads = defaultdict(set)
+        self._remote_shas = defaultdict(set)
         self._remote_branches = dict()
-        output = self.cmd('git ls-remote --heads %s', self._url)
+        if force or self.branches is not None:
+            output = self.cmd('git ls-remote --heads %s', self._url)
+        else:
+            output = self.cmd('git for-each-ref --format=%s refs/heads/',
+                              '%(objectname) %(refname)', cwd=self.fetch())
 
         for line in output.splitlines():
             sha, branch = line.replace('\t', ' ').split()
+            branch = branch.replace('refs/heads/', '').strip()
+            self._remote_shas[sha].add(branch)
             # use short sha1 everywhere (sometimes only info sent by BB API)
             sha = sha[:12]
-            branch = branch.replace('refs/heads/', '').strip()
             self._remote_heads[sha].add(branch)
             self._remote_branches[branch] = sha
 
@@ -135,10 +359,20 @@ class Repository(object):
         self._get_remote_branches(refresh_cache)
         return name in self._remote_branches
 
+    def get_remote_heads(self, refresh_cache=False):
+        """Return the full sha1 of the head of each remote branch, by
+        branch name."""
+        self._get_remote_branches(refresh_cache)
+        return {branch: sha for sha, branches in self._remote_shas.items()
+                for branch in branches}
+
     def get_branches_from_commit(self, commit, refresh_cache=False):
         """Get branches corresponding to given commit."""
         self._get_remote_branches(refresh_cache)
-        return self._remote_heads[('%s' % commit)[:12]]
+        commit = '%s' % commit
+        if len(commit) == 40:
+            return self._remote_shas[commit]
+        return self._remote_heads[commit[:12]]
 
     def checkout(self, name):
         try:
@@ -159,6 +393,96 @@ class Repository(object):
         except CommandError as err:
             raise PushFailedException(err) from err
 
+    def _list_refs(self, *prefixes):
+        """Return the shas of the refs under each of `prefixes`.
+
+        Returns:
+            A list of dicts mapping the names of the refs, without the
+            prefix, to their sha; one per prefix.
+
+        """
+        output = self.cmd('git for-each-ref --format=%s' +
+                          ' %s' * len(prefixes),
+                          '%(objectname) %(refname)', *prefixes)
+        refs = [{} for _ in prefixes]
+        for line in output.splitlines():
+            sha, ref = line.split(' ', 1)
+            for prefix, prefix_refs in zip(prefixes, refs):
+                if ref.startswith(prefix):
+                    prefix_refs[ref[len(prefix):]] = sha
+        return refs
+
+    def plan_push(self, names=None, prune=False):
+        """List the branches that changed locally since they were fetched.
+
+        The local branches are compared with the remote-tracking branches,
+        which hold the state of the remote as of the last fetch or push.
+
+        Args:
+            names (iterable): only consider these branches. Defaults to all
+                the local branches.
+            prune (bool): include the branches deleted locally.
+
+        Returns:
+            A list of RefUpdate(name, old, new), where `old` is the sha of
+            the branch on the remote (None for a new branch) and `new` its
+            local sha (None for a deleted branch).
+
+        """
+        local, remote = self._list_refs('refs/heads/', 'refs/remotes/origin/')
+        remote.pop('HEAD', None)
+        updates = [
+            RefUpdate(name, remote.get(name), local[name])
+            for name in (local if names is None else names)
+            if name in local and remote.get(name) != local[name]
+        ]
+        if prune:
+            updates.extend(RefUpdate(name, sha, None)
+                           for name, sha in remote.items()
+                           if name not in local)
+        return updates
+
+    def push_changes(self, names=None, prune=False):
+        """Push the branches that changed locally, in a single atomic push.
+
+        Each update is guarded by a lease on the sha the branch had when it
+        was fetched, so that changes made to the remote in the meantime are
+        never overwritten. Nothing is sent if no branch changed.
+
+        Args:
+            names (iterable): only push these branches. Defaults to all the
+                local branches.
+            prune (bool): push the deletion of the branches deleted locally.
+
+        Returns:
+            The list of RefUpdate pushed.
+
+        """
+        updates = self.plan_push(names, prune)
+        if not updates:
+            return updates
+        args = []
+        for update in updates:
+            ref = 'refs/heads/' + update.name
+            args.append('--force-with-lease={}:{}'.format(
+                ref, update.old or ''))
+            args.append('{}:{}'.format(update.new or '', ref))
+        try:
+            self.cmd('git push --atomic origin' + ' %s' * len(args), *args)
+        except CommandError as err:
+            raise PushFailedException(err) from err
+        # the remote-tracking branches are only updated by the push when the
+        # fetch refspecs cover them, which narrow clones' may not
+        for update in updates:
+            ref = 'refs/remotes/origin/' + update.name
+            if update.new:
+                self.cmd('git update-ref %s %s', ref, update.new)
+            else:
+                self.cmd('git update-ref -d %s', ref)
+        for hook in self.push_hooks:
+            hook(updates)
+        return updates
+
     def cmd(self, command, *args, **kwargs):
         retry = kwargs.pop('retry', 0)
         if args:
@@ -169,16 +493,45 @@ class Repository(object):
         cwd = kwargs.pop('cwd', self.cmd_directory)
         kwargs.setdefault('mask_pwd', self._mask_pwd)
         try:
-            ret = cmd(command, cwd=cwd, **kwargs)
+            ret = self._run(command, cwd=cwd, **kwargs)
         except CommandError:
             if retry == 0:
                 raise
 
             LOG.debug('command failed [%s retry left]', retry)
-            time.sleep(120)  # helps stabilize requests to bitbucket
+            # helps stabilize requests to bitbucket
+            deadline.sleep(120)
             ret = self.cmd(command, retry=retry - 1, **kwargs)
         return ret
 
+    @staticmethod
+    def _run(command, **kwargs):
+        """Run a command, recording its duration in traces and metrics.
+
+        The command's timeout (simplecmd's default one if unset) is bounded
+        by the job's remaining time budget.
+
+        Raises:
+            DeadlineExceeded: if the budget is spent, before or while the
+                command runs.
+
+        """
+        # Only keep the subcommand, arguments may contain credentials
+        words = command.split()[:2]
+        subcommand = words[-1] if words[:1] == ['git'] else words[0]
+        kwargs['timeout'] = deadline.timeout(kwargs.get('timeout', 300))
+        start = time.monotonic()
+        try:
+            with trace.span('git', ' '.join(words)):
+                return cmd(command, **kwargs)
+        except CommandError:
+            # a command cut short by the deadline did not fail
+            deadline.check()
+            raise
+        finally:
+            GIT_COMMAND_DURATION.observe(time.monotonic() - start,
+                                         command=subcommand)
+
     @property
     def remote_branches(self):
         self._get_remote_branches()
@@ -197,15 +550,51 @@ class Branch(object):
         self.checkout()
 
         branches = ' '.join(("'%s'" % s.name) for s in source_branches)
-        try:
-            command = 'git merge --no-edit %s %s' % ('--no-ff' if force_commit
-                                                     else '', branches)
-            self.repo.cmd(command)  # May fail if conflict
-        except CommandError as err:
-            raise MergeFailedException(self.name, branches) from err
+        results = self.repo.merge_results
+        key = None
+        if results is not None:
+            key = self._merge_key(source_branches, force_commit)
+            if key in results and results[key] is None:
+                # known conflict
+                raise MergeFailedException(self.name, branches)
+        if key is None or key not in results or \
+                not self._reset_to(results[key]):
+            try:
+                command = 'git merge --no-edit %s %s' % (
+                    '--no-ff' if force_commit else '', branches)
+                self.repo.cmd(command)  # May fail if conflict
+            except CommandError as err:
+                if key is not None:
+                    results[key] = None
+                raise MergeFailedException(self.name, branches) from err
+            if key is not None:
+                results[key] = self.get_latest_commit()
         if do_push:
             self.push()
 
+    def _merge_key(self, source_branches, force_commit):
+        """Identify a merge by the commits it involves.
+
+        When the repository's `merge_results` are set, the result of each
+        merge is recorded there, and reused by the same merge later on,
+        including in another work copy of the repository if the resulting
+        objects were kept (see Repository.keep_objects).
+
+        """
+        names = [source.name for source in source_branches]
+        head, *shas = self.repo.cmd(
+            'git rev-parse HEAD' + ' %s' * len(names), *names).split()
+        return self.name, head, tuple(zip(names, shas)), force_commit
+
+    def _reset_to(self, commit):
+        """Reset the branch to the result of a merge made earlier."""
+        try:
+            self.repo.cmd('git reset -q --hard %s', commit)
+        except CommandError:
+            # the commit was pruned
+            return False
+        return True
+
     def get_commit_diff(self, source_branch, ignore_merges=True):
         log = self.repo.cmd(
             'git log %s --pretty="%%H %%P" %s..%s',
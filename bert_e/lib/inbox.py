@@ -0,0 +1,109 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Durable journal of received payloads.
+
+Payloads are appended to a SQLite database in WAL mode, so that an append
+is a single sequential write, and stay there until they are acknowledged.
+Entries that were not acknowledged when the process stopped are read again
+when the inbox is reopened.
+
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+Entry = namedtuple('Entry', 'id source event payload received')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    event TEXT,
+    payload BLOB NOT NULL,
+    received REAL NOT NULL
+)
+"""
+
+
+class Inbox(object):
+    """Append-only journal of payloads, backed by a SQLite database.
+
+    Args:
+        path (str): path of the database file, created if needed.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # with WAL, NORMAL survives a crash of the process, which is what
+        # the inbox is for; only a power loss may lose the last appends.
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+
+    def append(self, source, event, payload):
+        """Record a payload and return the id of its entry."""
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO entries (source, event, payload, received) '
+                'VALUES (?, ?, ?, ?)', (source, event, payload, time.time()))
+            self._appended.notify_all()
+            return cursor.lastrowid
+
+    def read(self, after=0, limit=100):
+        """Return the entries recorded after the entry `after`, oldest
+        first."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, source, event, payload, received FROM entries '
+                'WHERE id > ? ORDER BY id LIMIT ?', (after, limit)).fetchall()
+        return [Entry(*row) for row in rows]
+
+    def wait(self, after, timeout=None):
+        """Wait for an entry to be recorded after the entry `after`.
+
+        Returns:
+            bool: True if there are entries to read.
+
+        """
+        with self._lock:
+            return self._appended.wait_for(
+                lambda: self._last_id() > after, timeout)
+
+    def _last_id(self):
+        return self._conn.execute(
+            'SELECT COALESCE(MAX(id), 0) FROM entries').fetchone()[0]
+
+    def ack(self, ids):
+        """Remove the entries that have been fully processed."""
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany('DELETE FROM entries WHERE id = ?',
+                                   [(entry_id,) for entry_id in ids])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -26,6 +26,23 @@ class JiraIssue:
         self.key = issue.key
 
 
+# the fields of the issues Bert-E checks
+FIELDS = ('issuetype', 'fixVersions', 'parent', 'updated')
+
+
+def search_issues(account_url, keys, email, token, fields=FIELDS):
+    """Return the issues of the given keys, fetched with a single search.
+
+    Only the given fields of the issues are fetched. The issues that don't
+    exist, or that the account can't see, are left out.
+
+    """
+    jira = JIRA(account_url, basic_auth=(email, token))
+    return jira.search_issues(
+        'key in ({})'.format(', '.join(sorted(keys))),
+        maxResults=len(keys), validate_query=False, fields=','.join(fields))
+
+
 if __name__ == '__main__':
     if len(sys.argv) == 4:
         issue = JiraIssue(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
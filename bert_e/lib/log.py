@@ -0,0 +1,139 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Lazy structured logging helpers.
+
+The objects defined here are meant to be passed as arguments of the
+standard logging calls: they are only formatted if a handler actually emits
+the record, so that logging at a disabled level costs nothing.
+
+    LOG.debug('state: %s', Fields(pr=pr.id, queued=queued))
+    LOG.debug('tree:\\n%s', Lazy(render_tree, repo))
+    log_payload(LOG, logging.DEBUG, 'Received webhook:\\n%s', request.data)
+
+Large payloads (webhook bodies for instance) are sampled per logger: above
+a size threshold, only one payload out of `every` is logged in full, the
+others are replaced by a short summary.
+
+"""
+import itertools
+import threading
+from collections import namedtuple
+
+DEFAULT_PAYLOAD_THRESHOLD = 16 * 1024
+DEFAULT_PAYLOAD_SAMPLING = 20
+
+Sampling = namedtuple('Sampling', 'threshold every')
+
+_SAMPLINGS = {}
+_COUNTERS = {}
+_LOCK = threading.Lock()
+
+
+class Lazy(object):
+    """Call `func(*args, **kwargs)` when the log record is first formatted.
+
+    The result is kept for the other handlers formatting the same record.
+
+    """
+    __slots__ = ('func', 'args', 'kwargs', 'value')
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+
+    def __str__(self):
+        if self.value is None:
+            self.value = str(self.func(*self.args, **self.kwargs))
+        return self.value
+
+    __repr__ = __str__
+
+
+class Fields(object):
+    """Key-value pairs, formatted as `key=value` when the record is."""
+    __slots__ = ('fields',)
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join('{}={!r}'.format(key, value)
+                        for key, value in self.fields.items())
+
+    __repr__ = __str__
+
+
+def configure_sampling(name, threshold=DEFAULT_PAYLOAD_THRESHOLD,
+                       every=DEFAULT_PAYLOAD_SAMPLING):
+    """Set how payloads logged with log_payload() are sampled.
+
+    Args:
+        name (str): name of the logger (applies to its children as well).
+        threshold (int): size in bytes above which payloads are sampled.
+        every (int): log one large payload out of `every`, 1 to log them
+            all.
+
+    """
+    with _LOCK:
+        _SAMPLINGS[name] = Sampling(threshold, max(1, every))
+
+
+def get_sampling(name):
+    """Return the sampling that applies to the logger called `name`."""
+    while name:
+        sampling = _SAMPLINGS.get(name)
+        if sampling is not None:
+            return sampling
+        name = name.rpartition('.')[0]
+    return _SAMPLINGS.get('', Sampling(DEFAULT_PAYLOAD_THRESHOLD,
+                                       DEFAULT_PAYLOAD_SAMPLING))
+
+
+def _sampled_in(name, every):
+    with _LOCK:
+        counter = _COUNTERS.get(name)
+        if counter is None:
+            counter = _COUNTERS[name] = itertools.count()
+        return next(counter) % every == 0
+
+
+def _decode(payload):
+    if isinstance(payload, (bytes, bytearray)):
+        return payload.decode('utf-8', 'replace')
+    return payload
+
+
+def log_payload(logger, level, msg, payload, size=None):
+    """Log `payload` as the only argument of `msg`, subject to sampling.
+
+    Args:
+        logger (logging.Logger): logger to log with.
+        level (int): level of the record.
+        msg (str): message, with one placeholder for the payload.
+        payload (str or bytes): the payload, logged as is.
+        size (int): size of the payload, when known without computing it.
+
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if size is None:
+        size = len(payload)
+    sampling = get_sampling(logger.name)
+    if size > sampling.threshold and not _sampled_in(logger.name,
+                                                     sampling.every):
+        logger.log(level, msg, '<{} bytes, sampled out>'.format(size))
+        return
+    logger.log(level, msg, Lazy(_decode, payload))
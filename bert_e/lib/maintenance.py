@@ -0,0 +1,188 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Background maintenance of Bert-E's git caches.
+
+Each job creates and deletes branches, so that packs and loose objects pile
+up in the cache of the repository, and history walks (ancestry checks, logs)
+slow down. The maintenance tasks are run between jobs, each one when its
+interval has elapsed, within a time budget so that the next job isn't held
+for long:
+
+- commit-graph: write the commit-graph, with changed paths, incrementally,
+- pack-refs: pack the refs of the created and deleted branches,
+- incremental-repack: index the packs with a multi-pack-index, expire the
+  packs it made redundant, and combine the small ones,
+- loose-objects: remove the loose objects that are in packs, and prune the
+  old unreachable ones.
+
+The work copies of the jobs are cloned from the cache, and get its
+commit-graph and packs as they are.
+
+"""
+import logging
+import os
+import time
+from collections import namedtuple
+
+from .git import Repository
+from .metrics import Gauge, Histogram
+from .simplecmd import CommandError
+
+LOG = logging.getLogger(__name__)
+
+MAINTENANCE_DURATION = Histogram(
+    'bert_e_git_maintenance_duration_seconds',
+    'Duration of the maintenance tasks of the git caches, by task.',
+    ['task'])
+ANCESTRY_QUERY_DURATION = Gauge(
+    'bert_e_git_ancestry_query_seconds',
+    'Duration of an ancestry query between development branches in the git '
+    'cache, right before and after the last maintenance.',
+    ['repository', 'when'])
+
+Task = namedtuple('Task', 'name commands interval')
+
+# git maintenance uses the same size cap for the incremental repack
+MAX_REPACK_BATCH_SIZE = 2 * 1024 ** 3
+
+TASKS = (
+    Task('commit-graph',
+         ['git commit-graph write --reachable --changed-paths --split'],
+         3600),
+    Task('pack-refs', ['git pack-refs --all --prune'], 3600),
+    Task('incremental-repack',
+         ['git multi-pack-index write',
+          'git multi-pack-index expire',
+          'git multi-pack-index repack --batch-size=%(batch_size)d'],
+         24 * 3600),
+    Task('loose-objects',
+         ['git prune-packed', 'git prune --expire=2.weeks.ago'],
+         24 * 3600),
+)
+
+
+class Maintenance(object):
+    """Maintenance of a git repository, run in time-boxed steps.
+
+    Args:
+        path (str): path of the repository.
+        budget (float): time, in seconds, that a call to run() may spend.
+        name (str): name of the repository in the metrics.
+        tasks (iterable): the tasks to run.
+
+    """
+
+    def __init__(self, path, budget=60, name=None, tasks=TASKS):
+        self.path = path
+        self.budget = budget
+        self.name = name or os.path.basename(path)
+        self.tasks = tuple(tasks)
+        self.last_runs = {}
+
+    def due_tasks(self, now=None):
+        """Return the tasks whose interval has elapsed since their last run,
+        the most overdue first."""
+        if now is None:
+            now = time.monotonic()
+
+        def overdue(task):
+            last_run = self.last_runs.get(task.name)
+            return float('inf') if last_run is None \
+                else now - last_run - task.interval
+
+        return sorted((task for task in self.tasks if overdue(task) >= 0),
+                      key=overdue, reverse=True)
+
+    def run(self):
+        """Run the tasks that are due, until the budget is spent.
+
+        A task that doesn't fit in what is left of the budget is interrupted
+        and retried at the next interval, like a failed one.
+
+        Returns:
+            The names of the tasks that completed.
+
+        """
+        if not os.path.isdir(self.path):
+            return []
+        tasks = self.due_tasks()
+        if not tasks:
+            return []
+        deadline = time.monotonic() + self.budget
+        self._probe('before')
+        completed = []
+        for task in tasks:
+            if time.monotonic() >= deadline:
+                break
+            self.last_runs[task.name] = start = time.monotonic()
+            try:
+                for command in task.commands:
+                    self._git(command % {'batch_size': self._batch_size()},
+                              timeout=max(deadline - time.monotonic(), 1))
+            except CommandError as err:
+                LOG.warning('git maintenance task %s failed on %s: %s',
+                            task.name, self.path, err)
+                continue
+            finally:
+                MAINTENANCE_DURATION.observe(time.monotonic() - start,
+                                             task=task.name)
+            completed.append(task.name)
+        self._probe('after')
+        LOG.info('git maintenance of %s: %s', self.path,
+                 ', '.join(completed) or 'nothing completed')
+        return completed
+
+    def _git(self, command, timeout=300):
+        return Repository._run(command, cwd=self.path, timeout=timeout)
+
+    def _batch_size(self):
+        """Return the size below which packs are combined.
+
+        As `git maintenance` does, all the packs but the largest one are
+        combined, up to a maximum size.
+
+        """
+        pack_dir = os.path.join(self.path, 'objects', 'pack')
+        try:
+            sizes = sorted(
+                (os.path.getsize(os.path.join(pack_dir, name))
+                 for name in os.listdir(pack_dir) if name.endswith('.pack')),
+                reverse=True)
+        except OSError:
+            return 0
+        if len(sizes) < 2:
+            # a batch size of 0 would repack everything
+            return 1
+        return min(sizes[1] + 1, MAX_REPACK_BATCH_SIZE)
+
+    def _probe(self, when):
+        """Time an ancestry query between the first and the last
+        development branches."""
+        try:
+            branches = self._git(
+                'git for-each-ref --format="%(refname)" '
+                'refs/heads/development/').split()
+        except CommandError:
+            return
+        if len(branches) < 2:
+            return
+        start = time.monotonic()
+        try:
+            self._git('git merge-base --is-ancestor %s %s' % (
+                branches[0], branches[-1]))
+        except CommandError:
+            # not an ancestor, the query took as long
+            pass
+        ANCESTRY_QUERY_DURATION.set(time.monotonic() - start,
+                                    repository=self.name, when=when)
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Context manager that allows to retry an operation until it succeeds."""
-from time import sleep
+from .deadline import sleep
 
 
 class RetryTimeout(Exception):
@@ -56,6 +56,8 @@ class RetryHandler(object):
 
         Raise:
             RetryTimeout by default.
+            DeadlineExceeded: if the job's time budget doesn't leave time
+                for the next retry.
 
         """
         if self.limit is not None and self._elapsed >= self.limit:
@@ -0,0 +1,259 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Lightweight tracing of the work done while processing a job.
+
+A `Trace` is split in consecutive phases (e.g. 'clone', 'cascade'), and
+records a span for each git command and API request, with its duration.
+
+The trace of the job being processed is activated for the current thread,
+so that low-level code (git commands, HTTP sessions) can record spans
+without having the job at hand:
+
+    >>> trace = Trace()
+    >>> with trace.activate():
+    ...     phase('clone')
+    ...     with span('git', 'git fetch'):
+    ...         pass
+
+Outside of an active trace, `phase()` and `span()` do nothing.
+
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+
+Span = namedtuple('Span', ['kind', 'name', 'phase', 'start', 'duration'])
+
+_local = threading.local()
+
+
+class _CompactSpans(Sequence):
+    """Read-only sequence of spans, stored in arrays.
+
+    The kind, name and phase of each span are stored once per distinct
+    combination, and its start and duration as plain doubles.
+
+    """
+    __slots__ = ('_labels', '_indexes', '_times')
+
+    def __init__(self, spans):
+        labels = {}
+        self._indexes = array('I', (
+            labels.setdefault((span.kind, span.name, span.phase), len(labels))
+            for span in spans))
+        self._labels = tuple(labels)
+        self._times = array('d')
+        for span in spans:
+            self._times.extend((span.start, span.duration))
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        kind, name, phase = self._labels[self._indexes[index]]
+        index = index % len(self) * 2
+        return Span(kind, name, phase, self._times[index],
+                    self._times[index + 1])
+
+
+class Trace(object):
+    """Phases and spans recorded while processing a job.
+
+    Args:
+        max_spans (int): maximum number of spans kept in detail. Spans beyond
+            this limit are still accounted for in the phase totals.
+
+    """
+
+    def __init__(self, max_spans=2000):
+        self.max_spans = max_spans
+        self.spans = []
+        self.dropped_spans = 0
+        self.phases = OrderedDict()
+        self._start = None
+        self._end = None
+        self._phase = None
+        self._phase_start = None
+
+    @property
+    def duration(self):
+        if self._start is None:
+            return 0.0
+        end = self._end if self._end is not None else time.monotonic()
+        return end - self._start
+
+    @contextmanager
+    def activate(self):
+        """Make this trace the current thread's trace."""
+        previous = getattr(_local, 'trace', None)
+        _local.trace = self
+        if self._start is None:
+            self._start = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.close()
+            _local.trace = previous
+
+    def _phase_stats(self, name):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = {
+                'duration': 0.0,
+                'git': {'count': 0, 'duration': 0.0},
+                'api': {'count': 0, 'duration': 0.0},
+            }
+        return stats
+
+    def _close_phase(self, now):
+        if self._phase is not None:
+            stats = self._phase_stats(self._phase)
+            stats['duration'] += now - self._phase_start
+        self._phase = None
+
+    def phase(self, name):
+        """End the current phase, and start phase `name`."""
+        now = time.monotonic()
+        self._close_phase(now)
+        self._phase_stats(name)
+        self._phase = name
+        self._phase_start = now
+
+    def close(self):
+        """End the current phase and stop the trace's clock."""
+        now = time.monotonic()
+        self._close_phase(now)
+        self._end = now
+
+    def compact(self, max_spans=None):
+        """Store the spans of the closed trace in a compact, read-only form.
+
+        Used to keep the traces of completed jobs at a small memory cost.
+
+        Args:
+            max_spans (int): maximum number of spans kept, the longest ones.
+                The others are still accounted for in the phase totals.
+
+        """
+        spans = list(self.spans)
+        if max_spans is not None and len(spans) > max_spans:
+            longest = sorted(range(len(spans)),
+                             key=lambda index: spans[index].duration,
+                             reverse=True)[:max_spans]
+            self.dropped_spans += len(spans) - max_spans
+            spans = [spans[index] for index in sorted(longest)]
+        elif isinstance(self.spans, _CompactSpans):
+            return
+        self.spans = _CompactSpans(spans)
+
+    def add_span(self, kind, name, start, duration):
+        stats = self._phase_stats(self._phase or 'other')
+        if kind in stats:
+            stats[kind]['count'] += 1
+            stats[kind]['duration'] += duration
+        if len(self.spans) >= self.max_spans:
+            self.dropped_spans += 1
+            return
+        self.spans.append(Span(kind, name, self._phase,
+                               start - (self._start or start), duration))
+
+    @contextmanager
+    def span(self, kind, name):
+        """Record the execution of the enclosed code as a span."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_span(kind, name, start, time.monotonic() - start)
+
+    def totals(self, kind):
+        """Return the number and duration of the spans of a given kind."""
+        count, duration = 0, 0.0
+        for stats in list(self.phases.values()):
+            count += stats[kind]['count']
+            duration += stats[kind]['duration']
+        return count, duration
+
+    def as_dict(self, spans=True):
+        """Return a serializable representation of the trace.
+
+        This can be called from another thread while the trace is recorded.
+
+        Args:
+            spans (bool): include the detail of each span.
+
+        """
+        data = {
+            'duration': round(self.duration, 3),
+            'phases': [
+                {
+                    'name': name,
+                    'duration': round(stats['duration'], 3),
+                    'git_commands': stats['git']['count'],
+                    'git_duration': round(stats['git']['duration'], 3),
+                    'api_calls': stats['api']['count'],
+                    'api_duration': round(stats['api']['duration'], 3),
+                }
+                for name, stats in list(self.phases.items())
+            ],
+        }
+        if spans:
+            data['spans'] = [
+                {
+                    'kind': item.kind,
+                    'name': item.name,
+                    'phase': item.phase,
+                    'start': round(item.start, 3),
+                    'duration': round(item.duration, 3),
+                }
+                for item in list(self.spans)
+            ]
+            data['dropped_spans'] = self.dropped_spans
+        return data
+
+    def __str__(self):
+        git_count, git_duration = self.totals('git')
+        api_count, api_duration = self.totals('api')
+        return ('git: {} commands in {:.1f}s, '
+                'api: {} calls in {:.1f}s').format(
+                    git_count, git_duration, api_count, api_duration)
+
+
+def current():
+    """Return the trace active in the current thread, or None."""
+    return getattr(_local, 'trace', None)
+
+
+def phase(name):
+    """Start phase `name` on the active trace, if any."""
+    trace = current()
+    if trace is not None:
+        trace.phase(name)
+
+
+@contextmanager
+def span(kind, name):
+    """Record a span on the active trace, if any."""
+    trace = current()
+    if trace is None:
+        yield
+        return
+    with trace.span(kind, name):
+        yield
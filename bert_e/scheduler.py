@@ -0,0 +1,129 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fair scheduling of the jobs of several Bert-E instances."""
+import logging
+import threading
+
+from .settings import BertEContextFilter
+
+LOG = logging.getLogger(__name__)
+
+
+class Scheduler(object):
+    """Process the jobs of several Bert-E instances with a pool of workers.
+
+    Instances are served in turn, one job at a time, so that a long queue
+    on one repository doesn't delay the others. An instance never processes
+    two jobs at once, as its git clone can't be shared.
+
+    Args:
+        bert_es (iterable): the BertE instances to schedule.
+        workers (int): number of worker threads.
+
+    """
+
+    def __init__(self, bert_es, workers=1):
+        self.bert_es = list(bert_es)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._busy = set()
+        self._next = 0
+        for bert_e in self.bert_es:
+            bert_e.scheduler = self
+
+    def notify(self):
+        """Wake a worker up, as a job was added."""
+        with self._lock:
+            self._changed.notify()
+
+    def _pick(self):
+        """Return the next idle instance that has jobs, None if none."""
+        count = len(self.bert_es)
+        for offset in range(count):
+            index = (self._next + offset) % count
+            bert_e = self.bert_es[index]
+            if index not in self._busy and not bert_e.task_queue.empty():
+                self._next = index + 1
+                self._busy.add(index)
+                return index
+        return None
+
+    def run_once(self, timeout=None):
+        """Process one job of the next instance that has some.
+
+        Args:
+            timeout (float): time to wait for a job, None to wait forever.
+
+        Returns:
+            The job processed, None if no job came in time.
+
+        """
+        with self._lock:
+            index = self._pick()
+            if index is None:
+                self._changed.wait(timeout)
+                index = self._pick()
+                if index is None:
+                    return None
+        bert_e = self.bert_es[index]
+        BertEContextFilter.local.settings = bert_e.settings
+        try:
+            return bert_e.process_task()
+        finally:
+            BertEContextFilter.local.settings = None
+            with self._lock:
+                self._busy.discard(index)
+                # the instance may have other jobs for a waiting worker
+                self._changed.notify()
+
+    def idle_once(self):
+        """Let the idle instances make use of the time, in turn, until one
+        of them does some work.
+
+        Returns:
+            The instance that did some work, None if none did.
+
+        """
+        for index, bert_e in enumerate(self.bert_es):
+            with self._lock:
+                if index in self._busy or not bert_e.task_queue.empty():
+                    continue
+                self._busy.add(index)
+            BertEContextFilter.local.settings = bert_e.settings
+            try:
+                if bert_e.idle():
+                    return bert_e
+            finally:
+                BertEContextFilter.local.settings = None
+                with self._lock:
+                    self._busy.discard(index)
+                    # jobs may have come in in the meantime
+                    self._changed.notify()
+        return None
+
+    def _work(self):
+        while True:
+            try:
+                if self.run_once(timeout=60) is None:
+                    self.idle_once()
+            except Exception:
+                LOG.exception('Unexpected error in the scheduler')
+
+    def start(self):
+        """Start the worker threads."""
+        for number in range(self.workers):
+            worker = threading.Thread(target=self._work, daemon=True,
+                                      name='bert-e-worker-%d' % number)
+            worker.start()
@@ -16,34 +16,36 @@
 
 import logging
 import os
+from collections import OrderedDict
 from pkg_resources import get_distribution
 import secrets
 from threading import Thread
 
 from flask import Flask, render_template, request
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
-from ..bert_e import BertE
-from ..settings import setup_settings, BertEContextFilter
+from ..bert_e import BertE, client_args
+from ..git_host import client_factory
+from ..scheduler import Scheduler
+from ..settings import (setup_repositories_settings, setup_settings,
+                        BertEContextFilter)
 from .addon import blueprint as addon_blueprint
 from .api import configure as configure_api
 from .auth import configure as configure_auth
 from .doc import (blueprint as doc_blueprint,
                   configure as configure_doc)
+from .inbox import configure as configure_inbox
 from .manage import blueprint as manage_blueprint
+from .metrics import blueprint as metrics_blueprint
 from .reverse_proxy import ReverseProxied
 from .session import configure as configure_sessions
-from .status import blueprint as status_blueprint
+from .status import (blueprint as status_blueprint,
+                     configure as configure_status)
 from .template_filter import configure as configure_filters
 from .webhook import blueprint as webhook_blueprint
 
 
-def setup_bert_e(settings_file, debug):
-    """Create and configure Bert-E instance."""
-    settings = setup_settings(settings_file)
-    settings['backtrace'] = True
-
-    bert_e = BertE(settings)
-
+def setup_logging(settings, debug):
     logging.basicConfig(
         level=logging.DEBUG if debug else logging.INFO,
         format='%(instance)s - %(levelname)-8s - %(name)s: %(message)s'
@@ -52,10 +54,26 @@ def setup_bert_e(settings_file, debug):
     for handler in logging.root.handlers:
         handler.addFilter(log_filter)
 
+
+def setup_bert_e(settings_file, debug):
+    """Create and configure Bert-E instance."""
+    return start_bert_e(setup_settings(settings_file), debug)
+
+
+def start_bert_e(settings, debug):
+    """Create a Bert-E instance and start its worker thread."""
+    settings['backtrace'] = True
+
+    bert_e = BertE(settings)
+    setup_logging(settings, debug)
+
     def bert_e_launcher():
         """Basic worker loop that waits for Bert-E jobs and launches them."""
         while True:
-            bert_e.process_task()
+            # make use of the time when there's nothing else to do
+            if bert_e.process_task(timeout=60) is None or \
+                    bert_e.task_queue.empty():
+                bert_e.idle()
 
     worker = Thread(target=bert_e_launcher)
     worker.daemon = True
@@ -64,8 +82,74 @@ def setup_bert_e(settings_file, debug):
     return bert_e
 
 
-def setup_server(bert_e):
-    """Create and configure Flask server app."""
+def setup_bert_es(settings_file, debug, workers=1):
+    """Create and configure the Bert-E instances of all the repositories
+    described in the settings file.
+
+    The instances share their git host clients (and their connection
+    pools) when their credentials are the same, a git object store, and a
+    scheduler serving them in turn.
+
+    Returns:
+        An ordered dict of the instances, keyed by `<owner>/<slug>`.
+
+    """
+    all_settings = setup_repositories_settings(settings_file)
+    if len(all_settings) == 1:
+        return OrderedDict((key, start_bert_e(settings, debug))
+                           for key, settings in all_settings.items())
+
+    object_store = os.path.expanduser('~/.bert-e/objects.git')
+    clients = {}
+    bert_es = OrderedDict()
+    for key, settings in all_settings.items():
+        settings['backtrace'] = True
+        args = client_args(settings)
+        if args not in clients:
+            clients[args] = client_factory(*args)
+        bert_es[key] = BertE(settings, client=clients[args],
+                             object_store=object_store)
+    setup_logging(next(iter(all_settings.values())), debug)
+
+    Scheduler(bert_es.values(), workers).start()
+    return bert_es
+
+
+def setup_servers(bert_es):
+    """Create and configure the Flask server app of several instances.
+
+    The first instance is served at the root, as a single instance would,
+    and each instance is also served under `/<owner>/<slug>`. Webhooks are
+    routed to the instance of the repository they were sent for.
+
+    Args:
+        bert_es (OrderedDict): the instances, keyed by `<owner>/<slug>`.
+
+    """
+    default = next(iter(bert_es.values()))
+    app = setup_server(default, bert_es)
+    if len(bert_es) > 1:
+        mounts = {}
+        for key, bert_e in bert_es.items():
+            mounts['/' + key] = setup_server(bert_e, bert_es, mounted=True)
+            mounts['/' + key].inbox = app.inbox
+        # mount after the reverse proxy has fixed the request's path
+        app.wsgi_app.app = DispatcherMiddleware(app.wsgi_app.app, mounts)
+    return app
+
+
+def setup_server(bert_e, repositories=None, mounted=False):
+    """Create and configure Flask server app.
+
+    Args:
+        bert_e (BertE): the instance to serve.
+        repositories (dict): all the instances of the process, keyed by
+            `<owner>/<slug>`, to route webhooks to.
+        mounted (bool): whether the app is mounted under the app created
+            by setup_servers(), which handles the reverse proxy and the
+            webhook inbox.
+
+    """
     app = Flask(__name__)
 
     app_prefix = os.getenv('APP_PREFIX', None)
@@ -78,26 +162,32 @@ def setup_server(bert_e):
         'CLIENT_SECRET': os.environ['BERT_E_CLIENT_SECRET'],
         'WTF_CSRF_SECRET_KEY': secrets.token_hex(24),
     })
-    app.wsgi_app = ReverseProxied(
-        app.wsgi_app,
-        app_prefix,
-        app_scheme,
-        app_server
-    )
+    if not mounted:
+        app.wsgi_app = ReverseProxied(
+            app.wsgi_app,
+            app_prefix,
+            app_scheme,
+            app_server
+        )
 
     app.bert_e = bert_e
+    app.repositories = repositories or {}
 
     configure_filters(app)
     configure_sessions(app)
     configure_auth(app)
     configure_api(app)
     configure_doc(app)
+    configure_status(app)
+    if not mounted:
+        configure_inbox(app)
 
     app.register_blueprint(webhook_blueprint)
     app.register_blueprint(status_blueprint)
     app.register_blueprint(manage_blueprint)
     app.register_blueprint(doc_blueprint)
     app.register_blueprint(addon_blueprint)
+    app.register_blueprint(metrics_blueprint)
 
     @app.context_processor
     def inject_global_vars():
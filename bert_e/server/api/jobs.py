@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from flask import abort, current_app
+from datetime import datetime
 
+from flask import abort, current_app, request
+
+from ..auth import invalid
 from .base import APIEndpoint
 
 
@@ -35,5 +38,51 @@ class ListJobs(APIEndpoint):
     admin = False
 
     def view(self):
-        jobs = current_app.bert_e.get_jobs_as_json()
-        return jobs, 200, {'Content-Type': 'application/json'}
+        try:
+            limit = self.arg('limit', self.positive_int)
+            cursor = self.arg('cursor', self.positive_int)
+            since = self.arg('since', self.local_time)
+        except ValueError:
+            return invalid()
+        jobs, next_cursor = current_app.bert_e.get_jobs_as_json(
+            limit=limit,
+            cursor=cursor,
+            status=request.args.get('status'),
+            job_type=request.args.get('type'),
+            since=since,
+        )
+        headers = {'Content-Type': 'application/json'}
+        if next_cursor is not None:
+            headers['X-Next-Cursor'] = str(next_cursor)
+        return jobs, 200, headers
+
+    @staticmethod
+    def arg(name, convert):
+        """Return the converted value of a query parameter, None if unset.
+
+        Raises:
+            ValueError: if the value is invalid.
+
+        """
+        value = request.args.get(name)
+        if value is None:
+            return None
+        return convert(value)
+
+    @staticmethod
+    def local_time(value):
+        """Parse an ISO 8601 date, converted to the naive local time of the
+        jobs if it has a timezone."""
+        if value.endswith(('Z', 'z')):
+            value = value[:-1] + '+00:00'
+        value = datetime.fromisoformat(value)
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def positive_int(value):
+        value = int(value)
+        if value <= 0:
+            raise ValueError(value)
+        return value
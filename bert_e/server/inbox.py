@@ -0,0 +1,127 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Asynchronous ingestion of webhooks through a durable inbox.
+
+When the `webhook_inbox` setting is set, the webhook endpoints only append
+the raw payloads to the inbox and reply right away. A consumer thread turns
+them into jobs, coalescing the webhooks that lead to the same job, and the
+entries are removed once their job has been processed. Entries left over
+by a previous run are replayed when the server starts.
+
+"""
+import logging
+from threading import Thread
+
+from ..lib.inbox import Inbox
+from .webhook import WrongRepository, build_job
+
+LOG = logging.getLogger(__name__)
+
+
+class InboxConsumer(Thread):
+    """Thread turning the inbox entries into jobs.
+
+    Args:
+        bert_e (BertE): the instance to queue the jobs on.
+        inbox (Inbox): the inbox to consume.
+        repositories (dict): all the instances of the process, keyed by
+            `<owner>/<slug>`, to route webhooks to.
+        batch_size (int): maximum number of entries read at once, and
+            coalesced together.
+
+    """
+
+    def __init__(self, bert_e, inbox, repositories=None, batch_size=100):
+        super().__init__(name='inbox-consumer', daemon=True)
+        self.bert_e = bert_e
+        self.inbox = inbox
+        self.repositories = repositories
+        self.batch_size = batch_size
+        self.position = 0
+
+    def run(self):
+        pending = len(self.inbox)
+        if pending:
+            LOG.info('Replaying %d webhook(s) received before restart',
+                     pending)
+        while True:
+            try:
+                if not self.consume():
+                    self.inbox.wait(self.position, timeout=60)
+            except Exception:
+                LOG.exception('Failed to consume the webhook inbox')
+
+    def consume(self):
+        """Queue the jobs of the next batch of entries.
+
+        Returns:
+            int: the number of entries consumed.
+
+        """
+        entries = self.inbox.read(self.position, self.batch_size)
+        jobs = []
+        ignored = []
+        for entry in entries:
+            self.position = entry.id
+            try:
+                job = build_job(self.bert_e, entry.source, entry.event,
+                                entry.payload, self.repositories)
+            except WrongRepository:
+                job = None
+            except Exception:
+                LOG.exception('Invalid %s webhook %s (inbox entry %d)',
+                              entry.source, entry.event, entry.id)
+                job = None
+            if job is None:
+                ignored.append(entry.id)
+                continue
+            job.inbox_entries.append(entry.id)
+            for index, other in enumerate(jobs):
+                if other == job:
+                    # keep the most recent data, and all the entries
+                    job.inbox_entries[:0] = other.inbox_entries
+                    jobs[index] = job
+                    break
+            else:
+                jobs.append(job)
+
+        for job in jobs:
+            if not job.bert_e.put_job(job):
+                # the entries of the queued job will be replayed if needed
+                ignored.extend(job.inbox_entries)
+        self.inbox.ack(ignored)
+        return len(entries)
+
+
+def configure(app, path=None, start=True):
+    """Set up the inbox of the app if `path` or the setting is set.
+
+    Args:
+        app (Flask): the server app.
+        path (str): path of the inbox database, defaults to the
+            `webhook_inbox` setting.
+        start (bool): whether to start the consumer thread.
+
+    """
+    app.inbox = None
+    path = path or getattr(app.bert_e.settings, 'webhook_inbox', None)
+    if not path:
+        return
+    app.inbox = app.bert_e.inbox = Inbox(path)
+    for bert_e in app.repositories.values():
+        bert_e.inbox = app.inbox
+    app.inbox_consumer = InboxConsumer(app.bert_e, app.inbox,
+                                       app.repositories)
+    if start:
+        app.inbox_consumer.start()
@@ -0,0 +1,126 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""This module defines the server's Prometheus metrics endpoint."""
+from collections import Counter as CountDict
+
+from flask import Blueprint, Response, current_app
+
+from ..git_host.cache import BUILD_STATUS_CACHE
+from ..lib.metrics import REGISTRY, Counter, Gauge
+
+blueprint = Blueprint('metrics', __name__)
+
+TASK_QUEUE_LENGTH = Gauge(
+    'bert_e_task_queue_length',
+    'Number of jobs waiting to be processed, by repository.',
+    ['repo'])
+CURRENT_JOB_DURATION = Gauge(
+    'bert_e_current_job_duration_seconds',
+    'Time spent so far on the job being processed (0 when idle), by '
+    'repository.',
+    ['repo'])
+MERGE_QUEUE_LENGTH = Gauge(
+    'bert_e_merge_queue_length',
+    'Number of pull requests in the merge queue, by repository and target '
+    'version.',
+    ['repo', 'version'])
+CACHE_HITS = Counter(
+    'bert_e_cache_hits_total',
+    'Number of cache lookups that found an entry, by cache.',
+    ['cache'])
+CACHE_MISSES = Counter(
+    'bert_e_cache_misses_total',
+    'Number of cache lookups that found no entry, by cache.',
+    ['cache'])
+CACHE_EVICTIONS = Counter(
+    'bert_e_cache_evictions_total',
+    'Number of cache entries evicted to make room for new ones, by cache.',
+    ['cache'])
+CACHE_HIT_RATIO = Gauge(
+    'bert_e_cache_hit_ratio',
+    'Ratio of cache lookups that found an entry, by cache.',
+    ['cache'])
+
+
+def _cache_stats(caches):
+    hits = misses = evictions = 0
+    for cache in list(caches):
+        hits += cache.hits
+        misses += cache.misses
+        evictions += cache.evictions
+    return hits, misses, evictions
+
+
+def _repository_name(bert_e):
+    return '{}/{}'.format(bert_e.settings.repository_owner,
+                          bert_e.settings.repository_slug)
+
+
+def collect(bert_es):
+    """Update the metrics that are sampled from the state of the Bert-E
+    instances of the process.
+
+    The caches are shared by the instances, their metrics are not labelled
+    by repository.
+
+    Args:
+        bert_es (iterable): the instances to sample.
+
+    """
+    task_queue_lengths = {}
+    job_durations = {}
+    queue_lengths = CountDict()
+    query_caches = {}
+    for bert_e in bert_es:
+        repo = _repository_name(bert_e)
+        task_queue_lengths[(repo,)] = bert_e.task_queue.qsize()
+
+        current_job = bert_e.status.get('current job', None)
+        job_durations[(repo,)] = (
+            current_job.duration.total_seconds() if current_job else 0)
+
+        for queued_commits in list(
+                (bert_e.status.get('merge queue') or {}).values()):
+            for version, _ in queued_commits:
+                queue_lengths[(repo, version)] += 1
+
+        query_cache = getattr(bert_e.client, 'query_cache', None)
+        if query_cache is not None:
+            # instances with the same credentials share their client
+            query_caches[id(query_cache)] = query_cache
+    TASK_QUEUE_LENGTH.set_all(task_queue_lengths)
+    CURRENT_JOB_DURATION.set_all(job_durations)
+    MERGE_QUEUE_LENGTH.set_all(queue_lengths)
+
+    caches = {'build_status': BUILD_STATUS_CACHE.values()}
+    if query_caches:
+        caches['github_query'] = [
+            cache for query_cache in query_caches.values()
+            for cache in query_cache.values()]
+    for name, values in caches.items():
+        hits, misses, evictions = _cache_stats(values)
+        CACHE_HITS.set_total(hits, cache=name)
+        CACHE_MISSES.set_total(misses, cache=name)
+        CACHE_EVICTIONS.set_total(evictions, cache=name)
+        CACHE_HIT_RATIO.set(
+            hits / (hits + misses) if hits + misses else 0, cache=name)
+
+
+@blueprint.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose the metrics of all the repositories in the Prometheus text
+    format."""
+    collect(current_app.repositories.values() or [current_app.bert_e])
+    return Response(REGISTRY.render(), 200,
+                    {'Content-Type': 'text/plain; version=0.0.4'})
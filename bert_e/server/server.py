@@ -18,7 +18,7 @@
 
 import argparse
 
-from . import setup_bert_e, setup_server
+from . import setup_bert_es, setup_servers
 
 
 def parse_args():
@@ -36,14 +36,18 @@ def parse_args():
                         help='settings-file location (defaults to `settings`')
     parser.add_argument('--verbose', '-v', action='store_true', default=True,
                         help='verbose mode')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of jobs processed concurrently, when '
+                             'several repositories are handled '
+                             '(defaults to 1)')
 
     return parser.parse_args()
 
 
 # Start up Bert-E and server!
 args = parse_args()
-bert_e = setup_bert_e(args.settings_file, args.verbose)
-app = setup_server(bert_e)
+bert_es = setup_bert_es(args.settings_file, args.verbose, args.workers)
+app = setup_servers(bert_es)
 
 
 def main():
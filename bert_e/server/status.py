@@ -12,9 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""This module defines the server status page."""
+"""This module defines the server status page.
+
+The page's view model is computed once per change of Bert-E's status (see
+`BertE.status_changed()`) or of the build status of the queued commits, and
+each rendering of it is kept until the next change. Responses carry an ETag
+so that pollers get a 304 when nothing changed.
+
+"""
+import json
 import logging
-from flask import Blueprint, current_app, render_template, request
+import threading
+from hashlib import sha1 as sha1_hash
+from uuid import uuid4
+
+from flask import (Blueprint, Response, current_app, render_template,
+                   request)
 from bert_e.lib.versions import version_key
 
 from ..git_host.cache import BUILD_STATUS_CACHE
@@ -23,86 +36,210 @@ LOG = logging.getLogger(__name__)
 
 blueprint = Blueprint('status page', __name__)
 
+OUTPUT_MODES = {
+    'html': ('status.html', 'text/html'),
+    'txt': ('status.txt', 'text/plain'),
+}
 
-@blueprint.route('/', methods=['GET'])
-def display():
-    """Build and render the status page."""
-    build_key = current_app.bert_e.settings.build_key
-    output_mode = request.args.get('output')
-    if output_mode is None:
-        output_mode = 'html'
 
-    current_job = current_app.bert_e.status.get('current job', None)
-    merged_prs = current_app.bert_e.status.get('merged PRs', [])
-    queue_data = current_app.bert_e.status.get('merge queue', None)
-    pending_jobs = list(current_app.bert_e.task_queue.queue)
-    pending_jobs.reverse()
+def _build_statuses(queue_data, build_key):
+    """Return the build status of each queued commit.
+
+    Returns:
+        A tuple of (sha1, state, url) tuples.
+
+    """
+    statuses = []
+    for queued_commits in (queue_data or {}).values():
+        for _, sha1 in queued_commits:
+            status = BUILD_STATUS_CACHE[build_key].get(sha1, None)
+            if status:
+                statuses.append((sha1, status.state, status.url))
+            else:
+                statuses.append((sha1, 'NOTSTARTED', ''))
+    return tuple(statuses)
+
 
+def _queue_lines(queue_data, merged_prs, build_states):
+    """Compute the lines of the merge queue table."""
     queue_lines = []
     versions = set()
-    if queue_data:
-        for queued_commits in queue_data.values():
-            for version, _ in queued_commits:
-                versions.add(version)
-
-        versions = sorted(versions, key=version_key, reverse=True)
-        for pr_id, queued_commits in queue_data.items():
-            if int(pr_id) in [i['id'] for i in merged_prs]:
-                continue
-            line = {'pr_id': pr_id, 'hotfix': False}
-            for version, sha1 in queued_commits:
-                status = BUILD_STATUS_CACHE[build_key].get(sha1, None)
-                state = status.state if status else 'NOTSTARTED'
-                LOG.info(f'state for PR {pr_id} on {version} is {state}')
-                LOG.info(status)
-                line[version] = {
-                    'sha1': sha1,
-                    'status': state,
-                }
-            if len(queued_commits) == 1 and version.count(".") == 3:
-                line['hotfix'] = True
-            queue_lines.append(line)
-
-        # Put markers for queue display in UI
-        hf_set_first = False
-        wf_set_first = False
-        max_id = len(queue_lines) - 1
-        for i in range(max_id + 1):
-            if queue_lines[i]['hotfix']:
-                if not hf_set_first:
-                    hf_set_first = True
-                    if i + 1 <= max_id and queue_lines[i + 1]['hotfix']:
-                        queue_lines[i]['message'] = '(first in hf queue)'
-                    else:
-                        queue_lines[i]['message'] = '(alone in hf queue)'
+    if not queue_data:
+        return queue_lines, []
+
+    for queued_commits in queue_data.values():
+        for version, _ in queued_commits:
+            versions.add(version)
+    versions = sorted(versions, key=version_key, reverse=True)
+
+    merged_ids = {int(pr['id']) for pr in merged_prs}
+    for pr_id, queued_commits in queue_data.items():
+        if int(pr_id) in merged_ids:
+            continue
+        line = {'pr_id': pr_id, 'hotfix': False}
+        for version, sha1 in queued_commits:
+            line[version] = {
+                'sha1': sha1,
+                'status': build_states.get(sha1, 'NOTSTARTED'),
+            }
+        if len(queued_commits) == 1 and version.count(".") == 3:
+            line['hotfix'] = True
+        queue_lines.append(line)
+
+    # Put markers for queue display in UI
+    hf_set_first = False
+    wf_set_first = False
+    max_id = len(queue_lines) - 1
+    for i in range(max_id + 1):
+        if queue_lines[i]['hotfix']:
+            if not hf_set_first:
+                hf_set_first = True
+                if i + 1 <= max_id and queue_lines[i + 1]['hotfix']:
+                    queue_lines[i]['message'] = '(first in hf queue)'
                 else:
-                    if i + 1 > max_id or not queue_lines[i + 1]['hotfix']:
-                        queue_lines[i]['message'] = '(last in hf queue)'
+                    queue_lines[i]['message'] = '(alone in hf queue)'
             else:
-                if not wf_set_first:
-                    wf_set_first = True
-                    if i + 1 <= max_id:
-                        queue_lines[i]['message'] = '(first in wf queue)'
-                    else:
-                        queue_lines[i]['message'] = '(alone in wf queue)'
+                if i + 1 > max_id or not queue_lines[i + 1]['hotfix']:
+                    queue_lines[i]['message'] = '(last in hf queue)'
+        else:
+            if not wf_set_first:
+                wf_set_first = True
+                if i + 1 <= max_id:
+                    queue_lines[i]['message'] = '(first in wf queue)'
                 else:
-                    if i + 1 > max_id:
-                        queue_lines[i]['message'] = '(last in wf queue)'
+                    queue_lines[i]['message'] = '(alone in wf queue)'
+            else:
+                if i + 1 > max_id:
+                    queue_lines[i]['message'] = '(last in wf queue)'
+
+    return queue_lines, versions
+
+
+class StatusSnapshot(object):
+    """The status page's view model at a given point in time.
+
+    Args:
+        bert_e (BertE): the Bert-E instance to take the snapshot of.
+        queue_data (OrderedDict): the merge queue status.
+        build_statuses (tuple): the build statuses of the queued commits,
+            as returned by `_build_statuses()`.
+        etag (str): the entity tag identifying this snapshot.
+
+    """
 
-    if output_mode == 'txt':
-        output_mimetype = 'text/plain'
-        file_template = 'status.txt'
+    def __init__(self, bert_e, queue_data, build_statuses, etag):
+        self.etag = etag
+        self.merged_prs = list(bert_e.status.get('merged PRs', []))
+        self.current_job = bert_e.status.get('current job', None)
+        self.pending_jobs = list(bert_e.task_queue.queue)
+        self.pending_jobs.reverse()
+        self.completed_jobs = list(bert_e.tasks_done)
+        self.queue_lines, self.versions = _queue_lines(
+            queue_data, self.merged_prs,
+            {sha1: state for sha1, state, _ in build_statuses})
+        self._rendered = {}
+
+    def render(self, variant, func):
+        """Return the rendering of the snapshot for `variant`.
+
+        Args:
+            variant (hashable): identifies the rendering (e.g. output mode).
+            func (callable): renders the snapshot when not done already.
+
+        """
+        try:
+            return self._rendered[variant]
+        except KeyError:
+            return self._rendered.setdefault(variant, func(self))
+
+    def as_json(self):
+        def job_data(job):
+            return json.loads(job.as_json())
+
+        return json.dumps({
+            'merged_prs': [
+                {'id': pr['id'], 'merge_time': pr['merge_time'].isoformat()}
+                for pr in self.merged_prs
+            ],
+            'versions': self.versions,
+            'merge_queue': [
+                {
+                    'pr_id': line['pr_id'],
+                    'hotfix': line['hotfix'],
+                    'message': line.get('message'),
+                    'builds': {version: line[version]
+                               for version in self.versions
+                               if version in line},
+                }
+                for line in self.queue_lines
+            ],
+            'current_job':
+                job_data(self.current_job) if self.current_job else None,
+            'pending_jobs': [job_data(job) for job in self.pending_jobs],
+            'completed_jobs': [job_data(job) for job in self.completed_jobs],
+        })
+
+
+class StatusView(object):
+    """Keep the snapshot of the status page up to date."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._snapshot = None
+        # Distinguishes the entity tags of successive server processes.
+        self._salt = uuid4().hex
+
+    def snapshot(self, bert_e):
+        """Return the current snapshot, taking a new one if needed."""
+        queue_data = bert_e.status.get('merge queue', None)
+        build_statuses = _build_statuses(queue_data,
+                                         bert_e.settings.build_key)
+        key = (bert_e.status_generation, build_statuses)
+        with self._lock:
+            if key != self._key:
+                etag = sha1_hash(
+                    repr((self._salt, key)).encode()).hexdigest()
+                self._snapshot = StatusSnapshot(
+                    bert_e, queue_data, build_statuses, etag)
+                self._key = key
+            return self._snapshot
+
+
+def configure(app):
+    """Configure the status page for Bert-E's Flask server."""
+    app.status_view = StatusView()
+
+
+@blueprint.route('/', methods=['GET'])
+def display():
+    """Render the status page, from the current snapshot."""
+    output_mode = request.args.get('output')
+    if output_mode not in OUTPUT_MODES and output_mode != 'json':
+        output_mode = 'html'
+    navigation = request.args.get('navoff', True)
+    snapshot = current_app.status_view.snapshot(current_app.bert_e)
+
+    if output_mode == 'json':
+        body = snapshot.render('json', StatusSnapshot.as_json)
+        mimetype = 'application/json'
     else:
-        output_mimetype = 'text/html'
-        file_template = 'status.html'
-
-    return render_template(
-        file_template,
-        navigation=request.args.get('navoff', True),
-        current_job=current_job,
-        merged_prs=merged_prs,
-        queue_lines=queue_lines,
-        versions=versions,
-        pending_jobs=pending_jobs,
-        completed_jobs=current_app.bert_e.tasks_done
-    ), 200, {'Content-Type': output_mimetype}
+        file_template, mimetype = OUTPUT_MODES[output_mode]
+        body = snapshot.render(
+            (output_mode, navigation),
+            lambda snap: render_template(
+                file_template,
+                navigation=navigation,
+                current_job=snap.current_job,
+                merged_prs=snap.merged_prs,
+                queue_lines=snap.queue_lines,
+                versions=snap.versions,
+                pending_jobs=snap.pending_jobs,
+                completed_jobs=snap.completed_jobs
+            ))
+
+    response = Response(body, 200, {'Content-Type': mimetype})
+    response.set_etag('{}-{}-{}'.format(
+        snapshot.etag, output_mode, sha1_hash(
+            str(navigation).encode()).hexdigest()[:8]))
+    return response.make_conditional(request)
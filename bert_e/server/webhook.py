@@ -23,12 +23,25 @@ from ..git_host import github
 from ..git_host.bitbucket import BuildStatus, PullRequest
 from ..git_host.cache import BUILD_STATUS_CACHE
 from ..job import CommitJob, PullRequestJob
+from ..lib.log import log_payload
 from .auth import requires_basic_auth
 
 LOG = logging.getLogger(__name__)
 blueprint = Blueprint('Bert-E server webhook endpoints', __name__)
 
 
+def index_pull_request(bert_e, pull_request):
+    """Record the state of a pull request in the commit index, if enabled.
+
+    The index is kept up to date with the webhooks as they come in, rather
+    than when the jobs they trigger are run.
+
+    """
+    index = getattr(bert_e, 'commit_index', None)
+    if index is not None:
+        index.update_pull_request(pull_request)
+
+
 def handle_bitbucket_repo_event(bert_e, event, json_data):
     """Handle a Bitbucket webhook sent on a repository event."""
     if event in ['commit_status_created', 'commit_status_updated']:
@@ -63,6 +76,7 @@ def handle_bitbucket_pr_event(bert_e, event, json_data):
     pr_id = json_data['pullrequest']['id']
     pr = PullRequest(bert_e.client, **json_data['pullrequest'])
     LOG.info('The pull request <%s> has been updated', pr_id)
+    index_pull_request(bert_e, pr)
     return PullRequestJob(bert_e=bert_e, pull_request=pr)
 
 
@@ -70,6 +84,7 @@ def handle_github_pr_event(bert_e, json_data):
     """Handle a GitHub webhook sent on a pull request update event."""
     event = github.PullRequestEvent(client=bert_e.client, **json_data)
     pr = event.pull_request
+    index_pull_request(bert_e, pr)
     if event.action != "closed":
         return PullRequestJob(bert_e=bert_e, pull_request=pr)
     else:
@@ -111,7 +126,7 @@ def handle_github_status_event(bert_e, json_data):
 def handle_github_check_suite_event(bert_e, json_data):
     event = github.CheckSuiteEvent(client=bert_e.client, **json_data)
     status = event.status
-    LOG.debug("New check suite status received on commit {event.commit}")
+    LOG.debug("New check suite status received on commit %s", event.commit)
     cached = BUILD_STATUS_CACHE[status.key].get(event.commit)
 
     if not cached or cached.state != 'SUCCESSFUL':
@@ -124,79 +139,153 @@ def handle_github_check_suite_event(bert_e, json_data):
     return CommitJob(bert_e=bert_e, commit=event.commit)
 
 
-@blueprint.route('/bitbucket', methods=['POST'])
-@requires_basic_auth
-def parse_bitbucket_webhook():
-    """Entrypoint for handling a Bitbucket webhook."""
+class WrongRepository(ValueError):
+    """The webhook was sent for a repository Bert-E doesn't handle."""
+
+
+def bitbucket_job(bert_e, event_key, json_data):
+    """Return the job to run for a Bitbucket webhook, None if ignored.
+
+    Raises:
+        WrongRepository: if the webhook is for another repository.
+
+    """
     # The event key of the event that triggers the webhook
     # for example, repo:push.
-    entity, event = request.headers.get('X-Event-Key').split(':')
-    json_data = json.loads(request.data.decode())
-    LOG.debug('Received webhook from bitbucket:\n%s', json.dumps(json_data,
-                                                                 indent=4))
+    entity, event = event_key.split(':')
     repo_owner = json_data['repository']['owner']['username']
     repo_slug = json_data['repository']['name']
 
-    if repo_owner != current_app.bert_e.project_repo.owner:
+    if repo_owner != bert_e.project_repo.owner:
         LOG.error('received repo_owner (%s) incompatible with settings',
                   repo_owner)
-        return Response('Internal Server Error', 500)
+        raise WrongRepository(repo_owner)
 
-    if repo_slug != current_app.bert_e.project_repo.slug:
+    if repo_slug != bert_e.project_repo.slug:
         LOG.error('received repo_slug (%s) incompatible with settings',
                   repo_slug)
-        return Response('Internal Server Error', 500)
+        raise WrongRepository(repo_slug)
 
     job = None
     if entity == 'repo':
-        job = handle_bitbucket_repo_event(current_app.bert_e, event, json_data)
+        job = handle_bitbucket_repo_event(bert_e, event, json_data)
     if entity == 'pullrequest':
-        job = handle_bitbucket_pr_event(current_app.bert_e, event, json_data)
+        job = handle_bitbucket_pr_event(bert_e, event, json_data)
 
     if not job:
         LOG.debug('Ignoring unhandled event %s:%s', entity, event)
-        return Response('OK', 200)
+    return job
 
-    current_app.bert_e.put_job(job)
-    return Response('OK', 200)
 
+def github_job(bert_e, event, json_data):
+    """Return the job to run for a GitHub webhook, None if ignored.
 
-@blueprint.route('/github', methods=['POST'])
-@requires_basic_auth
-def parse_github_webhook():
-    """Entrypoint for handling a GitHub webhook."""
-    if current_app.bert_e.settings.repository_host != 'github':
-        LOG.error('Received github webhook but Bert-E is configured '
-                  'for %s', current_app.bert_e.settings.repository_host)
-        return Response('Internal Server Error', 500)
+    Raises:
+        WrongRepository: if the webhook is for another repository.
 
-    json_data = json.loads(request.data.decode())
-    LOG.debug('Received webhook from github:\n%s', json.dumps(json_data,
-                                                              indent=4))
+    """
     full_name = json_data.get('repository', {}).get('full_name')
-    if full_name != current_app.bert_e.project_repo.full_name:
+    if full_name != bert_e.project_repo.full_name:
         LOG.debug('Received webhook for %s whereas I\'m handling %s. '
-                  'Ignoring', full_name,
-                  current_app.bert_e.project_repo.full_name)
-        return Response('Internal Server Error', 500)
+                  'Ignoring', full_name, bert_e.project_repo.full_name)
+        raise WrongRepository(full_name)
 
-    event = request.headers.get('X-Github-Event')
     job = None
     LOG.debug("Received '%s' event", event)
     if event == 'pull_request':
-        job = handle_github_pr_event(current_app.bert_e, json_data)
+        job = handle_github_pr_event(bert_e, json_data)
     elif event == 'issue_comment':
-        job = handle_github_issue_comment(current_app.bert_e, json_data)
+        job = handle_github_issue_comment(bert_e, json_data)
     elif event == 'pull_request_review':
-        job = handle_github_pr_review_event(current_app.bert_e, json_data)
+        job = handle_github_pr_review_event(bert_e, json_data)
     elif event == 'status':
-        job = handle_github_status_event(current_app.bert_e, json_data)
+        job = handle_github_status_event(bert_e, json_data)
     elif event == 'check_suite':
-        job = handle_github_check_suite_event(current_app.bert_e, json_data)
+        job = handle_github_check_suite_event(bert_e, json_data)
 
     if job is None:
         LOG.debug('Ignoring event.')
+    return job
+
+
+JOB_FACTORIES = {
+    'bitbucket': bitbucket_job,
+    'github': github_job,
+}
+
+
+def repository_key(source, json_data):
+    """Return the `<owner>/<slug>` of the repository of a webhook."""
+    repository = json_data.get('repository') or {}
+    if source == 'github':
+        return repository.get('full_name')
+    return '{}/{}'.format((repository.get('owner') or {}).get('username'),
+                          repository.get('name'))
+
+
+def build_job(bert_e, source, event, payload, repositories=None):
+    """Return the job to run for a raw webhook payload, None if ignored.
+
+    Args:
+        bert_e (BertE): the instance to handle the webhook.
+        source (str): the git host that sent the webhook.
+        event (str): the event type, as sent by the git host.
+        payload (bytes): the body of the webhook.
+        repositories (dict): when set, the webhook is handled by the
+            instance of its repository in this dict, keyed by
+            `<owner>/<slug>`, and by `bert_e` if there is none.
+
+    """
+    log_payload(LOG, logging.DEBUG,
+                'Received webhook from {}:\n%s'.format(source), payload)
+    json_data = json.loads(payload.decode())
+    if repositories:
+        bert_e = repositories.get(repository_key(source, json_data), bert_e)
+    return JOB_FACTORIES[source](bert_e, event, json_data)
+
+
+def handle_webhook(source, event, queued=('Accepted', 202)):
+    """Handle the webhook being requested from `source`.
+
+    In inbox mode, the payload is only recorded and 202 returned right
+    away. Otherwise its job is built and queued, and the `queued` response
+    returned.
+
+    """
+    inbox = getattr(current_app, 'inbox', None)
+    if inbox is not None:
+        # the job is built by the inbox consumer
+        inbox.append(source, event, request.data)
+        return Response('Accepted', 202)
+
+    try:
+        job = build_job(current_app.bert_e, source, event, request.data,
+                        current_app.repositories)
+    except WrongRepository:
+        return Response('Internal Server Error', 500)
+
+    if job is None:
         return Response('OK', 200)
 
-    current_app.bert_e.put_job(job)
-    return Response('Accepted', 202)
+    job.bert_e.put_job(job)
+    return Response(*queued)
+
+
+@blueprint.route('/bitbucket', methods=['POST'])
+@requires_basic_auth
+def parse_bitbucket_webhook():
+    """Entrypoint for handling a Bitbucket webhook."""
+    return handle_webhook('bitbucket', request.headers.get('X-Event-Key'),
+                          queued=('OK', 200))
+
+
+@blueprint.route('/github', methods=['POST'])
+@requires_basic_auth
+def parse_github_webhook():
+    """Entrypoint for handling a GitHub webhook."""
+    if current_app.bert_e.settings.repository_host != 'github':
+        LOG.error('Received github webhook but Bert-E is configured '
+                  'for %s', current_app.bert_e.settings.repository_host)
+        return Response('Internal Server Error', 500)
+
+    return handle_webhook('github', request.headers.get('X-Github-Event'))
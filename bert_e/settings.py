@@ -1,8 +1,10 @@
+from collections import OrderedDict
 from os.path import exists, join
 
 import yaml
 import logging
 import os
+import threading
 from marshmallow import (
     Schema, fields, post_load, pre_load, validates_schema, ValidationError,
     EXCLUDE)
@@ -17,15 +19,21 @@ class BertEContextFilter(logging.Filter):
     """This is a filter which will inject Bert-E contextual
     information into the log.
 
+    When several repositories are handled by the process, the settings of
+    the one a thread works on can be set in `BertEContextFilter.local`.
+
     """
+    local = threading.local()
+
     def __init__(self, settings):
         self.settings = settings
 
     def filter(self, record):
+        settings = getattr(self.local, 'settings', None) or self.settings
         record.instance = "{host}-{owner}-{slug}".format(
-            host=self.settings['repository_host'],
-            owner=self.settings['repository_owner'],
-            slug=self.settings['repository_slug']
+            host=settings['repository_host'],
+            owner=settings['repository_owner'],
+            slug=settings['repository_slug']
         )
         return True
 
@@ -195,6 +203,23 @@ class SettingsSchema(Schema):
 
     send_bot_status = fields.Bool(required=False, load_default=False)
 
+    webhook_inbox = fields.Str(required=False, load_default='')
+
+    fetch_branches = fields.List(fields.Str(), required=False,
+                                 load_default=[])
+
+    clone_filter = fields.Str(required=False, load_default='')
+
+    git_maintenance_budget = fields.Int(required=False, load_default=0)
+
+    job_time_budget = fields.Int(required=False, load_default=0)
+
+    speculative_evaluation = fields.Bool(required=False, load_default=False)
+    evaluation_fingerprints = fields.Bool(required=False,
+                                          load_default=False)
+    commit_index = fields.Bool(required=False, load_default=False)
+    prefetch_jira_issues = fields.Bool(required=False, load_default=False)
+
     @pre_load(pass_many=True)
     def load_env(self, data, **kwargs):
         """Load environment variables"""
@@ -283,6 +308,52 @@ def setup_settings(settings_file: str) -> dict:
         The settings as a deserialized yaml object.
 
     """
+    data = _read_settings_file(settings_file)
+    data.pop('repositories', None)
+    return _load_settings(settings_file, data)
+
+
+def setup_repositories_settings(settings_file: str) -> OrderedDict:
+    """Load and checks the settings of each repository from a yaml file.
+
+    The file may hold a `repositories` map from repository slugs to the
+    settings specific to each repository, which override the settings at
+    the top level of the file. Without it, the file describes a single
+    repository.
+
+    Args:
+        - settings_file (str): path of the yaml file to load.
+
+    Raises:
+        - SettingsFileNotFound
+        - IncorrectSettingsFile if the yaml syntax can't be parsed
+        - MalformedSettings if one or more fields from the settings are
+                            incorrect (wrong types or missing values)
+
+    Returns:
+        An ordered dict of the settings of each repository, keyed by
+        `<owner>/<slug>`.
+
+    """
+    data = _read_settings_file(settings_file)
+    repositories = data.pop('repositories', None) or {'': {}}
+    if not isinstance(repositories, dict):
+        raise IncorrectSettingsFile(settings_file)
+
+    all_settings = OrderedDict()
+    for name, overrides in repositories.items():
+        repo_data = dict(data)
+        if name:
+            repo_data['repository_slug'] = name
+        repo_data.update(overrides or {})
+        settings = _load_settings(settings_file, repo_data)
+        key = '{}/{}'.format(settings.repository_owner,
+                             settings.repository_slug)
+        all_settings[key] = settings
+    return all_settings
+
+
+def _read_settings_file(settings_file):
     if not exists(settings_file):
         raise SettingsFileNotFound(settings_file)
 
@@ -292,7 +363,10 @@ def setup_settings(settings_file: str) -> dict:
             data = yaml.load(f, Loader=yaml.BaseLoader)
         except Exception as err:
             raise IncorrectSettingsFile(settings_file) from err
+    return data
+
 
+def _load_settings(settings_file, data):
     try:
         settings = SettingsSchema().load(data)
     except IncorrectSettingsFile as exp:
@@ -0,0 +1,26 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of Bert-E's job handlers on synthetic repositories.
+
+The harness generates a local bare repository with a configurable number of
+development and hotfix branches, tags, open and queued pull requests, and
+runs the real job handlers against the `mock` git host.
+
+Run it with:
+
+    $ python -m bert_e.tests.bench --profile small
+    $ python -m bert_e.tests.bench --profile small --baseline \\
+        bert_e/tests/bench/baseline.json
+
+"""
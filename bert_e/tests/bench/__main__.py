@@ -0,0 +1,116 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Command line entry point of the benchmark harness."""
+import argparse
+import json
+import logging
+import sys
+
+from . import scenario
+from .metrics import compare
+from .repository import PROFILES, Profile
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m bert_e.tests.bench',
+        description='Benchmark Bert-E jobs on a synthetic repository.')
+    parser.add_argument(
+        '--profile', choices=sorted(PROFILES), default='small',
+        help='Size of the generated repository. Default: small')
+    for field in Profile._fields:
+        parser.add_argument(
+            '--' + field.replace('_', '-'), type=int, dest=field,
+            help='Override the profile\'s number of {}.'.format(
+                field.replace('_', ' ')))
+    parser.add_argument(
+        '--clone-filter', metavar='FILTER',
+        help='Clone the repository partially, e.g. with blob:none.')
+    parser.add_argument(
+        '--fetch-branch', action='append', dest='fetch_branches',
+        metavar='PATTERN',
+        help='Only fetch the branches matching PATTERN, can be repeated.')
+    parser.add_argument(
+        '--save-baseline', metavar='FILE',
+        help='Write the results to FILE for later comparisons.')
+    parser.add_argument(
+        '--baseline', metavar='FILE',
+        help='Compare the results with FILE, exit 1 on regression.')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='Allowed increase of git commands and API calls. Default: 0.1')
+    parser.add_argument(
+        '--time-tolerance', type=float, default=0.5,
+        help='Allowed increase of wall time and peak RSS. Default: 0.5')
+    parser.add_argument(
+        '-v', action='store_true', dest='verbose', default=False,
+        help='Verbose mode.')
+    return parser
+
+
+def format_results(results, statuses):
+    lines = ['{:<22}{:>6}{:>10}{:>8}{:>7}{:>12}  {}'.format(
+        'phase', 'jobs', 'time (s)', 'git', 'api', 'peak rss kB',
+        'statuses')]
+    for phase, metrics in results.items():
+        lines.append('{:<22}{jobs:>6}{wall_time:>10.2f}{git_commands:>8}'
+                     '{api_calls:>7}{peak_rss_kb:>12}  {}'.format(
+                         phase, dict(statuses.get(phase, {})), **metrics))
+    for phase, metrics in results.items():
+        if 'cache_kb' in metrics:
+            lines.append('\ngit cache after {}: {} kB'.format(
+                phase, metrics['cache_kb']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    profile = PROFILES[args.profile]._replace(**{
+        field: getattr(args, field) for field in Profile._fields
+        if getattr(args, field) is not None
+    })
+    settings = {}
+    if args.clone_filter:
+        settings['clone_filter'] = args.clone_filter
+    if args.fetch_branches:
+        settings['fetch_branches'] = args.fetch_branches
+    results, statuses = scenario.run(profile, settings)
+    print(format_results(results, statuses))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump({'profile': profile._asdict(), 'phases': results},
+                      baseline_file, indent=2)
+            baseline_file.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['profile'] != profile._asdict():
+            print('Baseline was recorded with a different profile: {}'.format(
+                baseline['profile']))
+            return 2
+        regressions = compare(results, baseline['phases'], args.tolerance,
+                              args.time_tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
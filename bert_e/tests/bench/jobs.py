@@ -0,0 +1,128 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark of the memory held by the history of completed jobs.
+
+Pull request jobs are built from GitHub webhook payloads, given the state
+a job has once processed (cascade, branches, trace), and kept in a history
+of the same size as Bert-E's, either as whole jobs or as the records Bert-E
+keeps. The memory they retain is measured with tracemalloc.
+
+    $ python -m bert_e.tests.bench.jobs --jobs 1000
+
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from types import SimpleNamespace
+
+from bert_e.git_host import github
+from bert_e.job import CompletedJob, PullRequestJob
+from bert_e.lib.settings_dict import SettingsDict
+from bert_e.workflow.gitwaterflow.branches import (BranchCascade,
+                                                   branch_factory)
+from .webhook import pull_request_event
+
+VERSIONS = ('4.3', '5.1', '10.0', '10')
+
+
+def _bert_e():
+    """Return a stand-in for BertE, with settings of a usual size."""
+    settings = SettingsDict({
+        'repository_host': 'github',
+        'repository_owner': 'bench',
+        'repository_slug': 'bench_repo',
+        'pull_request_base_url':
+            'https://github.com/bench/bench_repo/pull/{pr_id}',
+    })
+    settings.update({'setting_%d' % index: 'value' for index in range(60)})
+    return SimpleNamespace(settings=settings, git_repo=None,
+                           project_repo=SimpleNamespace(full_name='bench'))
+
+
+def processed_job(bert_e, payload, spans=200):
+    """Return a pull request job in the state it has once processed."""
+    event = github.PullRequestEvent(client=None, **json.loads(payload))
+    job = PullRequestJob(bert_e=bert_e, pull_request=event.pull_request)
+    job.settings.update({'approve': False, 'after_pull_request': set()})
+    src = job.git.src_branch = branch_factory(None, 'feature/TEST-00001')
+    job.git.dst_branch = branch_factory(None, 'development/4.3')
+    job.git.cascade = BranchCascade()
+    job.git.cascade.dst_branches = [
+        branch_factory(None, 'development/' + version)
+        for version in VERSIONS]
+    job.git.wbranches = [src] + [
+        branch_factory(None, 'w/{}/{}'.format(version, src))
+        for version in VERSIONS[1:]]
+    for index in range(spans):
+        job.trace.phase('phase %d' % (index // 50))
+        job.trace.add_span('git', 'git rev-parse', 0.0, 0.001)
+    job.trace.close()
+    job.status = 'BuildInProgress'
+    return job
+
+
+def retained_memory(jobs, payload_size, compact):
+    """Return the memory, in bytes, retained by a history of `jobs` jobs.
+
+    Args:
+        jobs (int): number of jobs in the history.
+        payload_size (int): size of the webhook payloads of the jobs.
+        compact (bool): keep the records of the jobs rather than the jobs.
+
+    """
+    payload = pull_request_event(payload_size)
+    bert_e = _bert_e()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        history = deque(maxlen=jobs)
+        for _ in range(jobs):
+            job = processed_job(bert_e, payload)
+            if compact:
+                job.complete()
+                history.appendleft(CompletedJob(job))
+            else:
+                job.end_time = datetime.now()
+                history.appendleft(job)
+        del job
+        return tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m bert_e.tests.bench.jobs',
+        description='Benchmark the memory held by the history of jobs.')
+    parser.add_argument(
+        '--jobs', type=int, default=1000,
+        help='Number of jobs in the history. Default: 1000')
+    parser.add_argument(
+        '--size', type=int, default=16, metavar='KB',
+        help='Size of the webhook payloads, in kB. Default: 16')
+    args = parser.parse_args(argv)
+    print('{:<10}{:>16}{:>16}'.format('history', 'retained (MB)',
+                                      'per job (kB)'))
+    for name, compact in (('jobs', False), ('records', True)):
+        size = retained_memory(args.jobs, args.size * 1024, compact)
+        print('{:<10}{:>16.1f}{:>16.1f}'.format(
+            name, size / 1024 ** 2, size / 1024 / args.jobs))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
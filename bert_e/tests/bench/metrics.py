@@ -0,0 +1,157 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Per-phase measurement of wall time, git and API calls, and memory."""
+import resource
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from bert_e.git_host import mock
+from bert_e.lib import git
+
+
+# Methods of the mock git host that would be an API call on a real host.
+GIT_HOST_METHODS = {
+    mock.Repository: (
+        'get_build_status', 'get_build_url', 'set_build_status',
+        'get_pull_requests', 'get_pull_request', 'create_pull_request',
+    ),
+    mock.PullRequestController: (
+        'add_comment', 'get_comments', 'get_change_requests',
+        'get_approvals', 'get_participants', 'decline', 'set_bot_status',
+    ),
+}
+
+
+def _reset_peak_rss():
+    """Reset the process' resident set size high water mark (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    """Return the resident set size high water mark in kB."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Recorder(object):
+    """Record metrics of the code run inside named phases.
+
+    Use as a context manager to install the counting hooks, then wrap each
+    measured section in a `phase()` block.
+
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.git_commands = 0
+        self.api_calls = Counter()
+        self._patched = []
+
+    def __enter__(self):
+        self._patch(git, 'cmd', self._count_git)
+        for cls, methods in GIT_HOST_METHODS.items():
+            for name in methods:
+                self._patch(cls, name, self._count_api(cls, name))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        while self._patched:
+            owner, name, original = self._patched.pop()
+            setattr(owner, name, original)
+
+    def _patch(self, owner, name, factory):
+        original = getattr(owner, name)
+        self._patched.append((owner, name, original))
+        setattr(owner, name, factory(original))
+
+    def _count_git(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            self.git_commands += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    def _count_api(self, cls, name):
+        def factory(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                self.api_calls['{}.{}'.format(cls.__name__, name)] += 1
+                return func(*args, **kwargs)
+            return wrapper
+        return factory
+
+    @contextmanager
+    def phase(self, name, jobs=0):
+        """Measure the enclosed code as phase `name`."""
+        git_start = self.git_commands
+        api_start = sum(self.api_calls.values())
+        _reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = OrderedDict([
+                ('wall_time', round(time.perf_counter() - start, 3)),
+                ('jobs', jobs),
+                ('git_commands', self.git_commands - git_start),
+                ('api_calls', sum(self.api_calls.values()) - api_start),
+                ('peak_rss_kb', _peak_rss_kb()),
+            ])
+
+
+def compare(results, baseline, tolerance=0.1, time_tolerance=0.5):
+    """Compare benchmark results against a saved baseline.
+
+    Git command and API call counts are deterministic for a given profile,
+    so they are held to `tolerance`. Wall time and memory depend on the
+    machine and get the looser `time_tolerance`.
+
+    Returns:
+        A list of human-readable regression descriptions (empty if none).
+
+    """
+    limits = {
+        'git_commands': tolerance,
+        'api_calls': tolerance,
+        'wall_time': time_tolerance,
+        'peak_rss_kb': time_tolerance,
+        'cache_kb': time_tolerance,
+    }
+    regressions = []
+    for phase, metrics in results.items():
+        reference = baseline.get(phase)
+        if reference is None:
+            continue
+        for metric, limit in limits.items():
+            value, ref = metrics.get(metric), reference.get(metric)
+            if value is None or not ref:
+                continue
+            if value > ref * (1 + limit):
+                regressions.append(
+                    '{}: {} went from {} to {} (+{:.0%})'.format(
+                        phase, metric, ref, value, value / ref - 1))
+    return regressions
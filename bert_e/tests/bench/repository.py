@@ -0,0 +1,147 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Generation of synthetic repositories on the mock git host."""
+import os
+from collections import namedtuple
+
+from bert_e.git_host import client_factory
+from bert_e.lib.git import Repository as GitRepository
+
+
+Profile = namedtuple('Profile', [
+    'dev_branches', 'hotfix_branches', 'tags', 'commits_per_branch',
+    'open_prs', 'queued_prs', 'blob_kb',
+])
+
+PROFILES = {
+    'small': Profile(dev_branches=3, hotfix_branches=1, tags=30,
+                     commits_per_branch=5, open_prs=5, queued_prs=3,
+                     blob_kb=0),
+    'medium': Profile(dev_branches=6, hotfix_branches=2, tags=300,
+                      commits_per_branch=20, open_prs=20, queued_prs=8,
+                      blob_kb=0),
+    'large': Profile(dev_branches=12, hotfix_branches=4, tags=3000,
+                     commits_per_branch=50, open_prs=60, queued_prs=20,
+                     blob_kb=0),
+}
+
+OWNER = 'bench'
+SLUG = 'bench_repo'
+ROBOT = 'robot'
+ADMIN = 'admin'
+CONTRIBUTOR = 'contributor'
+
+
+def _commit(repo, message, filename=None, content=None):
+    if filename is None:
+        repo.cmd('git commit -q --allow-empty -m %s', message)
+        return
+    with open(os.path.join(repo.cmd_directory, filename), 'wb') as file_:
+        file_.write(message.encode() if content is None else content)
+    repo.cmd('git add %s', filename)
+    repo.cmd('git commit -q -m %s', message)
+
+
+def generate(profile):
+    """Create the benchmark repository and its pull requests.
+
+    The repository holds `dev_branches` chained development branches
+    (development/1.0 is contained in development/2.0, and so on),
+    `hotfix_branches` hotfix branches and `tags` version tags spread over the
+    development branches. One feature branch and pull request towards
+    development/1.0 is created for each open and queued pull request.
+
+    With a non-zero `blob_kb`, each commit of the development branches
+    replaces a binary file of that size, as vendored binaries would.
+
+    Returns:
+        The list of pull request ids, in creation order.
+
+    """
+    robot = client_factory('mock', ROBOT, 'password', 'robot@nowhere.com')
+    robot.create_repository(SLUG, owner=OWNER)
+    contributor = client_factory('mock', CONTRIBUTOR, 'password',
+                                 'contributor@nowhere.com')
+    project_repo = contributor.get_repository(SLUG, owner=OWNER)
+
+    with GitRepository(project_repo.git_url) as repo:
+        repo.cmd_directory = repo.tmp_directory
+        repo.cmd('git init -q --initial-branch=master')
+        repo.config('user.email', 'contributor@nowhere.com')
+        repo.config('user.name', CONTRIBUTOR)
+        repo.cmd('git remote add origin %s', project_repo.git_url)
+        # allow partial clones
+        repo.cmd('git config uploadpack.allowFilter true',
+                 cwd=project_repo.git_url)
+        _commit(repo, 'Initial commit', 'README')
+
+        tips = []
+        for major in range(1, profile.dev_branches + 1):
+            repo.cmd('git checkout -q -b development/%d.0', major)
+            for index in range(profile.commits_per_branch):
+                message = 'Change {} on {}.0'.format(index, major)
+                if profile.blob_kb:
+                    _commit(repo, message, 'vendor.bin',
+                            os.urandom(profile.blob_kb * 1024))
+                else:
+                    _commit(repo, message)
+            tips.append(repo.cmd('git rev-parse HEAD').strip())
+
+        # Tags are created in bulk to keep large profiles fast to generate.
+        refs = []
+        for index in range(profile.tags):
+            major = index % profile.dev_branches + 1
+            micro = index // profile.dev_branches
+            refs.append('create refs/tags/{}.0.{} {}'.format(
+                major, micro, tips[major - 1]))
+        for major in range(1, profile.hotfix_branches + 1):
+            refs.append('create refs/heads/hotfix/{}.0.0 {}'.format(
+                major, tips[major - 1]))
+        refs_file = os.path.join(repo.tmp_directory, 'refs.txt')
+        with open(refs_file, 'w') as file_:
+            file_.write('\n'.join(refs) + '\n')
+        repo.cmd('git update-ref --stdin < %s', refs_file)
+        os.remove(refs_file)
+
+        for index in range(profile.open_prs + profile.queued_prs):
+            branch = 'bugfix/TEST-{:05d}'.format(index + 1)
+            repo.cmd('git checkout -q -b %s development/1.0', branch)
+            _commit(repo, 'Fix {}'.format(index + 1),
+                    'fix_{:05d}'.format(index + 1))
+        repo.cmd('git push -q --all origin')
+        repo.cmd('git push -q --tags origin')
+
+    return [
+        project_repo.create_pull_request(
+            title='Fix {}'.format(index + 1),
+            src_branch='bugfix/TEST-{:05d}'.format(index + 1),
+            dst_branch='development/1.0',
+        ).id
+        for index in range(profile.open_prs + profile.queued_prs)
+    ]
+
+
+def comment(pr_id, text, author=ADMIN):
+    """Comment on a pull request of the benchmark repository."""
+    client = client_factory('mock', author, 'password',
+                            '{}@nowhere.com'.format(author))
+    pull_request = client.get_repository(SLUG, owner=OWNER).get_pull_request(
+        pr_id)
+    pull_request.add_comment(text)
+
+
+def delete():
+    """Remove the benchmark repository from the mock git host."""
+    robot = client_factory('mock', ROBOT, 'password', 'robot@nowhere.com')
+    robot.delete_repository(SLUG, owner=OWNER)
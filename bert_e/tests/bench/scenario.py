@@ -0,0 +1,198 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark scenario: run Bert-E's main jobs on a synthetic repository."""
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from bert_e.bert_e import BertE
+from bert_e.job import PullRequestJob, QueuesJob
+from bert_e.jobs.rebuild_queues import RebuildQueuesJob
+from bert_e.lib.git import Repository as GitRepository
+from bert_e.settings import setup_settings
+
+from . import repository
+from .metrics import Recorder
+
+
+SETTINGS = """
+repository_owner: {owner}
+repository_slug: {slug}
+repository_host: mock
+robot: {robot}
+robot_email: robot@nowhere.com
+pull_request_base_url: https://host/{owner}/{slug}/pull-requests/{{pr_id}}
+commit_base_url: https://host/{owner}/{slug}/commits/{{commit_id}}
+build_key: pre-merge
+required_leader_approvals: 0
+required_peer_approvals: 1
+admins:
+  - {admin}
+"""
+
+BYPASS_ALL = [
+    'bypass_author_approval',
+    'bypass_build_status',
+    'bypass_incompatible_branch',
+    'bypass_jira_check',
+    'bypass_peer_approval',
+    'bypass_leader_approval',
+]
+
+
+class Scenario(object):
+    """Benchmark scenario on a freshly generated repository.
+
+    The phases are run in order, each one on the state left by the previous:
+
+    - handle_pull_request: first evaluation of the open pull requests,
+    - queue_pull_requests: bring the other pull requests to the queues,
+    - rebuild_queues: rebuild the queues from scratch,
+    - handle_merge_queues: mark queues green and merge them.
+
+    A first `clone` phase measures the initial clone of the repository, and
+    the disk usage of Bert-E's cache of it (`cache_kb`).
+
+    Args:
+        profile (Profile): size of the repository to generate.
+        workdir (str): directory in which to write the settings and the
+            git mirror cache. A temporary directory is used if omitted.
+        settings (dict): settings to set on top of the default ones.
+
+    """
+
+    def __init__(self, profile, workdir=None, settings=None):
+        self.profile = profile
+        self.workdir = workdir
+        self.settings = settings or {}
+        self.statuses = {}
+        self._home = None
+        self._own_workdir = workdir is None
+
+    def __enter__(self):
+        if self._own_workdir:
+            self.workdir = tempfile.mkdtemp(prefix='bert-e-bench-')
+        # Bert-E keeps its git mirror cache in ~/.bert-e, isolate it.
+        self._home = os.environ.get('HOME')
+        os.environ['HOME'] = self.workdir
+        self.pr_ids = repository.generate(self.profile)
+        settings_file = os.path.join(self.workdir, 'settings.yml')
+        with open(settings_file, 'w') as file_:
+            file_.write(SETTINGS.format(owner=repository.OWNER,
+                                        slug=repository.SLUG,
+                                        robot=repository.ROBOT,
+                                        admin=repository.ADMIN))
+        settings = setup_settings(settings_file)
+        settings['robot_password'] = 'password'
+        settings['cmd_line_options'] = []
+        settings['backtrace'] = True
+        settings['quiet'] = True
+        settings.update(self.settings)
+        self.bert_e = BertE(settings)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        repository.delete()
+        if self._home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self._home
+        if self._own_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _drain(self, phase):
+        """Process all queued jobs, return the number of jobs processed."""
+        count = 0
+        statuses = self.statuses.setdefault(phase, Counter())
+        while not self.bert_e.task_queue.empty():
+            job = self.bert_e.process_task()
+            statuses[job.status] += 1
+            count += 1
+        return count
+
+    def _pr_jobs(self, pr_ids):
+        for pr_id in pr_ids:
+            self.bert_e.put_job(PullRequestJob(
+                bert_e=self.bert_e,
+                pull_request=self.bert_e.project_repo.get_pull_request(pr_id),
+            ))
+
+    def _set_queues_green(self):
+        url = self.bert_e.project_repo.git_url
+        refs = GitRepository(url).cmd(
+            'git for-each-ref --format="%(objectname)" refs/heads/q/',
+            cwd=url)
+        for sha1 in set(refs.split()):
+            self.bert_e.project_repo.set_build_status(
+                sha1, self.bert_e.settings.build_key, 'SUCCESSFUL')
+
+    def run(self, recorder):
+        """Run all the phases, recording their metrics in `recorder`."""
+        open_prs = self.pr_ids[:self.profile.open_prs]
+        queued_prs = self.pr_ids[self.profile.open_prs:]
+
+        with recorder.phase('clone'):
+            self.bert_e.git_repo.clone()
+        recorder.phases['clone']['cache_kb'] = _disk_usage_kb(
+            os.path.join(self.workdir, '.bert-e'))
+
+        self._pr_jobs(open_prs)
+        with recorder.phase('handle_pull_request', len(open_prs)):
+            self._drain('handle_pull_request')
+
+        # Options are set through comments so that they survive the rebuild
+        for pr_id in queued_prs:
+            repository.comment(pr_id, '@{} {}'.format(
+                repository.ROBOT, ' '.join(BYPASS_ALL)))
+        self._pr_jobs(queued_prs)
+        with recorder.phase('queue_pull_requests', len(queued_prs)):
+            self._drain('queue_pull_requests')
+
+        self.bert_e.put_job(RebuildQueuesJob(bert_e=self.bert_e))
+        with recorder.phase('rebuild_queues'):
+            count = self._drain('rebuild_queues')
+        recorder.phases['rebuild_queues']['jobs'] = count
+
+        self._set_queues_green()
+        self.bert_e.put_job(QueuesJob(bert_e=self.bert_e))
+        with recorder.phase('handle_merge_queues', 1):
+            self._drain('handle_merge_queues')
+
+
+def _disk_usage_kb(path):
+    usage = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            usage += os.lstat(os.path.join(root, name)).st_blocks * 512
+    return usage // 1024
+
+
+def run(profile, settings=None):
+    """Generate a repository for `profile`, and benchmark the scenario.
+
+    Args:
+        profile (Profile): size of the repository to generate.
+        settings (dict): settings to set on top of the default ones.
+
+    Returns:
+        A tuple (metrics, statuses), where metrics maps phase names to their
+        measurements, and statuses maps phase names to a Counter of the
+        job statuses.
+
+    """
+    with Recorder() as recorder, Scenario(profile,
+                                          settings=settings) as scenario:
+        scenario.run(recorder)
+    return recorder.phases, scenario.statuses
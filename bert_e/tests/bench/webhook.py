@@ -0,0 +1,185 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark of the ingestion of GitHub webhooks by the server.
+
+Pull request events of increasing sizes are posted to the /github endpoint
+through Flask's test client, with the server's loggers at INFO then DEBUG
+level, and the latency of each request is measured. Jobs created by the
+webhooks are dropped instead of being processed.
+
+    $ python -m bert_e.tests.bench.webhook --requests 200
+
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import sys
+import time
+from statistics import median
+from types import SimpleNamespace
+
+from bert_e import server
+from bert_e.lib.settings_dict import SettingsDict
+
+FULL_NAME = 'bench/bench_repo'
+PAYLOAD_SIZES = (4 * 1024, 64 * 1024, 512 * 1024)
+LOGIN = PASSWORD = 'bench'
+
+
+class _BertE(object):
+    """Stand-in for BertE that only collects the jobs it is given."""
+
+    def __init__(self):
+        self.settings = SettingsDict({
+            'repository_host': 'github',
+            'repository_owner': 'bench',
+            'repository_slug': 'bench_repo',
+        })
+        self.project_repo = SimpleNamespace(full_name=FULL_NAME)
+        self.git_repo = None
+        self.client = None
+        self.jobs = 0
+
+    def put_job(self, job):
+        self.jobs += 1
+
+
+def _user(login):
+    return {'id': 1, 'login': login, 'type': 'User',
+            'url': 'https://api.github.com/users/' + login}
+
+
+def pull_request_event(size):
+    """Return a `pull_request` event body of about `size` bytes.
+
+    The payload is padded with labels, as real payloads are made of many
+    small nested objects rather than of a few large strings.
+
+    """
+    repo = {
+        'name': 'bench_repo', 'full_name': FULL_NAME, 'private': False,
+        'owner': _user('bench'), 'description': 'Benchmark repository',
+        'default_branch': 'development/1.0',
+    }
+    repo.update({
+        '{}_url'.format(name): 'https://api.github.com/repos/{}/{}'.format(
+            FULL_NAME, name)
+        for name in ('archive', 'blobs', 'branches', 'comments', 'commits',
+                     'compare', 'contents', 'events', 'git_refs', 'hooks',
+                     'issues', 'labels', 'merges', 'pulls', 'releases')
+    })
+    event = {
+        'action': 'synchronize',
+        'number': 1,
+        'pull_request': {
+            'number': 1, 'state': 'open', 'title': 'Benchmark',
+            'url': 'https://api.github.com/repos/{}/pulls/1'.format(
+                FULL_NAME),
+            'html_url': 'https://github.com/{}/pull/1'.format(FULL_NAME),
+            'user': _user('contributor'),
+            'body': 'Benchmark pull request',
+            'head': {'ref': 'feature/bench', 'sha': 'a' * 40,
+                     'label': 'bench:feature/bench', 'repo': repo,
+                     'user': _user('bench')},
+            'base': {'ref': 'development/1.0', 'sha': 'b' * 40,
+                     'label': 'bench:development/1.0', 'repo': repo,
+                     'user': _user('bench')},
+            'created_at': '2018-01-01T00:00:00Z',
+            'updated_at': '2018-01-01T00:00:00Z',
+        },
+        'repository': repo,
+        'sender': _user('contributor'),
+    }
+    label = {'id': 1, 'name': 'label', 'color': 'ededed', 'default': False,
+             'description': 'Benchmark label',
+             'url': 'https://api.github.com/repos/{}/labels/label'.format(
+                 FULL_NAME)}
+    padding = max(0, size - len(json.dumps(event)))
+    event['pull_request']['labels'] = (
+        [label] * (padding // (len(json.dumps(label)) + 2)))
+    return json.dumps(event).encode()
+
+
+def run(sizes=PAYLOAD_SIZES, requests=100):
+    """Post webhooks and return the latencies in ms by (level, size)."""
+    os.environ.setdefault('WEBHOOK_LOGIN', LOGIN)
+    os.environ.setdefault('WEBHOOK_PWD', PASSWORD)
+    os.environ.setdefault('BERT_E_CLIENT_ID', 'bench')
+    os.environ.setdefault('BERT_E_CLIENT_SECRET', 'bench')
+    auth = '{}:{}'.format(os.environ['WEBHOOK_LOGIN'],
+                          os.environ['WEBHOOK_PWD'])
+    headers = {
+        'X-Github-Event': 'pull_request',
+        'Authorization': 'Basic ' + base64.b64encode(auth.encode()).decode(),
+    }
+    client = server.setup_server(_BertE()).test_client()
+
+    # emit the records for real, so that their formatting is measured too
+    handler = logging.StreamHandler(io.StringIO())
+    logger = logging.getLogger('bert_e')
+    logger.addHandler(handler)
+    previous_level = logger.level
+    results = {}
+    try:
+        for level in (logging.INFO, logging.DEBUG):
+            logger.setLevel(level)
+            for size in sizes:
+                payload = pull_request_event(size)
+                latencies = []
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    client.post('/github', data=payload, headers=headers)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    handler.stream.seek(0)
+                    handler.stream.truncate()
+                results[(logging.getLevelName(level), size)] = latencies
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(previous_level)
+    return results
+
+
+def format_results(results):
+    lines = ['{:<8}{:>12}{:>14}{:>14}'.format(
+        'level', 'payload kB', 'median (ms)', 'p95 (ms)')]
+    for (level, size), latencies in results.items():
+        latencies = sorted(latencies)
+        lines.append('{:<8}{:>12}{:>14.2f}{:>14.2f}'.format(
+            level, size // 1024, median(latencies),
+            latencies[int(len(latencies) * 0.95) - 1]))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m bert_e.tests.bench.webhook',
+        description='Benchmark the ingestion of GitHub webhooks.')
+    parser.add_argument(
+        '--requests', type=int, default=100,
+        help='Number of requests per payload size and level. Default: 100')
+    parser.add_argument(
+        '--size', type=int, action='append', dest='sizes', metavar='KB',
+        help='Payload size in kB, can be repeated. Default: 4, 64 and 512')
+    args = parser.parse_args(argv)
+    sizes = [size * 1024 for size in args.sizes] if args.sizes \
+        else PAYLOAD_SIZES
+    print(format_results(run(sizes, args.requests)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
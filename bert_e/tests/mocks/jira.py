@@ -39,3 +39,7 @@ class JiraIssue(object):
         #          u'issuetype': u'Bug'}
         self.fields = Fields()
         self.key = issue_id
+
+
+def search_issues(account_url, keys, email, token):
+    return [JiraIssue(account_url, key, email, token) for key in keys]
@@ -17,6 +17,7 @@ import logging
 import os.path
 import re
 import sys
+import tempfile
 import time
 import unittest
 import warnings
@@ -47,16 +48,21 @@ from bert_e.git_host.base import NoSuchRepository
 from bert_e.git_host.factory import client_factory
 from bert_e.job import CommitJob, PullRequestJob
 from bert_e.lib import jira as jira_api
+from bert_e.lib.deadline import Deadline, DeadlineExceeded
 from bert_e.lib.git import Repository as GitRepository
 from bert_e.lib.git import Branch, MergeFailedException
+from bert_e.lib.inbox import Inbox
 from bert_e.lib.retry import RetryHandler
 from bert_e.lib.simplecmd import CommandError, cmd
+from bert_e.reactor import Reactor
 from bert_e.settings import setup_settings
 from bert_e.workflow import gitwaterflow as gwf
 from bert_e.workflow import git_utils
 from bert_e.workflow.gitwaterflow import branches as gwfb
 from bert_e.workflow.gitwaterflow import integration as gwfi
 from bert_e.workflow.gitwaterflow import queueing as gwfq
+from bert_e.workflow.gitwaterflow.fingerprint import FINGERPRINT_RESULTS
+from bert_e.workflow.gitwaterflow.speculation import SPECULATIVE_RESULTS
 
 from .mocks import jira as jira_api_mock
 
@@ -240,6 +246,20 @@ class QuickTest(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
 
+    @patch('requests.Session.request')
+    def test_retry_within_deadline(self, fake_request):
+        fake_answer_internal.attempt = 0
+
+        def fake_answer(*args, **kwargs):
+            return fake_answer_internal(429,
+                                        *args, **kwargs)
+        fake_request.side_effect = fake_answer
+
+        session = BertESession()
+        with Deadline(10).activate(), self.assertRaises(DeadlineExceeded):
+            session.request('GET', "http://localhost/")
+        self.assertLessEqual(fake_request.call_args[1]['timeout'], 10)
+
     def test_feature_branch_names(self):
         with self.assertRaises(exns.BranchNameInvalid):
             self.feature_branch('user/4.3/TEST-0005')
@@ -6309,6 +6329,213 @@ class TaskQueueTests(RepositoryTests):
         finally:
             BertE.process = real_process
 
+    def test_speculative_evaluation(self):
+        self.init_berte(options=self.bypass_all_but(['bypass_build_status']),
+                        speculative_evaluation=True)
+        self.assertFalse(self.berte.speculate())
+        pr = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        self.process_pr_job(pr, 'BuildNotStarted')
+
+        # the job left the pull request in the state it evaluated
+        self.berte.speculation.interval = 0
+        self.assertFalse(self.berte.speculate())
+
+        add_file_to_branch(self.gitrepo, 'development/10', 'file_10')
+        self.assertTrue(self.berte.speculate())
+        self.assertFalse(self.berte.speculate())
+
+        hits = SPECULATIVE_RESULTS.get(result='hit') or 0
+        job = self.process_pr_job(pr, 'BuildNotStarted')
+        self.assertEqual(SPECULATIVE_RESULTS.get(result='hit'), hits + 1)
+        commands = [span['name'] for span in job.trace.as_dict()['spans']]
+        self.assertNotIn('git merge', commands)
+
+    def test_evaluation_fingerprints(self):
+        self.init_berte(options=self.bypass_all_but(['bypass_build_status']),
+                        evaluation_fingerprints=True)
+        pr = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        # the first job creates the integration branches
+        self.process_pr_job(pr, 'BuildNotStarted')
+        self.process_pr_job(pr, 'BuildNotStarted')
+
+        hits = FINGERPRINT_RESULTS.get(result='hit') or 0
+        job = self.process_pr_job(pr, 'BuildNotStarted')
+        self.assertEqual(FINGERPRINT_RESULTS.get(result='hit'), hits + 1)
+        commands = [span['name'] for span in job.trace.as_dict()['spans']]
+        self.assertNotIn('git clone', commands)
+        phases = [phase['name'] for phase in job.trace.as_dict()['phases']]
+        self.assertEqual(phases, ['fingerprint', 'remote heads'])
+
+        # any change of the inputs leads to a full evaluation
+        pr.add_comment('Any news?')
+        with patch.object(Reactor, 'handle_options', autospec=True,
+                          side_effect=Reactor.handle_options) as parse:
+            job = self.process_pr_job(pr, 'BuildNotStarted')
+        # the comments are only parsed once
+        self.assertEqual(parse.call_count, len(job.pull_request.comments))
+        self.assertEqual(FINGERPRINT_RESULTS.get(result='hit'), hits + 1)
+        self.set_build_status_on_pr_id(pr.id, 'FAILED')
+        self.process_pr_job(pr, 'BuildFailed')
+        self.process_pr_job(pr, 'BuildFailed')
+        self.assertEqual(FINGERPRINT_RESULTS.get(result='hit'), hits + 2)
+
+    def test_commit_index(self):
+        self.init_berte(options=self.bypass_all_but(['bypass_build_status']),
+                        commit_index=True)
+        pr = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        self.assertTrue(self.berte.reconcile_commit_index())
+        self.assertFalse(self.berte.reconcile_commit_index())
+        # the integration branches pushed by the job are indexed
+        self.process_pr_job(pr, 'BuildNotStarted')
+        heads = self.gitrepo.get_remote_heads(refresh_cache=True)
+        sha1 = heads['w/10/bugfix/TEST-00001']
+        self.assertEqual(self.berte.commit_index.branches(sha1),
+                         {'w/10/bugfix/TEST-00001'})
+
+        self.set_build_status(sha1, 'FAILED')
+        project_repo = self.berte.project_repo
+        with patch.object(self.berte.git_repo, 'get_branches_from_commit',
+                          side_effect=AssertionError), \
+                patch.object(project_repo, 'get_pull_requests',
+                             wraps=project_repo.get_pull_requests) as list_prs:
+            self.process_sha1_job(sha1, 'BuildFailed')
+        # the pull request of the commit wasn't looked up
+        for call in list_prs.call_args_list:
+            self.assertNotEqual(call[1]['src_branch'], ['bugfix/TEST-00001'])
+
+        # branches without pull request are looked up as before
+        self.process_sha1_job(heads['development/4.3'], 'NothingToDo')
+        self.process_sha1_job('0' * 40, 'NothingToDo')
+
+    def test_commit_index_closed_pull_request(self):
+        self.init_berte(options=self.bypass_all_but(['bypass_build_status']),
+                        commit_index=True)
+        pr1 = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        self.berte.reconcile_commit_index()
+        # the index doesn't know the pull request was closed
+        pr1.decline()
+        pr2 = self.create_pr('bugfix/TEST-00001', 'development/4.3',
+                             reuse_branch=True)
+        self.assertEqual(self.berte.commit_index.pull_request(
+            ['bugfix/TEST-00001']), pr1.id)
+        sha1 = self.gitrepo.get_remote_heads(
+            refresh_cache=True)['bugfix/TEST-00001']
+        self.process_sha1_job(sha1, 'BuildNotStarted')
+        self.assertEqual(self.berte.commit_index.pull_request(
+            ['bugfix/TEST-00001']), pr2.id)
+
+    def test_prefetch_jira_issues(self):
+        self.init_berte(options=self.bypass_all_but(['bypass_jira_check']),
+                        prefetch_jira_issues=True)
+        pr1 = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        pr2 = self.create_pr('bugfix/TEST-00002', 'development/4.3')
+        self.berte.put_job(self.make_pr_job(pr1))
+        self.berte.put_job(self.make_pr_job(pr2))
+        with patch.object(jira_api, 'search_issues',
+                          wraps=jira_api.search_issues) as search, \
+                patch.object(jira_api, 'JiraIssue',
+                             side_effect=AssertionError):
+            self.berte.process_task()
+            self.berte.process_task()
+        # the issues of both pull requests were fetched by the first job
+        search.assert_called_once()
+        self.assertEqual(search.call_args[1]['keys'],
+                         ['TEST-00001', 'TEST-00002'])
+        self.assertEqual(len(self.berte.jira_issues), 0)
+        for job in self.berte.tasks_done:
+            self.assertNotEqual(job.status, 'AssertionError')
+
+    def test_superseded_job(self):
+        self.init_berte(options=self.bypass_all)
+        pr = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        job = self.make_pr_job(pr)
+        newer_job = self.make_pr_job(pr)
+        self.berte.put_job(job)
+        # a newer event on the pull request came in while the job waited
+        self.berte.task_queue.put(newer_job)
+        self.berte.process_task()
+        self.assertEqual(job.status, 'Superseded')
+        self.assertEqual(self.berte.tasks_done[0].id, job.id)
+        self.assertEqual(self.berte.tasks_done[0].status, 'Superseded')
+        self.assertFalse(self.gitrepo.remote_branch_exists(
+            'w/10/bugfix/TEST-00001', True))
+
+        self.berte.process_task()
+        self.assertEqual(newer_job.status, 'Queued')
+
+        # jobs requested by users are run to completion
+        self.berte.put_job(self.make_pr_job(pr))
+        self.assertTrue(self.berte.is_superseded(self.make_pr_job(pr)))
+        self.assertFalse(self.berte.is_superseded(
+            PullRequestJob(bert_e=self.berte, pull_request=pr, user='admin')))
+
+    def test_job_out_of_time(self):
+        self.init_berte(options=self.bypass_all)
+        pr = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        self.berte.settings['job_time_budget'] = 1e-6
+        self.berte.requeue_delay = 0
+        job = self.process_pr_job(pr, 'DeadlineExceeded')
+        self.assertEqual(job.attempt, 1)
+
+        for attempt in (2, 3):
+            job = self.berte.task_queue.get(timeout=5)
+            self.berte.task_queue.task_done()
+            self.assertEqual(job.attempt, attempt)
+            self.assertEqual(job.pull_request.id, pr.id)
+            self.process_job(job, 'DeadlineExceeded')
+        # given up after the last attempt
+        time.sleep(0.1)
+        self.assertTrue(self.berte.task_queue.empty())
+
+        self.berte.settings['job_time_budget'] = 0
+        self.process_pr_job(pr, 'Queued')
+
+    def test_fetch_branches_include_integration_branches(self):
+        self.init_berte(fetch_branches=['development/*', 'w/*'])
+        self.assertEqual(self.berte.git_repo.branches,
+                         ('development/*', 'w/*', 'q/*'))
+        self.init_berte()
+        self.assertIsNone(self.berte.git_repo.branches)
+
+    def test_cmd_line_options_per_instance(self):
+        self.init_berte(options=self.bypass_all)
+        berte = self.berte
+        # another repository served by the same process, without options
+        self.init_berte()
+        other = self.berte
+        self.berte = berte
+        pr = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        self.process_pr_job(pr, 'Queued')
+
+        self.berte = other
+        pr = self.create_pr('bugfix/TEST-00002', 'development/4.3')
+        job = self.process_pr_job(pr)
+        self.assertFalse(job.settings.bypass_jira_check)
+        self.assertNotEqual(job.status, 'Queued')
+
+    def test_job_out_of_time_keeps_inbox_entries(self):
+        self.init_berte(options=self.bypass_all)
+        pr = self.create_pr('bugfix/TEST-00001', 'development/4.3')
+        with tempfile.TemporaryDirectory() as tmp:
+            self.berte.inbox = Inbox(os.path.join(tmp, 'inbox.sqlite'))
+            entry_id = self.berte.inbox.append('github', 'pull_request', b'')
+            self.berte.settings['job_time_budget'] = 1e-6
+            self.berte.requeue_delay = 0
+            job = self.make_pr_job(pr)
+            job.inbox_entries.append(entry_id)
+            self.process_job(job, 'DeadlineExceeded')
+            # kept until the job is run again
+            self.assertEqual(len(self.berte.inbox), 1)
+
+            job = self.berte.task_queue.get(timeout=5)
+            self.berte.task_queue.task_done()
+            self.assertEqual(job.inbox_entries, [entry_id])
+            self.berte.settings['job_time_budget'] = 0
+            self.process_job(job, 'Queued')
+            self.assertEqual(len(self.berte.inbox), 0)
+            self.berte.inbox.close()
+            self.berte.inbox = None
+
     def test_status_no_queue(self):
         self.init_berte(options=self.bypass_all, disable_queues=True)
         pr_titles = ['bugfix/TEST-1', 'bugfix/TEST-2', 'bugfix/TEST-3']
@@ -7534,6 +7761,7 @@ def main():
         bitbucket_api.Client = bitbucket_api_mock.Client
         bitbucket_api.Repository = bitbucket_api_mock.Repository
     jira_api.JiraIssue = jira_api_mock.JiraIssue
+    jira_api.search_issues = jira_api_mock.search_issues
 
     if RepositoryTests.args.verbose:
         # only the message in the format string will be displayed
@@ -17,11 +17,12 @@ import json
 import os
 import pathlib
 import re
+import tempfile
 import unittest
 import unittest.mock
-from collections import OrderedDict, deque
+from collections import OrderedDict
 from copy import deepcopy
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from queue import Queue
 from types import SimpleNamespace
 
@@ -37,6 +38,8 @@ from ..git_host import bitbucket as bitbucket_api
 from ..git_host import cache
 from ..git_host import mock as mock_api
 from ..lib.settings_dict import SettingsDict
+from ..server.inbox import configure as configure_inbox
+from ..workflow.gitwaterflow.commit_index import CommitIndex
 from .test_server_data import COMMENT_CREATED, COMMIT_STATUS_CREATED
 
 bitbucket_api.PullRequest = mock_api.PullRequest
@@ -54,7 +57,7 @@ class MockBertE(bert_e.BertE):
         self.settings = SettingsDict
         self.git_repo = SimpleNamespace()
         self.task_queue = Queue()
-        self.tasks_done = deque(maxlen=1000)
+        self.tasks_done = berte_job.JobHistory(maxlen=1000)
         self.status = {}
 
         self.settings.repository_host = 'bitbucket'
@@ -137,6 +140,51 @@ class TestServer(unittest.TestCase):
         server.BERTE.task_queue.task_done()
         self.assertEqual(server.BERTE.task_queue.unfinished_tasks, 0)
 
+    def test_webhook_updates_commit_index(self):
+        server.BERTE.commit_index = CommitIndex()
+        resp = self.handle_webhook('pullrequest:comment_created',
+                                   COMMENT_CREATED)
+        self.assertEqual(200, resp.status_code)
+        # before the job is run
+        self.assertEqual(server.BERTE.commit_index.pull_request(
+            ['bugfix/RELENG-1966-allow-bitbucket-pipeline-to-deploy']), 1)
+
+        closed = deepcopy(COMMENT_CREATED)
+        closed['pullrequest']['state'] = 'MERGED'
+        self.handle_webhook('pullrequest:fulfilled', closed)
+        self.assertIsNone(server.BERTE.commit_index.pull_request(
+            ['bugfix/RELENG-1966-allow-bitbucket-pipeline-to-deploy']))
+
+    def test_webhook_inbox(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'inbox.sqlite')
+            configure_inbox(server.APP, path, start=False)
+            server.BERTE.project_repo.full_name = 'test_owner/test_repo'
+            for _ in range(2):
+                resp = self.handle_webhook('pullrequest:comment_created',
+                                           COMMENT_CREATED)
+                self.assertEqual(202, resp.status_code)
+            self.assertEqual(server.BERTE.task_queue.qsize(), 0)
+
+            # both webhooks lead to the same job
+            self.assertEqual(server.APP.inbox_consumer.consume(), 2)
+            self.assertEqual(server.BERTE.task_queue.qsize(), 1)
+            job = server.BERTE.task_queue.queue[0]
+            self.assertEqual(job.pull_request.id, 1)
+            self.assertEqual(len(job.inbox_entries), 2)
+            self.assertEqual(len(server.APP.inbox), 2)
+
+            # the job is replayed if it wasn't processed before a restart
+            server.APP.inbox.close()
+            server.BERTE.task_queue = Queue()
+            configure_inbox(server.APP, path, start=False)
+            server.APP.inbox_consumer.consume()
+            self.assertEqual(server.BERTE.task_queue.qsize(), 1)
+
+            server.BERTE.inbox.ack(job.inbox_entries)
+            self.assertEqual(len(server.APP.inbox), 0)
+            server.APP.inbox.close()
+
     def test_build_status_filtered(self):
         data = deepcopy(COMMIT_STATUS_CREATED)
         data['commit_status']['state'] = 'INPROGRESS'
@@ -211,6 +259,7 @@ class TestServer(unittest.TestCase):
             'id': 10,
             'merge_time': datetime(2016, 12, 9, 14, 54, 20, 123456)
         })
+        server.BERTE.status_changed()
         res = client.get('/?output=txt')
         data = res.data.decode()
         # PR #10 should appear as merged
@@ -222,6 +271,68 @@ class TestServer(unittest.TestCase):
         assert '2016-12-09 14:54:20' in data
         assert '<a href="https://bitbucket.org/foo/bar/pull-requests/10" target="_blank">Pull request #10</a>' in data  # noqa
 
+    def test_status_conditional_get(self):
+        server.BERTE.status['merge queue'] = OrderedDict([
+            ('10', [('4.3', '4321abcd0001'), ('6.0', '4321abcd0002')])
+        ])
+        client = self.test_client()
+        res = client.get('/?output=txt')
+        self.assertEqual(200, res.status_code)
+        etag = res.headers['ETag']
+
+        res = client.get('/?output=txt', headers={'If-None-Match': etag})
+        self.assertEqual(304, res.status_code)
+        self.assertEqual(b'', res.data)
+
+        # Other output modes have their own entity tag
+        res = client.get('/', headers={'If-None-Match': etag})
+        self.assertEqual(200, res.status_code)
+
+        # A build status update changes the page
+        self.set_status_cache('4321abcd0001', 'SUCCESSFUL', 'url')
+        res = client.get('/?output=txt', headers={'If-None-Match': etag})
+        self.assertEqual(200, res.status_code)
+        self.assertIn('SUCCESSFUL', res.data.decode())
+        etag = res.headers['ETag']
+
+        # So does a new job
+        server.BERTE.put_job(berte_job.CommitJob(
+            bert_e=server.BERTE,
+            commit="123deadbeef12345678901234567890123456789"
+        ))
+        res = client.get('/?output=txt', headers={'If-None-Match': etag})
+        self.assertEqual(200, res.status_code)
+        self.assertIn('Webhook for commit 123deadb', res.data.decode())
+
+    def test_status_json(self):
+        server.BERTE.status['merge queue'] = OrderedDict([
+            ('10', [('4.3', '1234abcd0001'), ('6.0', '1234abcd0002')])
+        ])
+        server.BERTE.status['merged PRs'] = [
+            {'id': 1, 'merge_time': datetime(2016, 12, 9, 14, 54, 20)},
+        ]
+        self.set_status_cache('1234abcd0001', 'INPROGRESS', 'fakeurl')
+        server.BERTE.put_job(berte_job.CommitJob(
+            bert_e=server.BERTE,
+            commit="123deadbeef12345678901234567890123456789"
+        ))
+
+        res = self.test_client().get('/?output=json')
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('application/json', res.content_type)
+        data = res.json
+        self.assertEqual(data['merged_prs'],
+                         [{'id': 1, 'merge_time': '2016-12-09T14:54:20'}])
+        self.assertEqual(data['versions'], ['6.0', '4.3'])
+        self.assertEqual(data['merge_queue'][0]['pr_id'], '10')
+        self.assertEqual(data['merge_queue'][0]['builds']['4.3'],
+                         {'sha1': '1234abcd0001', 'status': 'INPROGRESS'})
+        self.assertEqual(data['merge_queue'][0]['builds']['6.0']['status'],
+                         'NOTSTARTED')
+        self.assertIsNone(data['current_job'])
+        self.assertEqual(data['pending_jobs'][0]['type'], 'CommitJob')
+        self.assertEqual(data['completed_jobs'], [])
+
     def set_status_cache(self, sha1, state, url,
                          description='dummy', key='pre-merge'):
         json_data = {
@@ -476,6 +587,58 @@ class TestServer(unittest.TestCase):
         for exp in expected:
             self.assertIn(exp, data)
 
+    def test_metrics(self):
+        server.BERTE.status['merge queue'] = OrderedDict([
+            (1, [('6', '1/6'), ('6.4', '1/6.4')]),
+            (2, [('6', '2/6')]),
+        ])
+        server.BERTE.put_job(berte_job.CommitJob(
+            bert_e=server.BERTE,
+            commit="123deadbeef12345678901234567890123456789"
+        ))
+        self.set_status_cache('metrics/6', 'SUCCESSFUL', 'metrics/6_url')
+        cache.BUILD_STATUS_CACHE['pre-merge'].get('metrics/6')
+
+        client = self.test_client()
+        res = client.get('/metrics')
+        self.assertEqual(200, res.status_code)
+        self.assertTrue(res.content_type.startswith('text/plain'))
+        data = res.data.decode()
+        for exp in (
+            '# TYPE bert_e_task_queue_length gauge',
+            'bert_e_task_queue_length{repo="owner/slug"} 1\n',
+            'bert_e_merge_queue_length{repo="owner/slug",version="6"} 2\n',
+            'bert_e_merge_queue_length{repo="owner/slug",version="6.4"} 1\n',
+            'bert_e_current_job_duration_seconds{repo="owner/slug"} 0\n',
+            '# TYPE bert_e_job_duration_seconds histogram',
+            '# TYPE bert_e_git_command_duration_seconds histogram',
+            '# TYPE bert_e_api_requests_total counter',
+            'bert_e_cache_hit_ratio{cache="build_status"} ',
+            '# TYPE bert_e_cache_hits_total counter',
+            'bert_e_cache_evictions_total{cache="build_status"} 0\n',
+        ):
+            self.assertIn(exp, data)
+
+    def test_metrics_repositories(self):
+        other = MockBertE()
+        other.settings = SimpleNamespace(repository_owner='owner',
+                                         repository_slug='other')
+        other.status['merge queue'] = OrderedDict([(1, [('6', '1/6')])])
+        other.task_queue.put(None)
+        other.task_queue.put(None)
+        server.APP = server.setup_server(server.BERTE, OrderedDict([
+            ('owner/slug', server.BERTE), ('owner/other', other)]))
+
+        data = self.test_client().get('/metrics').data.decode()
+        for exp in (
+            'bert_e_task_queue_length{repo="owner/slug"} 0\n',
+            'bert_e_task_queue_length{repo="owner/other"} 2\n',
+            'bert_e_merge_queue_length{repo="owner/other",version="6"} 1\n',
+            'bert_e_current_job_duration_seconds{repo="owner/other"} 0\n',
+        ):
+            self.assertIn(exp, data)
+        self.assertNotIn('repo="owner/slug",version', data)
+
     def test_create_branch_api_call(self):
         resp = self.handle_api_call(
             'gwf/branches/development/7.4',
@@ -593,6 +756,64 @@ class TestServer(unittest.TestCase):
         self.assertEqual(200, resp.status_code)
         self.assertEqual(resp.json['type'], 'RebuildQueuesJob')
 
+    def test_list_jobs_api_call(self):
+        for index in range(5):
+            job = berte_job.CommitJob(bert_e=server.BERTE,
+                                      commit='123deadbeef%d' % index)
+            job.start_time = datetime(2016, 12, 8, 14, 54, index)
+            job.status = 'NothingToDo' if index % 2 else 'Queued'
+            job.complete()
+            server.BERTE.tasks_done.appendleft(berte_job.CompletedJob(job))
+        self.handle_api_call('gwf/queues', user='test_user')
+
+        resp = self.handle_api_call('jobs', method='GET', user='test_user')
+        self.assertEqual(len(resp.json), 6)
+        self.assertNotIn('X-Next-Cursor', resp.headers)
+
+        resp = self.handle_api_call('jobs?limit=2', method='GET',
+                                    user='test_user')
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual([job['type'] for job in resp.json],
+                         ['RebuildQueuesJob', 'CommitJob', 'CommitJob'])
+        self.assertEqual(resp.json[1]['start_time'],
+                         '2016-12-08T14:54:04')
+        cursor = resp.headers['X-Next-Cursor']
+
+        resp = self.handle_api_call('jobs?limit=2&cursor=%s' % cursor,
+                                    method='GET', user='test_user')
+        self.assertEqual([job['start_time'] for job in resp.json],
+                         ['2016-12-08T14:54:02', '2016-12-08T14:54:01'])
+        cursor = resp.headers['X-Next-Cursor']
+        resp = self.handle_api_call('jobs?limit=2&cursor=%s' % cursor,
+                                    method='GET', user='test_user')
+        self.assertEqual(len(resp.json), 1)
+        self.assertNotIn('X-Next-Cursor', resp.headers)
+
+        resp = self.handle_api_call(
+            'jobs?status=NothingToDo&since=2016-12-08T14:54:02',
+            method='GET', user='test_user')
+        self.assertEqual([job['start_time'] for job in resp.json],
+                         ['2016-12-08T14:54:03'])
+        # the same time, with a timezone
+        since = datetime(2016, 12, 8, 14, 54, 2).astimezone()
+        for tz in (timezone.utc, timezone(timedelta(hours=2))):
+            value = since.astimezone(tz).isoformat()
+            value = value.replace('+00:00', 'Z').replace('+', '%2B')
+            resp = self.handle_api_call(
+                'jobs?status=NothingToDo&since=' + value,
+                method='GET', user='test_user')
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual([job['start_time'] for job in resp.json],
+                             ['2016-12-08T14:54:03'])
+        resp = self.handle_api_call('jobs?type=RebuildQueuesJob',
+                                    method='GET', user='test_user')
+        self.assertEqual(len(resp.json), 1)
+
+        for query in ('limit=0', 'limit=foo', 'cursor=-1', 'since=today'):
+            resp = self.handle_api_call('jobs?' + query, method='GET',
+                                        user='test_user')
+            self.assertEqual(400, resp.status_code)
+
     def test_rebuild_queues_api_call(self):
         resp = self.handle_api_call('gwf/queues', user=None)
         self.assertEqual(401, resp.status_code)
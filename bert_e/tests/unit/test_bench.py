@@ -0,0 +1,43 @@
+"""Unit tests for the benchmark harness metrics."""
+from bert_e.lib import git
+from bert_e.lib.git import Repository as GitRepository
+from bert_e.tests.bench.metrics import Recorder, compare
+
+
+def test_recorder_counts_git_commands():
+    original = git.cmd
+    with GitRepository(None) as repo, Recorder() as recorder:
+        repo.cmd('git --version')
+        with recorder.phase('phase', jobs=2):
+            repo.cmd('git --version')
+            repo.cmd('git --version')
+
+    assert git.cmd is original
+    assert recorder.git_commands == 3
+    metrics = recorder.phases['phase']
+    assert metrics['git_commands'] == 2
+    assert metrics['api_calls'] == 0
+    assert metrics['jobs'] == 2
+    assert metrics['wall_time'] >= 0
+    assert metrics['peak_rss_kb'] > 0
+
+
+def test_compare():
+    baseline = {
+        'a': {'wall_time': 1.0, 'git_commands': 100, 'api_calls': 10,
+              'peak_rss_kb': 1000},
+    }
+    results = {
+        'a': {'wall_time': 1.4, 'git_commands': 109, 'api_calls': 10,
+              'peak_rss_kb': 1000},
+        'b': {'wall_time': 10.0, 'git_commands': 1000},
+    }
+    assert compare(results, baseline) == []
+
+    results['a']['git_commands'] = 120
+    results['a']['wall_time'] = 2.0
+    regressions = compare(results, baseline)
+    assert len(regressions) == 2
+    assert any('git_commands went from 100 to 120' in r for r in regressions)
+    assert any('wall_time' in r for r in regressions)
+    assert compare(results, baseline, tolerance=0.5, time_tolerance=1.5) == []
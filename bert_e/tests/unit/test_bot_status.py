@@ -0,0 +1,59 @@
+"""Unit tests for the bot statuses published on GitHub pull requests."""
+from types import SimpleNamespace
+
+from pytest import fixture
+
+from bert_e.git_host import github
+from bert_e.lib.cache import Cache
+
+
+@fixture
+def check_runs(monkeypatch):
+    """Record the check runs created and updated, instead of sending them."""
+    calls = []
+
+    def create(client, data, **kwargs):
+        calls.append(('create', data))
+        return SimpleNamespace(id=len(calls))
+
+    def update(client, data, **kwargs):
+        calls.append(('update', kwargs['id'], data))
+        return SimpleNamespace(id=kwargs['id'])
+
+    monkeypatch.setattr(github.CheckRun, 'create', create)
+    monkeypatch.setattr(github.CheckRun, 'update', update)
+    return calls
+
+
+def pull_request(client, sha='a' * 40):
+    return github.PullRequest(
+        client=client, _validate=False, number=1, head={'sha': sha},
+        base={'repo': {'owner': {'login': 'owner'}, 'name': 'repo'}})
+
+
+def test_redundant_statuses_skipped(check_runs):
+    client = SimpleNamespace(is_app=True, bot_statuses=Cache())
+    avoided = github.BOT_STATUS_WRITES_AVOIDED.get() or 0
+
+    pull_request(client).set_bot_status('in_progress', 'Queued', 'summary')
+    pull_request(client).set_bot_status('in_progress', 'Queued', 'summary')
+    assert [call[0] for call in check_runs] == ['create']
+    assert github.BOT_STATUS_WRITES_AVOIDED.get() == avoided + 1
+
+    # changes update the check run in place
+    pull_request(client).set_bot_status('in_progress', 'Build', 'summary')
+    assert check_runs[-1][:2] == ('update', 1)
+    pull_request(client).set_bot_status('failure', 'BuildFailed', 'summary')
+    assert check_runs[-1][:2] == ('update', 1)
+    assert check_runs[-1][2]['conclusion'] == 'failure'
+    assert check_runs[-1][2]['status'] == 'completed'
+
+    # completed check runs are not reopened
+    pull_request(client).set_bot_status('in_progress', 'Build', 'summary')
+    assert check_runs[-1][0] == 'create'
+
+    # each commit has its own check runs
+    pull_request(client, sha='b' * 40).set_bot_status(
+        'in_progress', 'Build', 'summary')
+    assert check_runs[-1][0] == 'create'
+    assert len(check_runs) == 5
@@ -0,0 +1,91 @@
+"""Unit tests for the cache primitive."""
+import threading
+import time
+
+from bert_e.lib.cache import ABSENT, Cache, CacheFamily
+
+
+def test_lru():
+    cache = Cache(size=2)
+    assert cache.get('a') is None
+    assert cache.set('a', 1) == 1
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # 'b' was the least recently used
+    assert cache.get('b', 'default') == 'default'
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 2, 1)
+
+    cache.size = 1
+    assert len(cache) == 1
+    assert cache.get('c') == 3
+    assert cache.evictions == 2
+
+
+def test_ttl():
+    cache = Cache(ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=None)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert len(cache) == 1
+
+
+def test_negative_caching():
+    cache = Cache(ttl=None, negative_ttl=0.05)
+    cache.set_absent('a')
+    assert cache.get('a') is ABSENT
+    time.sleep(0.1)
+    assert cache.get('a') is None
+
+    cache = Cache(negative_ttl=0)
+    cache.set_absent('a')
+    assert len(cache) == 0
+
+
+def test_weight():
+    cache = Cache(max_weight=10, weigher=len)
+    cache.set('a', 'x' * 4)
+    cache.set('b', 'x' * 4)
+    assert cache.weight == 8
+    cache.set('a', 'x' * 2)
+    assert cache.weight == 6
+    cache.set('c', 'x' * 6)
+    assert cache.get('b') is None
+    assert cache.weight == 8
+    assert cache.pop('a') == 'xx'
+    assert cache.weight == 6
+    # values heavier than the bound aren't kept
+    cache.set('d', 'x' * 11)
+    assert len(cache) == 0 and cache.weight == 0
+
+
+def test_threads():
+    cache = Cache(size=50)
+
+    def work(offset):
+        for index in range(2000):
+            cache.set(index % 100, offset)
+            cache.get((index + 1) % 100)
+
+    threads = [threading.Thread(target=work, args=(offset,))
+               for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 50
+    assert cache.hits + cache.misses == 8000
+
+
+def test_family():
+    caches = CacheFamily(size=1)
+    caches['a'].set('key', 1)
+    caches['a'].set('other', 2)
+    assert caches['a'].get('key') is None
+    assert caches['b'].size == 1
+    assert set(caches) == {'a', 'b'}
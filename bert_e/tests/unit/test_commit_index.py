@@ -0,0 +1,52 @@
+"""Unit tests for the index of the commits of a repository."""
+from types import SimpleNamespace
+
+from bert_e.lib.git import RefUpdate
+from bert_e.workflow.gitwaterflow.commit_index import CommitIndex
+
+SHA1 = '1' * 40
+SHA2 = '2' * 40
+
+
+def pull_request(pr_id, src_branch, src_commit, status='OPEN'):
+    return SimpleNamespace(id=pr_id, src_branch=src_branch,
+                           src_commit=src_commit, status=status)
+
+
+def test_reconcile():
+    index = CommitIndex(interval=600)
+    index.update_pull_request(pull_request(1, 'bugfix/TEST-1', SHA1))
+    # nothing is trusted before the index is first reconciled
+    assert index.due()
+    assert index.branches(SHA1) is None
+
+    index.reconcile({'bugfix/TEST-1': SHA1, 'w/10/bugfix/TEST-1': SHA2,
+                     'development/10': SHA2},
+                    [pull_request(2, 'bugfix/TEST-1', SHA1),
+                     pull_request(1, 'bugfix/TEST-1', SHA1)])
+    assert not index.due()
+    assert index.branches(SHA1) == {'bugfix/TEST-1'}
+    assert index.branches(SHA2) == {'w/10/bugfix/TEST-1', 'development/10'}
+    assert index.pull_request(['development/10', 'bugfix/TEST-1']) == 1
+    assert index.pull_request(['development/10']) is None
+
+
+def test_updates():
+    index = CommitIndex()
+    index.reconcile({'bugfix/TEST-1': SHA1}, [])
+    index.update_pull_request(pull_request(3, 'bugfix/TEST-1', SHA2))
+    assert index.branches(SHA1) is None
+    assert index.branches(SHA2) == {'bugfix/TEST-1'}
+    assert index.pull_request(['bugfix/TEST-1']) == 3
+
+    index.update_heads([RefUpdate('w/10/bugfix/TEST-1', None, SHA1),
+                        RefUpdate('q/10', SHA1, SHA2)])
+    assert index.branches(SHA1) == {'w/10/bugfix/TEST-1'}
+    assert index.branches(SHA2) == {'bugfix/TEST-1', 'q/10'}
+    # deleted branches
+    index.update_heads([RefUpdate('w/10/bugfix/TEST-1', SHA1, None)])
+    assert index.branches(SHA1) is None
+
+    index.update_pull_request(
+        pull_request(3, 'bugfix/TEST-1', SHA2, status='MERGED'))
+    assert index.pull_request(['bugfix/TEST-1']) is None
@@ -0,0 +1,92 @@
+"""Unit tests for the records of completed jobs."""
+import json
+
+from bert_e.job import HISTORY_SPANS, CompletedJob, JobHistory
+from bert_e.tests.bench.jobs import _bert_e, processed_job
+from bert_e.tests.bench.webhook import pull_request_event
+
+
+def test_record():
+    job = processed_job(_bert_e(), pull_request_event(4096), spans=10)
+    job.details = 'details'
+    job.complete()
+    assert job.git.cascade is None
+    assert not hasattr(job.git, 'src_branch')
+
+    record = CompletedJob(job)
+    assert record.done
+    assert record.duration == job.duration
+    assert str(record) == str(job) == 'Webhook for pull request #1'
+    assert record.url == 'https://github.com/bench/bench_repo/pull/1'
+    assert record.as_dict(spans=True) == job.as_dict(spans=True)
+    assert json.loads(record.as_json(spans=True)) == \
+        json.loads(job.as_json(spans=True))
+    assert len(json.loads(record.as_json(spans=True))['trace']['spans']) \
+        == 10
+    assert not hasattr(record, '__dict__')
+    assert record.as_json() is record.as_json()
+    assert json.loads(record.as_json()) == json.loads(job.as_json())
+
+
+def test_record_keeps_longest_spans():
+    job = processed_job(_bert_e(), pull_request_event(1024), spans=200)
+    job.trace.add_span('git', 'git merge', 0.0, 10.0)
+    job.complete()
+    phases = job.trace.as_dict(spans=False)
+
+    trace = json.loads(CompletedJob(job).as_json(spans=True))['trace']
+    assert len(trace['spans']) == HISTORY_SPANS
+    assert trace['dropped_spans'] == 201 - HISTORY_SPANS
+    assert trace['spans'][-1]['name'] == 'git merge'
+    # the totals still account for every span
+    assert trace['phases'] == phases['phases']
+
+
+def test_history_pages():
+    bert_e = _bert_e()
+    payload = pull_request_event(1024)
+    history = JobHistory(maxlen=6)
+    jobs = []
+    for index in range(7):
+        job = processed_job(bert_e, payload, spans=0)
+        job.status = 'NothingToDo' if index % 2 else 'Queued'
+        job.complete()
+        jobs.insert(0, CompletedJob(job))
+        history.appendleft(jobs[0])
+
+    assert len(history) == 6
+    assert list(history) == jobs[:6]
+    assert history.get(jobs[0].id) is jobs[0]
+    assert history.get(str(jobs[5].id)) is jobs[5]
+    assert history.get(jobs[6].id) is None
+
+    page, cursor = history.page(limit=2)
+    assert page == jobs[:2]
+    page, cursor = history.page(limit=2, cursor=cursor)
+    assert page == jobs[2:4]
+    # jobs added in between don't shift the pages (but drop the oldest)
+    job = processed_job(bert_e, payload, spans=0)
+    job.complete()
+    history.appendleft(CompletedJob(job))
+    page, cursor = history.page(limit=2, cursor=cursor)
+    assert page == jobs[4:5]
+    assert cursor is None
+
+    page, cursor = history.page(
+        limit=1, match=lambda job: job.status == 'NothingToDo')
+    assert page == [jobs[1]]
+    page, cursor = history.page(
+        limit=1, cursor=cursor, match=lambda job: job.status == 'NothingToDo')
+    assert page == [jobs[3]]
+    assert cursor is None
+
+
+def test_record_of_job_with_objects_in_settings():
+    job = processed_job(_bert_e(), pull_request_event(1024), spans=0)
+    job.settings['branch_from'] = job.git.dst_branch
+    job.settings['after_pull_request'] = {'1'}
+    job.complete()
+    record = CompletedJob(job)
+    settings = json.loads(record.as_json())['settings']
+    assert settings['branch_from'] == 'development/4.3'
+    assert settings['after_pull_request'] == ['1']
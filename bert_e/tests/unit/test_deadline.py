@@ -0,0 +1,56 @@
+"""Unit tests for the time budget of jobs."""
+import time
+
+import pytest
+
+from bert_e.lib import deadline
+from bert_e.lib.deadline import Deadline, DeadlineExceeded
+from bert_e.lib.git import Repository
+from bert_e.lib.retry import RetryHandler
+from bert_e.lib.simplecmd import CommandError
+
+
+def test_timeout():
+    assert deadline.timeout(300) == 300
+    assert deadline.timeout() is None
+    with Deadline(10).activate():
+        assert deadline.timeout(1) == 1
+        assert 9 < deadline.timeout(300) <= 10
+        assert 9 < deadline.timeout() <= 10
+    assert deadline.current() is None
+
+
+def test_spent():
+    with Deadline(0).activate():
+        with pytest.raises(DeadlineExceeded):
+            deadline.check()
+        with pytest.raises(DeadlineExceeded):
+            deadline.timeout(300)
+
+
+def test_sleep():
+    with Deadline(10).activate():
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            deadline.sleep(120)
+        assert time.monotonic() - start < 1
+        deadline.sleep(0.01)
+
+
+def test_retry_within_deadline():
+    def fail():
+        raise ValueError()
+
+    retry = RetryHandler(3600)
+    with Deadline(0.5).activate(), pytest.raises(DeadlineExceeded):
+        retry.run(fail, catch=ValueError)
+
+
+def test_git_command_cut_short(tmp_path):
+    with Deadline(0.5).activate(), pytest.raises(DeadlineExceeded):
+        Repository._run('sleep 5', cwd=str(tmp_path))
+    # without a deadline, failures and timeouts are command errors
+    with pytest.raises(CommandError):
+        Repository._run('sleep 5', cwd=str(tmp_path), timeout=0.5)
+    with Deadline(10).activate(), pytest.raises(CommandError):
+        Repository._run('false', cwd=str(tmp_path))
@@ -0,0 +1,65 @@
+"""Unit tests for the outcomes of pull request evaluations."""
+import pytest
+
+from bert_e import exceptions
+from bert_e.workflow.gitwaterflow.fingerprint import (FINGERPRINT_RESULTS,
+                                                      Outcomes)
+
+
+def test_replay():
+    outcomes = Outcomes()
+    outcomes.replay(1, 'abc')
+    hits = FINGERPRINT_RESULTS.get(result='hit') or 0
+
+    outcome = exceptions.BuildInProgress()
+    outcomes.record(1, 'abc', outcome)
+    with pytest.raises(exceptions.BuildInProgress) as excinfo:
+        outcomes.replay(1, 'abc')
+    assert excinfo.value is outcome
+    assert FINGERPRINT_RESULTS.get(result='hit') == hits + 1
+
+    # other inputs, other pull requests
+    outcomes.replay(1, 'def')
+    outcomes.replay(2, 'abc')
+    outcomes.replay(1, None)
+
+
+def test_record_replayable_only():
+    outcomes = Outcomes()
+    outcomes.record(1, 'abc', exceptions.NothingToDo())
+    outcomes.record(1, 'abc', exceptions.PullRequestDeclined())
+    outcomes.replay(1, 'abc')
+
+    outcomes.record(1, 'abc', exceptions.NothingToDo())
+    outcomes.record(1, None, exceptions.NothingToDo())
+    outcomes.replay(1, 'abc')
+
+    outcomes.record(1, 'abc', exceptions.NothingToDo())
+    outcomes.record(1, 'abc', None)
+    outcomes.replay(1, 'abc')
+
+
+def test_size():
+    outcomes = Outcomes(size=2)
+    for pr_id in (1, 2, 3):
+        outcomes.record(pr_id, 'abc', exceptions.NothingToDo())
+    outcomes.replay(1, 'abc')
+    with pytest.raises(exceptions.NothingToDo):
+        outcomes.replay(3, 'abc')
+
+
+def test_replay_traceback():
+    outcomes = Outcomes()
+    try:
+        raise exceptions.NothingToDo()
+    except exceptions.NothingToDo as err:
+        outcome = err
+        outcomes.record(1, 'abc', outcome)
+    assert outcome.__traceback__ is None
+
+    depths = []
+    for _ in range(2):
+        with pytest.raises(exceptions.NothingToDo) as excinfo:
+            outcomes.replay(1, 'abc')
+        depths.append(len(excinfo.traceback))
+    assert depths[0] == depths[1]
@@ -0,0 +1,37 @@
+"""Unit tests for the durable webhook inbox."""
+import threading
+
+from bert_e.lib.inbox import Inbox
+
+
+def test_append_read_ack(tmp_path):
+    path = str(tmp_path / 'inbox.sqlite')
+    inbox = Inbox(path)
+    first = inbox.append('github', 'pull_request', b'{"a": 1}')
+    second = inbox.append('bitbucket', 'repo:push', b'{"b": 2}')
+
+    entries = inbox.read()
+    assert [(e.id, e.source, e.event, e.payload) for e in entries] == [
+        (first, 'github', 'pull_request', b'{"a": 1}'),
+        (second, 'bitbucket', 'repo:push', b'{"b": 2}'),
+    ]
+    assert [e.id for e in inbox.read(after=first)] == [second]
+
+    inbox.ack([first])
+    inbox.close()
+
+    # unacknowledged entries survive a restart
+    inbox = Inbox(path)
+    assert [e.id for e in inbox.read()] == [second]
+    assert inbox.append('github', 'status', b'{}') > second
+    assert len(inbox) == 2
+
+
+def test_wait(tmp_path):
+    inbox = Inbox(str(tmp_path / 'inbox.sqlite'))
+    assert not inbox.wait(0, timeout=0.01)
+
+    timer = threading.Timer(0.05, inbox.append, ('github', 'status', b'{}'))
+    timer.start()
+    assert inbox.wait(0, timeout=5)
+    timer.join()
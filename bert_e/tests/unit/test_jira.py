@@ -168,25 +168,30 @@ def _make_notify_job(phantom_hotfix_versions=None):
 
 
 @patch('bert_e.workflow.gitwaterflow.jira.notify_user')
-@patch('bert_e.workflow.gitwaterflow.jira.find_comment', return_value=None)
-def test_pending_hotfix_posts_when_not_yet_in_history(mock_find, mock_notify):
+@patch('bert_e.workflow.gitwaterflow.jira.robot_messages')
+def test_pending_hotfix_posts_when_not_yet_in_history(mock_messages,
+                                                      mock_notify):
     """Reminder is posted when no previous comment with that title exists."""
+    mock_messages.return_value.has_title.return_value = False
     job = _make_notify_job(phantom_hotfix_versions={'10.0.0.0'})
     issue = _make_issue('9.5.3', '10.0.0.0', '10.1.0')
     _notify_pending_hotfix_if_needed(job, issue)
+    mock_messages.return_value.has_title.assert_called_once_with(
+        '# Pending hotfix branch')
     mock_notify.assert_called_once()
 
 
 @patch('bert_e.workflow.gitwaterflow.jira.notify_user')
-@patch('bert_e.workflow.gitwaterflow.jira.find_comment',
-       return_value=MagicMock())
-def test_pending_hotfix_skips_when_already_in_history(mock_find, mock_notify):
+@patch('bert_e.workflow.gitwaterflow.jira.robot_messages')
+def test_pending_hotfix_skips_when_already_in_history(mock_messages,
+                                                      mock_notify):
     """Reminder is NOT posted when a previous comment with that title exists.
 
     This covers the active_options footer dedup fix: even if active_options
-    changed between runs (making the full text differ), the title-prefix
+    changed between runs (making the full text differ), the title
     check prevents a second post.
     """
+    mock_messages.return_value.has_title.return_value = True
     job = _make_notify_job(phantom_hotfix_versions={'10.0.0.0'})
     issue = _make_issue('9.5.3', '10.0.0.0', '10.1.0')
     _notify_pending_hotfix_if_needed(job, issue)
@@ -0,0 +1,110 @@
+"""Unit tests for the prefetch of the Jira issues of pull requests."""
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from jira.exceptions import JIRAError
+
+from bert_e import exceptions
+from bert_e.lib.cache import Cache
+from bert_e.workflow.gitwaterflow import jira
+from bert_e.workflow.gitwaterflow.branches import FeatureBranch
+
+
+def _bert_e(**settings):
+    defaults = dict(jira_keys=['TEST'], jira_email='bert-e@example.com',
+                    jira_account_url='https://jira.example.com',
+                    jira_token='token')
+    defaults.update(settings)
+    return SimpleNamespace(settings=SimpleNamespace(**defaults),
+                           jira_issues=Cache(ttl=300))
+
+
+def _pr(src_branch):
+    return SimpleNamespace(src_branch=src_branch)
+
+
+def _job(bert_e, src_branch):
+    return SimpleNamespace(
+        bert_e=bert_e, settings=bert_e.settings, active_options=[],
+        git=SimpleNamespace(src_branch=FeatureBranch(None, src_branch)))
+
+
+def _issue(key):
+    return SimpleNamespace(key=key, fields=SimpleNamespace())
+
+
+def _search(account_url, keys, email, token):
+    return [_issue(key) for key in keys if key != 'TEST-404']
+
+
+def test_one_search_for_several_pull_requests():
+    bert_e = _bert_e()
+    prs = [_pr('bugfix/TEST-1'), _pr('feature/test-2-lower'),
+           _pr('bugfix/TEST-1'), _pr('bugfix/OTHER-3'),
+           _pr('development/4.3'), _pr('feature/no-ticket')]
+    with patch.object(jira.jira_api, 'search_issues',
+                      side_effect=_search) as search:
+        assert jira.prefetch_issues(bert_e, prs) == 2
+        # issues already prefetched aren't fetched again
+        assert jira.prefetch_issues(bert_e, prs) == 0
+    search.assert_called_once()
+    assert search.call_args[1]['keys'] == ['TEST-1', 'TEST-2']
+
+
+def test_batches():
+    bert_e = _bert_e()
+    prs = [_pr('bugfix/TEST-%d' % index) for index in range(120)]
+    with patch.object(jira.jira_api, 'search_issues',
+                      side_effect=_search) as search:
+        assert jira.prefetch_issues(bert_e, prs) == 120
+    assert [len(call[1]['keys']) for call in search.call_args_list] == \
+        [50, 50, 20]
+
+
+def test_disabled():
+    with patch.object(jira.jira_api, 'search_issues') as search:
+        assert jira.prefetch_issues(_bert_e(jira_keys=[]),
+                                    [_pr('bugfix/TEST-1')]) == 0
+        bert_e = _bert_e()
+        bert_e.jira_issues = None
+        assert jira.prefetch_issues(bert_e, [_pr('bugfix/TEST-1')]) == 0
+    search.assert_not_called()
+
+
+def test_search_failure():
+    bert_e = _bert_e()
+    with patch.object(jira.jira_api, 'search_issues',
+                      side_effect=JIRAError(status_code=500)):
+        assert jira.prefetch_issues(bert_e, [_pr('bugfix/TEST-1')]) == 0
+    assert len(bert_e.jira_issues) == 0
+
+
+def test_get_prefetched_issue():
+    bert_e = _bert_e()
+    with patch.object(jira.jira_api, 'search_issues', side_effect=_search):
+        jira.prefetch_issues(bert_e, [_pr('bugfix/TEST-1'),
+                                      _pr('bugfix/TEST-404')])
+    with patch.object(jira.jira_api, 'JiraIssue',
+                      side_effect=lambda issue_id, **kwargs:
+                      _issue(issue_id)) as fetch:
+        job = _job(bert_e, 'bugfix/TEST-1')
+        issue = jira.get_jira_issue(job)
+        assert issue.key == 'TEST-1'
+        assert jira.get_jira_issue(job) is issue
+        fetch.assert_not_called()
+        # a prefetched issue serves a single job
+        assert jira.get_jira_issue(_job(bert_e, 'bugfix/TEST-1')) \
+            is not issue
+        # issues the search didn't find are fetched by their job
+        assert jira.get_jira_issue(_job(bert_e, 'bugfix/TEST-404')).key == \
+            'TEST-404'
+    assert fetch.call_count == 2
+
+
+def test_get_missing_issue():
+    bert_e = _bert_e()
+    with patch.object(jira.jira_api, 'JiraIssue',
+                      side_effect=JIRAError(status_code=404)):
+        with pytest.raises(exceptions.JiraIssueNotFound):
+            jira.get_jira_issue(_job(bert_e, 'bugfix/TEST-404'))
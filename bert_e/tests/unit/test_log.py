@@ -0,0 +1,44 @@
+"""Unit tests for the lazy logging helpers."""
+import logging
+
+from bert_e.lib import log
+from bert_e.lib.log import Fields, Lazy, configure_sampling, log_payload
+
+
+def test_lazy_formatting(caplog):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return 'rendered'
+
+    logger = logging.getLogger('bert_e.test_log.lazy')
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        logger.debug('%s', Lazy(render))
+        assert calls == []
+        logger.info('%s %s', Lazy(render), Fields(pr=1, user='bob'))
+    assert calls == [1]
+    assert caplog.messages == ["rendered pr=1 user='bob'"]
+
+
+def test_payload_sampling(caplog):
+    logger = logging.getLogger('bert_e.test_log.payload')
+    configure_sampling('bert_e.test_log', threshold=10, every=3)
+    try:
+        with caplog.at_level(logging.DEBUG, logger=logger.name):
+            log_payload(logger, logging.DEBUG, 'got %s', b'small')
+            for _ in range(4):
+                log_payload(logger, logging.DEBUG, 'got %s', b'x' * 20)
+            log_payload(logger, logging.DEBUG, 'got %s', 'ignored', size=0)
+            log_payload(logger, logging.DEBUG - 5, 'got %s', 'ignored')
+    finally:
+        log._SAMPLINGS.pop('bert_e.test_log')
+
+    assert caplog.messages == [
+        'got small',
+        'got ' + 'x' * 20,
+        'got <20 bytes, sampled out>',
+        'got <20 bytes, sampled out>',
+        'got ' + 'x' * 20,
+        'got ignored',
+    ]
@@ -0,0 +1,91 @@
+"""Unit tests for the maintenance of the git caches."""
+import os
+
+import pytest
+
+from bert_e.lib.maintenance import (ANCESTRY_QUERY_DURATION,
+                                    MAINTENANCE_DURATION, TASKS, Maintenance)
+from bert_e.lib.simplecmd import cmd
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """A bare repository with one pack per pushed branch."""
+    path = str(tmp_path / 'repo.git')
+    work = str(tmp_path / 'work')
+    cmd('git init -q --bare %s' % path)
+    # keep the pushed objects in packs, as fetches do
+    cmd('git config receive.unpackLimit 1', cwd=path)
+    cmd('git init -q %s' % work)
+    for version in ('1.0', '1.1', '2.0'):
+        for number in range(3):
+            with open(os.path.join(work, 'file'), 'a') as file_:
+                file_.write('%s %d\n' % (version, number))
+            cmd('git add file', cwd=work)
+            cmd('git -c user.name=a -c user.email=a@b commit -q -m %s.%d' % (
+                version, number), cwd=work)
+        cmd('git push -q %s HEAD:refs/heads/development/%s' % (path, version),
+            cwd=work)
+    # leave a loose object behind
+    with open(os.path.join(work, 'loose'), 'w') as file_:
+        file_.write('loose')
+    cmd('git --git-dir=%s hash-object -w loose' % path, cwd=work)
+    return path
+
+
+def _packs(path):
+    return [name for name in os.listdir(os.path.join(path, 'objects', 'pack'))
+            if name.endswith('.pack')]
+
+
+def test_run(cache):
+    assert len(_packs(cache)) == 3
+    count, _ = MAINTENANCE_DURATION.get(task='commit-graph')
+
+    maintenance = Maintenance(cache, budget=60, name='owner/repo')
+    assert maintenance.due_tasks() == list(TASKS)
+    assert maintenance.run() == [task.name for task in TASKS]
+
+    info = os.path.join(cache, 'objects', 'info')
+    assert os.path.exists(os.path.join(info, 'commit-graphs'))
+    assert os.path.exists(os.path.join(cache, 'packed-refs'))
+    assert os.path.exists(os.path.join(cache, 'objects', 'pack',
+                                       'multi-pack-index'))
+    # the small packs were combined, and are expired at the next run
+    assert len(_packs(cache)) == 4
+    # recent unreachable objects may be used by a running job
+    assert [name for name in os.listdir(os.path.join(cache, 'objects'))
+            if len(name) == 2] == ['a7']
+    cmd('git fsck --connectivity-only', cwd=cache)
+
+    assert MAINTENANCE_DURATION.get(task='commit-graph')[0] == count + 1
+    for when in ('before', 'after'):
+        assert ANCESTRY_QUERY_DURATION.get(repository='owner/repo',
+                                           when=when) is not None
+
+    # nothing is due until the intervals elapse
+    assert maintenance.due_tasks() == []
+    assert maintenance.run() == []
+    hourly = [task for task in TASKS if task.interval <= 3600]
+    later = max(maintenance.last_runs.values()) + 3600
+    assert maintenance.due_tasks(now=later) == hourly
+
+    maintenance.last_runs.clear()
+    maintenance.run()
+    assert len(_packs(cache)) == 2
+    cmd('git fsck --connectivity-only', cwd=cache)
+
+
+def test_budget(cache):
+    maintenance = Maintenance(cache, budget=0)
+    assert maintenance.run() == []
+    assert maintenance.due_tasks() == list(TASKS)
+
+
+def test_failure(cache, tmp_path):
+    assert Maintenance(str(tmp_path / 'missing.git')).run() == []
+
+    maintenance = Maintenance(cache, tasks=[TASKS[0]._replace(
+        commands=['git no-such-command'])])
+    assert maintenance.run() == []
+    assert maintenance.due_tasks() == []
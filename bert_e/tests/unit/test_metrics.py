@@ -0,0 +1,65 @@
+"""Unit tests for the metrics registry."""
+import pytest
+
+from bert_e.lib.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    counter = Counter('requests_total', 'Requests.', ['status'],
+                      registry=registry)
+    gauge = Gauge('queue_length', 'Queue length.', registry=registry)
+
+    counter.inc(status=200)
+    counter.inc(2, status=200)
+    counter.inc(status='a"b')
+    gauge.set(3)
+    assert counter.get(status=200) == 3
+    with pytest.raises(ValueError):
+        counter.inc(code=200)
+
+    assert registry.render() == (
+        '# HELP requests_total Requests.\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{status="200"} 3\n'
+        'requests_total{status="a\\"b"} 1\n'
+        '# HELP queue_length Queue length.\n'
+        '# TYPE queue_length gauge\n'
+        'queue_length 3\n'
+    )
+
+
+def test_gauge_set_all():
+    gauge = Gauge('length', 'Length.', ['version'], registry=Registry())
+    gauge.set(1, version='1.0')
+    gauge.set_all({('2.0',): 4})
+    assert gauge.get(version='1.0') is None
+    assert gauge.get(version='2.0') == 4
+
+
+def test_histogram():
+    registry = Registry()
+    histogram = Histogram('duration_seconds', 'Duration.', ['type'],
+                          registry=registry, buckets=(1, 10))
+    histogram.observe(0.5, type='a')
+    histogram.observe(1, type='a')
+    histogram.observe(20, type='a')
+    assert histogram.get(type='a') == (3, 21.5)
+    assert histogram.get(type='b') == (0, 0.0)
+
+    assert registry.render().splitlines()[2:] == [
+        'duration_seconds_bucket{type="a",le="1"} 2',
+        'duration_seconds_bucket{type="a",le="10"} 2',
+        'duration_seconds_bucket{type="a",le="+Inf"} 3',
+        'duration_seconds_sum{type="a"} 21.5',
+        'duration_seconds_count{type="a"} 3',
+    ]
+
+
+def test_counter_set_total():
+    registry = Registry()
+    counter = Counter('hits_total', 'Hits.', ['cache'], registry=registry)
+    counter.set_total(5, cache='a')
+    counter.inc(cache='a')
+    assert counter.get(cache='a') == 6
+    assert '# TYPE hits_total counter' in registry.render()
@@ -0,0 +1,71 @@
+"""Unit tests for the clones limited to some of the branches."""
+from bert_e.lib.git import Repository as GitRepository
+from bert_e.lib.simplecmd import cmd
+
+BRANCHES = ('development/1.0', 'q/1.0', 'feature/foo', 'user/old')
+
+
+def _make_remote(tmp_path):
+    remote = str(tmp_path / 'owner' / 'repo.git')
+    work = str(tmp_path / 'work')
+    cmd('git init -q --bare %s' % remote)
+    cmd('git init -q %s' % work)
+    cmd('git -c user.name=a -c user.email=a@b commit -q --allow-empty '
+        '-m initial', cwd=work)
+    cmd('git tag 1.0.0', cwd=work)
+    for branch in BRANCHES:
+        cmd('git push -q %s HEAD:refs/heads/%s' % (remote, branch), cwd=work)
+    cmd('git push -q %s --tags' % remote, cwd=work)
+    return 'file://' + remote
+
+
+def _refs(path):
+    return set(cmd("git for-each-ref --format='%(refname)'",
+                   cwd=path).split())
+
+
+def test_narrow_clone(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    url = _make_remote(tmp_path)
+    with GitRepository(url, branches=['development/*', 'q/*']) as repo:
+        repo.clone()
+        refs = _refs(repo.cmd_directory)
+        for branch in ('development/1.0', 'q/1.0'):
+            assert 'refs/heads/' + branch in refs
+            assert 'refs/remotes/origin/' + branch in refs
+        assert 'refs/tags/1.0.0' in refs
+        assert not any('feature/foo' in ref or 'user/old' in ref
+                       for ref in refs)
+        assert _refs(str(tmp_path / '.bert-e' / 'repo.git')) == {
+            'refs/heads/development/1.0', 'refs/heads/q/1.0',
+            'refs/tags/1.0.0'}
+
+        repo.fetch_branch('feature/foo')
+        refs = _refs(repo.cmd_directory)
+        assert 'refs/heads/feature/foo' in refs
+        assert 'refs/remotes/origin/feature/foo' in refs
+        assert 'refs/heads/user/old' not in refs
+        # missing branches are left for the callers to detect
+        repo.fetch_branch('feature/missing')
+        repo.cmd('git checkout feature/foo')
+
+        # a second clone only updates the relevant branches
+        cmd('git push -q %s development/1.0:refs/heads/q/2.0' % url,
+            cwd=repo.cmd_directory)
+        repo.reset()
+        repo.clone()
+        refs = _refs(repo.cmd_directory)
+        assert 'refs/remotes/origin/q/2.0' in refs
+        assert 'refs/remotes/origin/feature/foo' not in refs
+
+
+def test_mirror_clone(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    url = _make_remote(tmp_path)
+    with GitRepository(url) as repo:
+        repo.clone()
+        refs = _refs(repo.cmd_directory)
+        for branch in BRANCHES:
+            assert 'refs/remotes/origin/' + branch in refs
+        # does nothing: all the branches are there already
+        repo.fetch_branch('feature/foo')
@@ -0,0 +1,44 @@
+"""Unit tests for the git object store shared by several repositories."""
+import os
+
+from bert_e.lib.git import Repository as GitRepository
+from bert_e.lib.simplecmd import cmd
+
+
+def _make_remote(path, source=None):
+    if source:
+        cmd('git clone -q --bare %s %s' % (source, path))
+    else:
+        cmd('git init -q --bare %s' % path)
+    work = path + '.work'
+    cmd('git clone -q %s %s %s' % (
+        '-b development/1.0' if source else '', path, work))
+    for number in range(3):
+        cmd('git -c user.name=a -c user.email=a@b commit -q --allow-empty '
+            '-m "commit %d in %s"' % (number, path), cwd=work)
+    cmd('git push -q origin HEAD:refs/heads/development/1.0', cwd=work)
+
+
+def test_repositories_share_objects(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    product = str(tmp_path / 'scality' / 'product.git')
+    fork = str(tmp_path / 'other' / 'product.git')
+    _make_remote(product)
+    _make_remote(fork, source=product)
+    store = str(tmp_path / 'objects.git')
+
+    for path, owner in ((product, 'scality'), (fork, 'other')):
+        # not a local clone, which would hard link all the objects
+        url = 'file://' + path
+        with GitRepository(url, object_store=store) as repo:
+            repo.clone()
+            assert repo.owner == owner
+            assert 'commit 2 in ' + path in repo.cmd(
+                'git log --format=%s origin/development/1.0')
+            cache = tmp_path / '.bert-e' / owner / 'product.git'
+            with open(str(cache / 'objects' / 'info' / 'alternates')) as f:
+                assert f.read().strip() == os.path.join(store, 'objects')
+            # the history is stored once, in the shared store
+            objects = cmd('git count-objects -v', cwd=str(cache))
+            assert 'count: 0\n' in objects
+            assert 'in-pack: 0\n' in objects
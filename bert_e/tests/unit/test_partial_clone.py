@@ -0,0 +1,67 @@
+"""Unit tests for the partial clones of repositories."""
+import os
+
+import pytest
+
+from bert_e.lib.git import Repository as GitRepository
+from bert_e.lib.simplecmd import cmd
+
+
+def _make_remote(tmp_path):
+    remote = str(tmp_path / 'owner' / 'repo.git')
+    work = str(tmp_path / 'work')
+    cmd('git init -q --bare %s' % remote)
+    cmd('git config uploadpack.allowFilter true', cwd=remote)
+    cmd('git init -q %s' % work)
+    for name in ('a', 'b'):
+        with open(os.path.join(work, name + '.bin'), 'wb') as file_:
+            file_.write(os.urandom(64 * 1024))
+        cmd('git add %s.bin' % name, cwd=work)
+        cmd('git -c user.name=a -c user.email=a@b commit -q -m %s' % name,
+            cwd=work)
+    cmd('git push -q %s HEAD:refs/heads/development/1.0' % remote, cwd=work)
+    cmd('git checkout -q -b feature HEAD~', cwd=work)
+    with open(os.path.join(work, 'c.txt'), 'w') as file_:
+        file_.write('c')
+    cmd('git add c.txt', cwd=work)
+    cmd('git -c user.name=a -c user.email=a@b commit -q -m c', cwd=work)
+    cmd('git push -q %s HEAD:refs/heads/feature/c' % remote, cwd=work)
+    return 'file://' + remote
+
+
+def _missing_objects(path):
+    return [line for line in cmd(
+        'git rev-list --objects --all --missing=print', cwd=path).split('\n')
+        if line.startswith('?')]
+
+
+@pytest.mark.parametrize('branches,missing', [
+    (None, 3),
+    # feature/c isn't in the narrow cache at all
+    (['development/*'], 2),
+])
+def test_partial_clone(tmp_path, monkeypatch, branches, missing):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    url = _make_remote(tmp_path)
+    with GitRepository(url, branches=branches,
+                       clone_filter='blob:none') as repo:
+        repo.clone()
+        repo.fetch_branch('feature/c')
+        cache = str(tmp_path / '.bert-e' / 'repo.git')
+        assert len(_missing_objects(cache)) == missing
+        # ancestry checks don't need the blobs
+        repo.cmd('git merge-base --is-ancestor %s %s',
+                 'origin/development/1.0~', 'origin/feature/c')
+
+        repo.config('user.email', 'robot@nowhere.com')
+        repo.config('user.name', 'robot')
+        repo.cmd('git checkout -q -b w/1.0/feature/c origin/development/1.0')
+        repo.cmd('git merge --no-edit origin/feature/c')
+        assert sorted(os.listdir(repo.cmd_directory)) == [
+            '.git', 'a.bin', 'b.bin', 'c.txt']
+        assert len(_missing_objects(cache)) == missing
+
+        # the blobs fetched by the work copy are kept for the next ones
+        repo.reset()
+        assert _missing_objects(cache) == []
+        cmd('git fsck --connectivity-only', cwd=cache)
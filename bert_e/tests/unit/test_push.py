@@ -0,0 +1,122 @@
+"""Unit tests for the push of the branches changed by a job."""
+import pytest
+
+from bert_e.lib.git import (Branch, PushFailedException, RefUpdate,
+                            Repository as GitRepository)
+from bert_e.lib.simplecmd import cmd
+from bert_e.workflow.git_utils import push
+
+
+def _make_remote(tmp_path):
+    remote = str(tmp_path / 'owner' / 'repo.git')
+    work = str(tmp_path / 'work')
+    cmd('git init -q --bare %s' % remote)
+    cmd('git init -q %s' % work)
+    cmd('git -c user.name=a -c user.email=a@b commit -q --allow-empty '
+        '-m initial', cwd=work)
+    for branch in ('development/1.0', 'w/1.0/feature/foo', 'q/1.0'):
+        cmd('git push -q %s HEAD:refs/heads/%s' % (remote, branch), cwd=work)
+    return remote, work
+
+
+def _commit(repo, branch):
+    Branch(repo, branch).checkout()
+    repo.cmd('git -c user.name=a -c user.email=a@b commit -q --allow-empty '
+             '-m change')
+    return repo.cmd('git rev-parse HEAD').strip()
+
+
+def _remote_sha(remote, branch):
+    return cmd('git rev-parse refs/heads/%s' % branch, cwd=remote).strip()
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    remote, _ = _make_remote(tmp_path)
+    with GitRepository(remote) as repo:
+        repo.clone()
+        yield repo
+
+
+def test_plan_push(repo):
+    assert repo.plan_push(prune=True) == []
+
+    old = repo.cmd('git rev-parse development/1.0').strip()
+    new = _commit(repo, 'development/1.0')
+    repo.cmd('git branch q/2.0 development/1.0')
+    repo.cmd('git branch -D q/1.0')
+    assert sorted(repo.plan_push()) == [
+        RefUpdate('development/1.0', old, new),
+        RefUpdate('q/2.0', None, new),
+    ]
+    assert sorted(repo.plan_push(prune=True)) == [
+        RefUpdate('development/1.0', old, new),
+        RefUpdate('q/1.0', old, None),
+        RefUpdate('q/2.0', None, new),
+    ]
+    assert repo.plan_push(['q/2.0', 'q/3.0']) == [
+        RefUpdate('q/2.0', None, new)]
+
+
+def test_push_changes(repo):
+    remote = repo._url
+    new = _commit(repo, 'development/1.0')
+    repo.cmd('git branch -D q/1.0')
+    assert len(repo.push_changes(prune=True)) == 2
+    assert _remote_sha(remote, 'development/1.0') == new
+    with pytest.raises(Exception):
+        _remote_sha(remote, 'q/1.0')
+    # the remote-tracking branches follow
+    assert repo.plan_push(prune=True) == []
+    assert repo.push_changes(prune=True) == []
+
+
+def test_push_changes_lease(repo, tmp_path):
+    remote = repo._url
+    work = str(tmp_path / 'work')
+    # someone else moved the branch since it was fetched
+    cmd('git -c user.name=a -c user.email=a@b commit -q --allow-empty '
+        '-m other', cwd=work)
+    cmd('git push -q -f %s HEAD:refs/heads/w/1.0/feature/foo' % remote,
+        cwd=work)
+    other = _remote_sha(remote, 'w/1.0/feature/foo')
+    _commit(repo, 'development/1.0')
+    _commit(repo, 'w/1.0/feature/foo')
+    with pytest.raises(PushFailedException):
+        repo.push_changes()
+    # the push is atomic
+    assert _remote_sha(remote, 'w/1.0/feature/foo') == other
+    assert _remote_sha(remote, 'development/1.0') != repo.cmd(
+        'git rev-parse development/1.0').strip()
+
+
+def test_push_named_branches(repo):
+    remote = repo._url
+    new = _commit(repo, 'w/1.0/feature/foo')
+    _commit(repo, 'development/1.0')
+    push(repo, [Branch(repo, 'w/1.0/feature/foo')])
+    assert _remote_sha(remote, 'w/1.0/feature/foo') == new
+    assert _remote_sha(remote, 'development/1.0') != repo.cmd(
+        'git rev-parse development/1.0').strip()
+
+
+def test_push_twice_from_narrow_clone(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    remote, _ = _make_remote(tmp_path)
+    with GitRepository(remote, branches=['development/*']) as repo:
+        repo.clone()
+        repo.cmd('git branch w/1.0/bugfix/x development/1.0')
+        _commit(repo, 'w/1.0/bugfix/x')
+        repo.push_changes(['w/1.0/bugfix/x'])
+        # the lease of the next push is on the sha just pushed
+        new = _commit(repo, 'w/1.0/bugfix/x')
+        assert repo.push_changes(['w/1.0/bugfix/x']) == [
+            RefUpdate('w/1.0/bugfix/x', repo.cmd(
+                'git rev-parse w/1.0/bugfix/x^').strip(), new)]
+        assert _remote_sha(remote, 'w/1.0/bugfix/x') == new
+
+        repo.cmd('git checkout -q development/1.0')
+        repo.cmd('git branch -D w/1.0/bugfix/x')
+        repo.push_changes(prune=True)
+        assert repo.plan_push(prune=True) == []
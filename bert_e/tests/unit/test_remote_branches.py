@@ -0,0 +1,66 @@
+"""Unit tests for the tracking of the remote branches of a repository."""
+from bert_e.lib.git import Repository as GitRepository
+from bert_e.lib.simplecmd import cmd
+
+
+def _make_remote(tmp_path):
+    remote = str(tmp_path / 'owner' / 'repo.git')
+    work = str(tmp_path / 'work')
+    cmd('git init -q --bare %s' % remote)
+    cmd('git init -q %s' % work)
+    cmd('git -c user.name=a -c user.email=a@b commit -q --allow-empty '
+        '-m initial', cwd=work)
+    for branch in ('development/1.0', 'feature/foo'):
+        cmd('git push -q %s HEAD:refs/heads/%s' % (remote, branch), cwd=work)
+    sha = cmd('git rev-parse HEAD', cwd=work).strip()
+    return remote, work, sha
+
+
+class _RecordingRepository(GitRepository):
+    def __init__(self, *args, **kwargs):
+        self.commands = []
+        super().__init__(*args, **kwargs)
+
+    def cmd(self, command, *args, **kwargs):
+        self.commands.append(command.split()[1])
+        return super().cmd(command, *args, **kwargs)
+
+
+def test_branches_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    remote, work, sha = _make_remote(tmp_path)
+    with _RecordingRepository(remote) as repo:
+        assert repo.remote_branch_exists('development/1.0')
+        assert not repo.remote_branch_exists('development/2.0')
+        assert repo.get_branches_from_commit(sha) == {
+            'development/1.0', 'feature/foo'}
+        assert repo.get_branches_from_commit(sha[:12]) == {
+            'development/1.0', 'feature/foo'}
+        assert repo.get_branches_from_commit('0' * 40) == set()
+
+        # the clone doesn't fetch the cache a second time
+        repo.clone()
+        assert 'ls-remote' not in repo.commands
+        assert repo.commands.count('fetch') == 1
+
+        cmd('git push -q %s HEAD:refs/heads/development/2.0' % remote,
+            cwd=work)
+        assert not repo.remote_branch_exists('development/2.0')
+        assert repo.remote_branch_exists('development/2.0', True)
+        assert 'ls-remote' in repo.commands
+
+        repo.commands.clear()
+        repo.reset()
+        assert repo.remote_branch_exists('development/2.0')
+        assert repo.commands.count('fetch') == 1
+        assert 'ls-remote' not in repo.commands
+
+
+def test_narrow_clone_lists_remote(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    remote, _, sha = _make_remote(tmp_path)
+    with _RecordingRepository(remote, branches=['development/*']) as repo:
+        # the cache doesn't hold the source branches of pull requests
+        assert repo.get_branches_from_commit(sha) == {
+            'development/1.0', 'feature/foo'}
+        assert repo.commands == ['ls-remote']
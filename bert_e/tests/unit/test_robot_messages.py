@@ -0,0 +1,62 @@
+"""Unit tests for the index of the robot's messages in a pull request."""
+from types import SimpleNamespace
+
+from bert_e.workflow.pr_utils import RobotMessages, robot_messages
+
+MESSAGE = '''# In the queue
+
+The changeset has received all authorizations.
+
+*The following options are set:* **{}**
+'''
+
+
+def comment(author, text):
+    return SimpleNamespace(author=author, text=text)
+
+
+def test_find():
+    index = RobotMessages([
+        comment('robot', MESSAGE.format('approve')),
+        comment('user', 'Thanks!'),
+        comment('user', '/help'),
+    ], 'robot')
+    assert index
+    assert index.has_title('# In the queue')
+    assert not index.has_title('# Hello user,')
+    # regardless of the footer and of trailing spaces
+    assert index.find(MESSAGE.format('wait') + '  \n')
+    assert not index.find('# In the queue\n\nSomething else.')
+    # within the last comments
+    assert index.find(MESSAGE, max_history=3)
+    assert not index.find(MESSAGE, max_history=2)
+    # the robot's last message, with the same options
+    assert index.find(MESSAGE.format('approve'), max_history=-1)
+    assert not index.find(MESSAGE.format('wait'), max_history=-1)
+
+    index.add('robot', '# Hello user,\n\nWelcome')
+    assert not index.find(MESSAGE.format('approve'), max_history=-1)
+    assert index.find('# Hello user,\n\nWelcome', max_history=1)
+    assert index.has_title('# Hello user,')
+
+
+def test_empty():
+    index = RobotMessages([comment('user', MESSAGE)], 'robot')
+    assert not index
+    assert not index.find(MESSAGE)
+
+
+def test_built_once():
+    class PullRequest(object):
+        listed = 0
+
+        @property
+        def comments(self):
+            self.listed += 1
+            return [comment('robot', MESSAGE)]
+
+    pull_request = PullRequest()
+    index = robot_messages(pull_request, 'robot')
+    assert robot_messages(pull_request, 'robot') is index
+    assert pull_request.listed == 1
+    assert index.find(MESSAGE)
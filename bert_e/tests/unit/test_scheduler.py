@@ -0,0 +1,75 @@
+"""Unit tests for the scheduling of several Bert-E instances."""
+from queue import Queue
+
+from bert_e.scheduler import Scheduler
+
+
+class _FakeBertE:
+    scheduler = None
+    maintenance = None
+
+    def __init__(self, name, processed):
+        self.name = name
+        self.settings = {}
+        self.task_queue = Queue()
+        self.processed = processed
+
+    def put_job(self, job):
+        self.task_queue.put(job)
+        if self.scheduler is not None:
+            self.scheduler.notify()
+
+    def process_task(self):
+        job = self.task_queue.get()
+        self.processed.append(job)
+        self.task_queue.task_done()
+        return job
+
+    def idle(self):
+        if self.maintenance is None or not self.maintenance.due_tasks():
+            return False
+        self.processed.append('maintenance of %s' % self.name)
+        self.maintenance.last_runs['task'] = 0
+        return True
+
+
+def test_round_robin():
+    processed = []
+    first, second, third = (_FakeBertE(name, processed)
+                            for name in ('a', 'b', 'c'))
+    scheduler = Scheduler([first, second, third])
+    assert first.scheduler is scheduler
+
+    for number in range(3):
+        first.put_job('a%d' % number)
+    second.put_job('b0')
+    third.put_job('c0')
+    third.put_job('c1')
+
+    while scheduler.run_once(timeout=0):
+        pass
+    assert processed == ['a0', 'b0', 'c0', 'a1', 'c1', 'a2']
+    assert scheduler.run_once(timeout=0) is None
+
+
+class _FakeMaintenance:
+    def __init__(self):
+        self.last_runs = {}
+
+    def due_tasks(self):
+        return [] if self.last_runs else ['task']
+
+
+def test_idle_once():
+    processed = []
+    first, second = (_FakeBertE(name, processed) for name in ('a', 'b'))
+    second.maintenance = _FakeMaintenance()
+    scheduler = Scheduler([first, second])
+
+    second.put_job('b0')
+    # instances with pending jobs are maintained later
+    assert scheduler.idle_once() is None
+    scheduler.run_once(timeout=0)
+    assert scheduler.idle_once() is second
+    assert scheduler.idle_once() is None
+    assert processed == ['b0', 'maintenance of b']
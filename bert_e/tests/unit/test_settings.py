@@ -4,7 +4,7 @@ import logging
 import os
 from distutils.util import strtobool
 
-from bert_e.settings import BertEContextFilter
+from bert_e.settings import BertEContextFilter, setup_repositories_settings
 
 
 def test_log_filter(settings):
@@ -54,3 +54,35 @@ def test_settings_as_obj(settings):
     assert settings.repository_owner == 'scality'
     assert settings.repository_slug == 'bert-e'
     assert settings.repository_host_url == 'https://github.com'
+
+
+def test_repositories_settings(tmp_path, monkeypatch):
+    """Test that each repository overrides the common settings."""
+    for key in list(os.environ):
+        if key.startswith('BERT_E_'):
+            monkeypatch.delenv(key)
+    settings_file = tmp_path / 'settings.yml'
+    settings_file.write_text(
+        'repository_host: github\n'
+        'repository_owner: scality\n'
+        'robot: robot_username\n'
+        'robot_email: robot@nowhere.com\n'
+        'required_peer_approvals: 2\n'
+        'repositories:\n'
+        '  bert-e: {}\n'
+        '  fork:\n'
+        '    repository_owner: other\n'
+        '    required_peer_approvals: 1\n'
+    )
+
+    all_settings = setup_repositories_settings(str(settings_file))
+    assert list(all_settings) == ['scality/bert-e', 'other/fork']
+    assert all_settings['scality/bert-e'].required_peer_approvals == 2
+    assert all_settings['other/fork'].required_peer_approvals == 1
+    assert all_settings['other/fork'].pull_request_base_url == \
+        'https://github.com/other/fork/pull/{pr_id}'
+
+    # without repositories, the file describes a single repository
+    single = setup_repositories_settings(
+        os.path.abspath('settings.sample.yml'))
+    assert list(single) == ['scality/bert-e']
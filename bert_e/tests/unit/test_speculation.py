@@ -0,0 +1,137 @@
+"""Unit tests for the speculative evaluation of pull requests."""
+import pytest
+
+from bert_e.lib.git import (Branch, MergeFailedException,
+                            Repository as GitRepository)
+from bert_e.lib.simplecmd import cmd
+from bert_e.workflow.gitwaterflow.speculation import Speculation
+
+
+def _make_remote(tmp_path):
+    remote = str(tmp_path / 'owner' / 'repo.git')
+    work = str(tmp_path / 'work')
+    cmd('git init -q --bare %s' % remote)
+    cmd('git init -q %s' % work)
+
+    def commit(content):
+        with open('%s/file' % work, 'w') as file_:
+            file_.write(content)
+        cmd('git add file', cwd=work)
+        cmd('git -c user.name=a -c user.email=a@b commit -q -m change',
+            cwd=work)
+
+    commit('base\n')
+    cmd('git push -q %s HEAD:refs/heads/development/1.0' % remote, cwd=work)
+    cmd('git checkout -q -b feature/foo', cwd=work)
+    commit('base\nfoo\n')
+    cmd('git push -q %s HEAD:refs/heads/feature/foo' % remote, cwd=work)
+    cmd('git checkout -q -b feature/bar HEAD~1', cwd=work)
+    commit('bar\n')
+    cmd('git push -q %s HEAD:refs/heads/feature/bar' % remote, cwd=work)
+    return remote
+
+
+class _RecordingRepository(GitRepository):
+    def __init__(self, *args, **kwargs):
+        self.commands = []
+        super().__init__(*args, **kwargs)
+
+    def cmd(self, command, *args, **kwargs):
+        self.commands.append(command.split()[1])
+        return super().cmd(command, *args, **kwargs)
+
+
+def _clone(repo):
+    repo.clone()
+    repo.config('user.email', 'a@b')
+    repo.config('user.name', 'a')
+
+
+def _merge(repo):
+    """Merge both features in integration branches of development/1.0."""
+    foo = Branch(repo, 'w/1.0/feature/foo')
+    foo.create('development/1.0', do_push=False)
+    foo.merge(Branch(repo, 'feature/foo'), force_commit=True)
+    bar = Branch(repo, 'w/1.0/feature/bar')
+    bar.create('w/1.0/feature/foo', do_push=False)
+    with pytest.raises(MergeFailedException):
+        bar.merge(Branch(repo, 'feature/bar'))
+    repo.cmd('git reset -q --hard')
+    return foo.get_latest_commit()
+
+
+def test_reuse_merges(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    remote = _make_remote(tmp_path)
+    with _RecordingRepository(remote) as repo:
+        _clone(repo)
+        repo.merge_results = {}
+        merged = _merge(repo)
+        assert sorted(result is None
+                      for result in repo.merge_results.values()) == [
+            False, True]
+        results = repo.merge_results
+        repo.keep_objects()
+
+        # in another work copy
+        repo.reset()
+        _clone(repo)
+        repo.merge_results = dict(results)
+        repo.commands.clear()
+        assert _merge(repo) == merged
+        assert 'merge' not in repo.commands
+
+        # without the results
+        repo.reset()
+        _clone(repo)
+        repo.commands.clear()
+        _merge(repo)
+        assert repo.commands.count('merge') == 2
+
+
+def test_pruned_merge(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    remote = _make_remote(tmp_path)
+    with _RecordingRepository(remote) as repo:
+        _clone(repo)
+        repo.merge_results = {}
+        _merge(repo)
+        # the objects were not kept
+        results = {key: result for key, result in repo.merge_results.items()
+                   if result is not None}
+        repo.reset()
+        _clone(repo)
+        repo.merge_results = results
+        repo.commands.clear()
+        _merge(repo)
+        assert repo.commands.count('merge') == 2
+        assert Branch(repo, 'w/1.0/feature/foo').includes_commit(
+            'feature/foo')
+
+
+def test_candidates(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.monotonic', lambda: now[0])
+    speculation = Speculation(window=100, interval=10)
+    speculation.touch(1, 'a')
+    speculation.touch(2, 'b')
+    assert speculation.next_candidate() is None
+
+    now[0] += 10
+    assert speculation.next_candidate() == 2
+    assert speculation.next_candidate() == 1
+    assert speculation.next_candidate() is None
+
+    assert not speculation.check(2, 'b')
+    assert speculation.check(2, 'c')
+    assert not speculation.check(2, 'c')
+    assert not speculation.check(3, 'c')
+    speculation.results.set('d', {})
+    assert not speculation.check(1, 'd')
+
+    now[0] += 95
+    speculation.touch(2, 'c')
+    now[0] += 10
+    assert speculation.next_candidate() == 2
+    assert speculation.next_candidate() is None
+    assert not speculation.check(1, 'e')
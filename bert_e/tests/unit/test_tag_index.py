@@ -0,0 +1,110 @@
+"""Unit tests for the tag index used to build branch cascades."""
+import pytest
+
+from bert_e import exceptions
+from bert_e.workflow.gitwaterflow.branches import (
+    BranchCascade, DevelopmentBranch, HotfixBranch, TagIndex, branch_factory
+)
+
+from .helpers import FakeRepo
+
+
+def _cascade(names, destination=None):
+    dst = branch_factory(FakeRepo(), destination) if destination else None
+    cascade = BranchCascade()
+    for name in names:
+        cascade.add_branch(branch_factory(FakeRepo(), name), dst)
+    return cascade
+
+
+def test_tag_index_lookups():
+    index = TagIndex(['1.0.0', 'v1.0.3', '1.2.1', '1.2.1.4', '1.2.1.2',
+                      '2.0.0_rc1', 'not-a-version', '3.1.5.0'])
+
+    assert len(index) == 6
+    assert index.latest_minor(1) == 2
+    assert index.latest_minor(2) is None
+    assert index.latest_micro(1, 0) == 3
+    assert index.latest_micro(1, 2) == 1
+    assert index.latest_hfrev(1, 2, 1) == 4
+    assert index.latest_hfrev(1, 0, 3) == 0
+    assert index.latest_hfrev(3, 1, 5) == 0
+    assert index.latest_hfrev(1, 2, 2) is None
+    assert index.tag(1, 0, 3) == 'v1.0.3'
+
+
+def _versions(cascade):
+    """Return the versions the cascade expects, by key."""
+    versions = {}
+    for key, branch_set in cascade._cascade.items():
+        dev = branch_set[DevelopmentBranch]
+        hotfix = branch_set[HotfixBranch]
+        if dev is not None:
+            versions[key] = (getattr(dev, '_next_micro', None),
+                             dev.latest_minor)
+        if hotfix is not None:
+            versions[key] = (hotfix.hfrev, hotfix.version)
+    return versions
+
+
+# expected versions, as resolved tag by tag before the index was introduced
+@pytest.mark.parametrize('names,destination,tags,expected', [
+    (['development/4.3', 'development/4.3.17', 'development/4',
+      'development/5.1', 'hotfix/6.6.6'],
+     'development/4.3.17',
+     ['4.3.14', '4.3.16', '4.4.2', '5.1.3', '5.1.1', '6.6.6.1', '6.6.6',
+      '7.0.0'],
+     {(4, 3, 17): (None, -1),
+      (4, 3): (18, -1),
+      (4, None): (None, 4),
+      (5, 1): (4, -1)}),
+    (['development/6.6', 'development/6', 'hotfix/6.6.6'],
+     'hotfix/6.6.6',
+     ['6.6.4', '6.6.6.1', '6.6.6', '6.7.0', 'v6.6.6.3', '7.0.0'],
+     {(6, 6, 6, 0): (4, '6.6.6.4'),
+      (6, 6): (7, -1),
+      (6, None): (None, 7)}),
+])
+def test_index_matches_legacy_versions(names, destination, tags, expected):
+    cascade = _cascade(names, destination)
+    cascade.update_versions_from_index(TagIndex(tags))
+    assert _versions(cascade) == expected
+
+    cascade = _cascade(names, destination)
+    for tag in tags:
+        cascade.update_versions(tag)
+    assert _versions(cascade) == expected
+
+
+def test_index_updates_hotfix_revision():
+    cascade = _cascade(['development/6.6', 'hotfix/6.6.6'], 'hotfix/6.6.6')
+    cascade.update_versions_from_index(TagIndex(['6.6.6', '6.6.6.2']))
+    hotfix = cascade._cascade[(6, 6, 6, 0)][HotfixBranch]
+    assert hotfix.hfrev == 3
+    assert hotfix.version == '6.6.6.3'
+
+
+def test_index_phantom_hotfix_requires_related_branch():
+    cascade = _cascade(['development/9.5', 'hotfix/10.0.0'],
+                       'development/9.5')
+    phantom = cascade.pending_hotfix_branches[0]
+    cascade.update_versions_from_index(TagIndex(['10.0.0.0']))
+    assert phantom.hfrev == 0
+
+    cascade = _cascade(['development/9.5', 'hotfix/10.0.0',
+                        'development/10'], 'development/9.5')
+    phantom = cascade.pending_hotfix_branches[0]
+    cascade.update_versions_from_index(TagIndex(['10.0.0.0']))
+    assert phantom.hfrev == 1
+    assert phantom.version == '10.0.0.1'
+
+
+def test_index_released_three_digit_branch():
+    cascade = _cascade(['development/4.3', 'development/4.3.17'],
+                       'development/4.3.17')
+    with pytest.raises(exceptions.ReleaseAlreadyExists):
+        cascade.update_versions_from_index(TagIndex(['4.3.16', '4.3.17']))
+
+    # Without a related X.Y, X or hotfix branch, the tag is not considered
+    cascade = _cascade(['development/4.3.17'], 'development/4.3.17')
+    cascade.update_versions_from_index(TagIndex(['4.3.17']))
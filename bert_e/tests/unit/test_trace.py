@@ -0,0 +1,93 @@
+"""Unit tests for job tracing."""
+import json
+
+from bert_e.lib import trace
+from bert_e.lib.git import Repository as GitRepository
+from bert_e.lib.trace import Trace
+
+
+def test_span_outside_trace_is_noop():
+    assert trace.current() is None
+    trace.phase('ignored')
+    with trace.span('git', 'git status'):
+        pass
+    assert trace.current() is None
+
+
+def test_phases_and_spans():
+    job_trace = Trace()
+    with job_trace.activate():
+        assert trace.current() is job_trace
+        with trace.span('api', 'GET /before'):
+            pass
+        trace.phase('clone')
+        with trace.span('git', 'git fetch'):
+            pass
+        with trace.span('git', 'git checkout'):
+            pass
+        trace.phase('cascade')
+        with trace.span('api', 'GET /repos'):
+            pass
+    assert trace.current() is None
+
+    assert list(job_trace.phases) == ['other', 'clone', 'cascade']
+    assert job_trace.totals('git')[0] == 2
+    assert job_trace.totals('api')[0] == 2
+    assert str(job_trace).startswith('git: 2 commands in ')
+
+    data = job_trace.as_dict()
+    json.dumps(data)
+    assert [span['phase'] for span in data['spans']] == \
+        [None, 'clone', 'clone', 'cascade']
+    assert data['phases'][1]['git_commands'] == 2
+    assert data['phases'][2]['api_calls'] == 1
+    assert 'spans' not in job_trace.as_dict(spans=False)
+
+
+def test_span_limit():
+    job_trace = Trace(max_spans=2)
+    with job_trace.activate():
+        for _ in range(5):
+            with trace.span('git', 'git log'):
+                pass
+    assert len(job_trace.spans) == 2
+    assert job_trace.dropped_spans == 3
+    assert job_trace.totals('git')[0] == 5
+
+
+def test_git_commands_are_traced():
+    job_trace = Trace()
+    with GitRepository(None) as repo, job_trace.activate():
+        repo.cmd('git --version')
+    assert [(span.kind, span.name) for span in job_trace.spans] == \
+        [('git', 'git --version')]
+
+
+def test_compact():
+    job_trace = Trace()
+    with job_trace.activate():
+        for name in ('git fetch', 'git merge', 'git fetch'):
+            trace.phase(name.split()[1])
+            with trace.span('git', name):
+                pass
+    data = job_trace.as_dict()
+    spans = list(job_trace.spans)
+
+    job_trace.compact()
+    assert len(job_trace.spans) == 3
+    assert list(job_trace.spans) == spans
+    assert job_trace.spans[-1] == spans[-1]
+    assert job_trace.spans[1:] == spans[1:]
+    assert job_trace.as_dict() == data
+    assert str(job_trace).startswith('git: 3 commands in ')
+
+
+def test_compact_max_spans():
+    job_trace = Trace()
+    with job_trace.activate():
+        for duration in (1.0, 3.0, 2.0, 0.5):
+            job_trace.add_span('git', 'git %s' % duration, 0.0, duration)
+    job_trace.compact(max_spans=2)
+    assert [span.duration for span in job_trace.spans] == [3.0, 2.0]
+    assert job_trace.dropped_spans == 2
+    assert job_trace.totals('git') == (4, 6.5)
@@ -0,0 +1,88 @@
+"""Unit tests for the incremental validation of queues."""
+import pytest
+
+from bert_e import exceptions
+from bert_e.lib.simplecmd import CommandError
+from bert_e.workflow.gitwaterflow.branches import (
+    DevelopmentBranch, QueueCollection, ValidatedQueues, branch_factory
+)
+
+INTQ1 = 'q/w/1/1.0/bugfix/TEST-00001'
+INTQ2 = 'q/w/2/1.0/bugfix/TEST-00002'
+
+
+class _FakeRepo:
+    """Git repository stub with fixed branch tips and ancestry."""
+    def __init__(self, tips, ancestry):
+        self._url = ''
+        self._remote_branches = {}
+        self.tips = tips
+        self.ancestry = ancestry
+        self.ancestry_checks = 0
+
+    def checkout(self, name):
+        pass
+
+    def cmd(self, command, *args, **kwargs):
+        if command.startswith('git rev-parse'):
+            return '\n'.join(self.tips[name] for name in args) + '\n'
+        if command.startswith('git merge-base --is-ancestor'):
+            self.ancestry_checks += 1
+            commit, branch = (self.tips[str(arg)] for arg in args)
+            if commit != branch and (branch, commit) not in self.ancestry:
+                raise CommandError('not an ancestor')
+        return ''
+
+
+def _validate(repo, intqs, validated=None):
+    queues = QueueCollection(
+        None, 'pipeline',
+        [[DevelopmentBranch(repo, 'development/1.0')]], False, validated)
+    for name in ['q/1.0'] + intqs:
+        queues._add_branch(branch_factory(repo, name))
+    repo.ancestry_checks = 0
+    queues.validate()
+    return repo.ancestry_checks
+
+
+def test_append_reuses_inclusions():
+    repo = _FakeRepo(
+        tips={'development/1.0': 'd0', 'q/1.0': 'i1', INTQ1: 'i1'},
+        ancestry={('i1', 'd0'), ('i2', 'd0'), ('i2', 'i1')})
+    validated = ValidatedQueues()
+    assert _validate(repo, [INTQ1], validated) == 1
+    assert validated.queues == {(1, 0): [(1, 'i1')]}
+
+    repo.tips.update({'q/1.0': 'i2', INTQ2: 'i2'})
+    assert _validate(repo, [INTQ2, INTQ1]) == 3
+    assert _validate(repo, [INTQ2, INTQ1], validated) == 2
+    assert validated.queues == {(1, 0): [(2, 'i2'), (1, 'i1')]}
+
+
+def test_rewritten_queue_is_fully_revalidated():
+    repo = _FakeRepo(
+        tips={'development/1.0': 'd0', 'q/1.0': 'i1', INTQ1: 'i1'},
+        ancestry={('i1', 'd0'), ('j1', 'd0')})
+    validated = ValidatedQueues()
+    _validate(repo, [INTQ1], validated)
+
+    repo.tips.update({'q/1.0': 'j1', INTQ1: 'j1'})
+    assert not validated.reusable_inclusions({(1, 0): [(1, 'j1')]})
+    assert _validate(repo, [INTQ1], validated) == 1
+
+    repo.tips['development/1.0'] = 'd1'
+    with pytest.raises(exceptions.IncoherentQueues):
+        _validate(repo, [INTQ1], validated)
+    assert validated.queues == {(1, 0): [(1, 'j1')]}
+
+
+@pytest.mark.parametrize('previous,current,expected', [
+    ([(1, 'a')], [(2, 'b'), (1, 'a')], True),
+    ([(2, 'b'), (1, 'a')], [(2, 'b')], True),
+    ([(2, 'b'), (1, 'a')], [(3, 'c')], True),
+    ([(2, 'b'), (1, 'a')], [(2, 'c'), (1, 'a')], False),
+    ([(2, 'b'), (1, 'a')], [(1, 'a'), (2, 'b')], False),
+    ([(2, 'b')], [(2, 'c')], False),
+])
+def test_is_append_or_pop(previous, current, expected):
+    assert ValidatedQueues._is_append_or_pop(previous, current) is expected
@@ -15,6 +15,7 @@
 import logging
 
 from bert_e.lib import git
+from bert_e.lib.deadline import DeadlineExceeded
 from bert_e.lib.retry import RetryHandler
 
 LOG = logging.getLogger(__name__)
@@ -76,6 +77,8 @@ def octopus_merge(dst: git.Branch, src1: git.Branch, src2: git.Branch):
         except git.MergeFailedException:
             dst.reset(False, False)
             raise err
+        except DeadlineExceeded:
+            raise
         except Exception:
             raise err
 
@@ -97,39 +100,36 @@ def consecutive_merge(dst: git.Branch, src1: git.Branch, src2: git.Branch):
             dst.reset(False, False)
             dst.merge(src2)
             dst.merge(src1)
-        except git.MergeFailedException:
+        except (git.MergeFailedException, DeadlineExceeded):
             raise
         except Exception:
             raise err
 
 
 def push(repo: git.Repository, branches=None, prune=False):
-    """Push multiple branches at once. Retry up to 30 seconds before giving up.
+    """Push the changes made to the branches, in a single atomic push.
+
+    Only the branches that moved since they were fetched are pushed. Retry
+    up to 30 seconds before giving up.
 
     Args:
         repo: Git repository to push.
-        branches: branches to push.
+        branches: branches to push, all the branches that changed if None.
         prune: push branch deletions too.
 
     """
+    if branches is not None:
+        if not branches:
+            return
+        branches = [branch.name for branch in branches]
     retry = RetryHandler(30, LOG)
-    names = ''
-    if branches:
-        names = ' '.join("'{0}'".format(b.name) for b in branches)
-        with retry:
-            retry.run(
-                repo.push, names,
-                catch=git.PushFailedException,
-                fail_msg="Failed to push changes"
-            )
-    elif branches is None:
-        with retry:
-            retry.run(
-                repo.push_all,
-                prune=prune,
-                catch=git.PushFailedException,
-                fail_msg="Failed to push changes"
-            )
+    with retry:
+        retry.run(
+            repo.push_changes, branches,
+            prune=prune,
+            catch=git.PushFailedException,
+            fail_msg="Failed to push changes"
+        )
 
 
 def clone_git_repo(job):
@@ -140,4 +140,8 @@ def clone_git_repo(job):
     repo.config('user.name', job.settings.robot)
     repo.config('merge.renameLimit', '999999')
     repo.config('merge.ff', 'true')
+    pull_request = getattr(job, 'pull_request', None)
+    if pull_request is not None:
+        # narrow clones don't hold the source branches of pull requests
+        repo.fetch_branch(pull_request.src_branch)
     return repo
@@ -22,9 +22,11 @@ import re
 from bert_e import exceptions as messages
 from bert_e.job import handler, CommitJob, PullRequestJob, QueuesJob
 from bert_e.lib.cli import confirm
+from bert_e.lib.deadline import DeadlineExceeded
+from bert_e.lib.log import Fields
 from bert_e.reactor import Reactor, NotFound, NotPrivileged, NotAuthored
 from ..git_utils import push, clone_git_repo
-from ..pr_utils import find_comment, notify_user
+from ..pr_utils import notify_user, robot_messages
 from .branches import (
     branch_factory, build_branch_cascade, is_cascade_consumer,
     is_cascade_producer, BranchCascade, QueueBranch, IntegrationBranch
@@ -41,7 +43,7 @@ from .integration import (check_integration_branches,
                           notify_integration_data,
                           update_integration_branches)
 from .jira import jira_checks
-from . import queueing
+from . import fingerprint, queueing, speculation
 
 
 LOG = logging.getLogger(__name__)
@@ -53,20 +55,45 @@ def handle_pull_request(job: PullRequestJob):
     if job.pull_request.author == job.settings.robot and re.match(
             IntegrationBranch.pattern, job.pull_request.src_branch):
         return handle_parent_pull_request(job, job.pull_request)
+    index = getattr(job.bert_e, 'commit_index', None)
+    if index is not None:
+        index.update_pull_request(job.pull_request)
+    outcomes = getattr(job.bert_e, 'outcomes', None)
+    key = None
+    if outcomes is not None:
+        job.trace.phase('fingerprint')
+        try:
+            handle_options(job)
+            key = fingerprint.compute(job)
+        except messages.BertE_Exception as err:
+            # the evaluation will stop at the same point
+            LOG.debug('No fingerprint for pull request #%s: %r',
+                      job.pull_request.id, err)
+        outcomes.replay(job.pull_request.id, key)
+    outcome = None
     try:
         _handle_pull_request(job)
-    except messages.TemplateException as err:
-        notify_user(job.settings, job.pull_request, err)
+    except Exception as err:
+        outcome = err
+        if isinstance(err, messages.TemplateException):
+            notify_user(job.settings, job.pull_request, err)
         raise
+    finally:
+        if outcomes is not None:
+            if job.settings.get('after_pull_request'):
+                # the outcome depends on other pull requests too
+                key = None
+            outcomes.record(job.pull_request.id, key, outcome)
 
 
 @handler(CommitJob)
 def handle_commit(job: CommitJob):
     """Handle a job triggered by an updated build status."""
-    candidates = [
-        branch_factory(job.git.repo, b)
-        for b in job.git.repo.get_branches_from_commit(job.commit)
-    ]
+    index = getattr(job.bert_e, 'commit_index', None)
+    names = index.branches(job.commit) if index is not None else None
+    if names is None:
+        names = job.git.repo.get_branches_from_commit(job.commit)
+    candidates = [branch_factory(job.git.repo, b) for b in names]
 
     if not candidates:
         raise messages.NothingToDo(
@@ -85,24 +112,78 @@ def handle_commit(job: CommitJob):
 
     candidates = list(map(get_parent_branch, candidates))
 
-    prs = list(
-        job.project_repo.get_pull_requests(src_branch=candidates)
-    )
-    if not prs:
-        raise messages.NothingToDo(
-            'Could not find the main pull request for commit {}' .format(
-                job.commit)
+    pull_request = None
+    pr_id = index.pull_request(candidates) if index is not None else None
+    if pr_id is not None:
+        pull_request = job.project_repo.get_pull_request(int(pr_id))
+        if pull_request.status != 'OPEN':
+            # the index missed its closing, look the pull request up
+            index.update_pull_request(pull_request)
+            pull_request = None
+    if pull_request is None:
+        prs = list(
+            job.project_repo.get_pull_requests(src_branch=candidates)
         )
-    pr = min(prs, key=lambda pr: pr.id)
+        if not prs:
+            raise messages.NothingToDo(
+                'Could not find the main pull request for commit {}' .format(
+                    job.commit)
+            )
+        pr_id = min(prs, key=lambda pr: pr.id).id
+        pull_request = job.project_repo.get_pull_request(int(pr_id))
 
     return handle_pull_request(
-        PullRequestJob(
-            bert_e=job.bert_e,
-            pull_request=job.project_repo.get_pull_request(int(pr.id))
-        )
+        PullRequestJob(bert_e=job.bert_e, pull_request=pull_request)
     )
 
 
+def speculate(job: PullRequestJob):
+    """Evaluate the merges of a pull request, without pushing anything.
+
+    The job's work copy can be used to evaluate several pull requests in
+    turn, as only their own integration branches are modified.
+
+    Returns:
+        bool: True if the state of the pull request was evaluated, False if
+        it was known already or there was nothing to merge.
+
+    """
+    pull_request = job.pull_request
+    if pull_request.status != 'OPEN' or not (
+            is_cascade_producer(pull_request.src_branch) and
+            is_cascade_consumer(pull_request.dst_branch)):
+        return False
+    job.git.cascade = BranchCascade()
+    handle_options(job)
+
+    repo = clone_git_repo(job)
+    src = job.git.src_branch = branch_factory(repo, pull_request.src_branch)
+    dst = job.git.dst_branch = branch_factory(repo, pull_request.dst_branch)
+    if not src.exists() or not dst.exists() or dst.includes_commit(src):
+        return False
+    build_branch_cascade(job)
+    job.git.cascade.validate()
+    key = speculation.state_key(job)
+    if not job.bert_e.speculation.check(pull_request.id, key):
+        return False
+
+    check_integration_branches(job)
+    repo.merge_results = {}
+    try:
+        update_integration_branches(
+            job, list(create_integration_branches(job)))
+    except messages.Conflict:
+        # conflicts are results too
+        repo.cmd('git reset -q --hard')
+    finally:
+        merges, repo.merge_results = repo.merge_results, None
+    repo.keep_objects()
+    job.bert_e.speculation.store(key, merges)
+    LOG.info('Evaluated %d merge(s) of pull request #%s', len(merges),
+             pull_request.id)
+    return True
+
+
 def handle_parent_pull_request(job, child_pr, is_child=True):
     """Handle the parent of an integration pull request."""
     if is_child:
@@ -123,6 +204,7 @@ def handle_parent_pull_request(job, child_pr, is_child=True):
 def _handle_pull_request(job: PullRequestJob):
     job.git.cascade = job.git.cascade or BranchCascade()
 
+    job.trace.phase('early checks')
     early_checks(job)
     send_greetings(job)
     src = job.git.src_branch = branch_factory(job.git.repo,
@@ -130,13 +212,17 @@ def _handle_pull_request(job: PullRequestJob):
     dst = job.git.dst_branch = branch_factory(job.git.repo,
                                               job.pull_request.dst_branch)
 
+    job.trace.phase('comments')
     handle_comments(job)
     LOG.debug("Running with active options: %r", job.active_options)
+    checkpoint(job)
 
     check_dependencies(job)
 
     # Now we're actually going to work on the repository. Let's clone it.
+    job.trace.phase('clone')
     clone_git_repo(job)
+    checkpoint(job)
 
     if job.pull_request.status == 'DECLINED':
         handle_declined_pull_request(job)
@@ -154,12 +240,15 @@ def _handle_pull_request(job: PullRequestJob):
     # Reject PRs that are too old
     check_commit_diff(job)
 
+    job.trace.phase('cascade')
     build_branch_cascade(job)
     job.git.cascade.validate()
 
     check_branch_compatibility(job)
     jira_checks(job)
 
+    job.trace.phase('integration update')
+    speculation.reuse(job)
     check_integration_branches(job)
     wbranches = list(create_integration_branches(job))
     use_queue = job.settings.use_queue
@@ -168,6 +257,7 @@ def _handle_pull_request(job: PullRequestJob):
 
     in_sync = check_in_sync(job, wbranches)
 
+    checkpoint(job)
     try:
         update_integration_branches(job, wbranches)
     except messages.Conflict as ex:
@@ -184,6 +274,7 @@ def _handle_pull_request(job: PullRequestJob):
             # hence reset branches to avoid a push later in the code
             for branch in wbranches:
                 branch.reset(ignore_missing=True)
+        checkpoint(job)
         push(job.git.repo, wbranches[1:])
 
     # create integration pull requests (if requested)
@@ -196,7 +287,9 @@ def _handle_pull_request(job: PullRequestJob):
             any(child_pr.newly_created for child_pr in child_prs)):
         notify_integration_data(job, wbranches, child_prs)
 
+    job.trace.phase('approvals')
     check_approvals(job)
+    job.trace.phase('build status')
     check_build_status(job, wbranches)
 
     interactive = job.settings.interactive
@@ -205,6 +298,7 @@ def _handle_pull_request(job: PullRequestJob):
 
     revalidate_build_status(job, wbranches)
 
+    job.trace.phase('queueing')
     # If the integration pull requests were already in sync with the
     # feature branch before our last update (which serves as a final
     # check for conflicts), and all builds were green, and we reached
@@ -252,6 +346,23 @@ def _handle_pull_request(job: PullRequestJob):
             active_options=job.active_options)
 
 
+def checkpoint(job):
+    """Abandon the job if a newer job on the same pull request is waiting.
+
+    Called at the points where the job can stop without leaving anything
+    half done: the local work copy is reset, and nothing is pushed.
+
+    Raises:
+        Superseded: if a newer job is waiting.
+
+    """
+    if not job.bert_e.is_superseded(job):
+        return
+    LOG.info('%s superseded by a newer job, stopping', job)
+    job.git.repo.reset()
+    raise messages.Superseded()
+
+
 def early_checks(job):
     """Early checks to filter out pull requests where no action is needed."""
     status = job.pull_request.status
@@ -273,7 +384,7 @@ def send_greetings(job):
 
     """
     username = job.settings.robot
-    if find_comment(job.pull_request, username=username):
+    if robot_messages(job.pull_request, username):
         return
 
     init_message = messages.InitMessage(
@@ -288,13 +399,19 @@ def send_greetings(job):
     )
 
 
-def handle_comments(job):
-    """Handle options and commands in the pull request's comments.
+def handle_options(job):
+    """Set the job's options from the pull request's comments.
+
+    The reactor is kept in `job.reactor`, so that the comments are only
+    read once by a job.
+
+    Returns:
+        The reactor the options were handled with.
 
     Raises:
-        UnknownCommand: if an unrecognized command is sent to BertE.
+        UnknownCommand: if an unrecognized option is set.
         NotEnoughCredentials: if the author of a message is trying to set an
-                              option or call a command he is not allowed to.
+                              option he is not allowed to.
 
     """
     reactor = Reactor()
@@ -302,11 +419,15 @@ def handle_comments(job):
     pr_author = job.pull_request.author
 
     reactor.init_settings(job)
+    # the options enabled on the command line for this repository
+    options = Reactor.get_options()
+    for key in job.settings.cmd_line_options:
+        if key in options:
+            job.settings[key] = True
 
     prefix = '@{}'.format(job.settings.robot)
     LOG.debug('looking for prefix: %s', prefix)
 
-    # Handle options
     # Look for options in all of the pull request's comments.
     for comment in job.pull_request.comments:
         author = comment.author
@@ -334,6 +455,23 @@ def handle_comments(job):
             raise messages.IncorrectCommandSyntax(
                 extra_message=str(err), active_options=job.active_options
             ) from err
+    job.reactor = reactor
+    return reactor
+
+
+def handle_comments(job):
+    """Handle options and commands in the pull request's comments.
+
+    Raises:
+        UnknownCommand: if an unrecognized command is sent to BertE.
+        NotEnoughCredentials: if the author of a message is trying to set an
+                              option or call a command he is not allowed to.
+
+    """
+    reactor = job.reactor or handle_options(job)
+    admins = job.settings.admins
+    pr_author = job.pull_request.author
+    prefix = '@{}'.format(job.settings.robot)
 
     # Handle commands
     # Look for commands in comments posted after BertE's last message.
@@ -428,6 +566,8 @@ def check_dependencies(job):
     for pr_id in after_prs:
         try:
             prs.append(job.project_repo.get_pull_request(int(pr_id)))
+        except DeadlineExceeded:
+            raise
         except Exception as err:
             raise messages.IncorrectPullRequestNumber(
                 pr_id=pr_id, active_options=job.active_options
@@ -606,7 +746,15 @@ def check_approvals(job):
 
     change_requests = set(job.pull_request.get_change_requests())
 
-    LOG.info('approvals: %s' % locals())
+    LOG.info('approvals: %s', Fields(
+        approved_by_author=approved_by_author,
+        participants=participants,
+        approvals=approvals,
+        change_requests=change_requests,
+        missing_leader_approvals=missing_leader_approvals,
+        missing_peer_approvals=missing_peer_approvals,
+        requires_unanimity=requires_unanimity,
+        is_unanimous=is_unanimous))
 
     if not approved_by_author or \
             missing_leader_approvals > 0 or \
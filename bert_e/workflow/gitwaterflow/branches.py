@@ -18,7 +18,6 @@ defined by GitWaterFlow.
 import logging
 import re
 from collections import OrderedDict
-from copy import deepcopy
 from functools import cmp_to_key
 from functools import total_ordering
 
@@ -389,10 +388,64 @@ class QueueIntegrationBranch(GWFBranch):
             other.includes_commit(self)
 
 
+class ValidatedQueues(object):
+    """State of the queues at their last successful validation.
+
+    Attributes:
+        queues (dict): maps each queue version to the list of (pr_id, sha1)
+            of its integration queues, most recent first.
+        inclusions (set): (container, contained) pairs of sha1s whose
+            ancestry was confirmed during that validation.
+
+    """
+
+    def __init__(self):
+        self.queues = None
+        self.inclusions = set()
+
+    @staticmethod
+    def _is_append_or_pop(previous, current):
+        """Whether a queue went from `previous` to `current` only by
+        appending new pull requests and popping the oldest ones."""
+        previous_prs = {pr_id for pr_id, _ in previous}
+        for start in range(len(current) + 1):
+            if any(pr_id in previous_prs for pr_id, _ in current[:start]):
+                return False
+            tail = current[start:]
+            if tail == previous[:len(tail)]:
+                return True
+        return False
+
+    def reusable_inclusions(self, queues):
+        """Return the inclusions that need not be checked again.
+
+        They are only reused when each queue changed by appends and pops
+        since the last validation; any other mutation (queues rebuilt,
+        deleted, reordered...) triggers a full revalidation.
+
+        """
+        if self.queues is None or set(self.queues) != set(queues):
+            return set()
+        for version, entries in queues.items():
+            if not self._is_append_or_pop(self.queues[version], entries):
+                LOG.debug('Queue %s changed since last validation, '
+                          'revalidating all queues', version)
+                return set()
+        return self.inclusions
+
+
 class QueueCollection(object):
-    """Manipulate and analyse all active queues in the repository."""
+    """Manipulate and analyse all active queues in the repository.
+
+    Args:
+        validated (ValidatedQueues): state of the last validation of the
+            repository's queues. When provided, validate() only checks what
+            changed since then, and records the new state on success.
+
+    """
 
-    def __init__(self, bbrepo, build_key, merge_paths, force_merge):
+    def __init__(self, bbrepo, build_key, merge_paths, force_merge,
+                 validated=None):
         self.bbrepo = bbrepo
         self.build_key = build_key
         self.merge_paths = merge_paths
@@ -401,6 +454,10 @@ class QueueCollection(object):
         self._mergeable_queues = None
         self._mergeable_prs = []
         self._validated = False
+        self._last_validation = validated
+        self._shas = {}
+        self._known_inclusions = set()
+        self._checked_inclusions = set()
 
     def build(self, repo):
         """Collect q branches from repository, add them to the collection."""
@@ -472,13 +529,12 @@ class QueueCollection(object):
         if not masterq:
             yield errors.MasterQueueMissing(version)
         else:
-            if not masterq.includes_commit(masterq.dst_branch):
+            if not self._includes(masterq, masterq.dst_branch):
                 yield errors.MasterQueueLateVsDev(masterq, masterq.dst_branch)
 
             if not self._queues[version][QueueIntegrationBranch]:
                 # check master queue points to dev
-                if (masterq.get_latest_commit() !=
-                        masterq.dst_branch.get_latest_commit()):
+                if self._sha(masterq) != self._sha(masterq.dst_branch):
                     yield errors.MasterQueueNotInSync(masterq,
                                                       masterq.dst_branch)
             else:
@@ -487,13 +543,12 @@ class QueueCollection(object):
                 greatest_intq = (
                     self._queues[version][QueueIntegrationBranch][0]
                 )
-                if (greatest_intq.get_latest_commit() !=
-                        masterq.get_latest_commit()):
-                    if greatest_intq.includes_commit(masterq):
+                if self._sha(greatest_intq) != self._sha(masterq):
+                    if self._includes(greatest_intq, masterq):
                         yield errors.MasterQueueLateVsInt(masterq,
                                                           greatest_intq)
 
-                    elif masterq.includes_commit(greatest_intq):
+                    elif self._includes(masterq, greatest_intq):
                         yield errors.MasterQueueYoungerThanInt(masterq,
                                                                greatest_intq)
 
@@ -504,10 +559,10 @@ class QueueCollection(object):
             # check each integration queue contains the previous one
             nextq = masterq
             for intq in self._queues[version][QueueIntegrationBranch]:
-                if not nextq.includes_commit(intq):
+                if not self._includes(nextq, intq):
                     yield errors.QueueInclusionIssue(nextq, intq)
                 nextq = intq
-            if not nextq.includes_commit(masterq.dst_branch):
+            if not self._includes(nextq, masterq.dst_branch):
                 yield errors.QueueInclusionIssue(nextq, masterq.dst_branch)
 
     def _vertical_validation(self, stack, versions):
@@ -558,7 +613,7 @@ class QueueCollection(object):
                             pr):
                         vqint = stack[version][QueueIntegrationBranch].pop(0)
                         # take this opportunity to check vertical inclusion
-                        if not next_vqint.includes_commit(vqint):
+                        if not self._includes(next_vqint, vqint):
                             yield errors.QueueInclusionIssue(next_vqint, vqint)
                         next_vqint = vqint
                     else:
@@ -609,6 +664,11 @@ class QueueCollection(object):
             content from the previous integration queue; The last diff is
             checked vs the corresponding development branch. TODO
 
+        When the state of the last validation is known, the inclusions it
+        established are not checked again, as long as the queues only
+        changed by new pull requests being queued or merged ones being
+        removed.
+
         """
         errs = []
         versions = self._queues.keys()
@@ -618,12 +678,18 @@ class QueueCollection(object):
             self._validated = True
             return
 
+        self._resolve_shas()
+        self._checked_inclusions = set()
+        if self._last_validation is not None:
+            self._known_inclusions = (
+                self._last_validation.reusable_inclusions(self._state()))
+
         for version in versions:
             errs.extend(self._horizontal_validation(version))
 
         for merge_path in self.merge_paths:
             versions = [branch.version_t for branch in merge_path]
-            stack = deepcopy(self._queues)
+            stack = self._copy_queues()
             # remove versions not on this merge_path from consideration
             for version in list(stack.keys()):
                 if version not in versions:
@@ -635,6 +701,81 @@ class QueueCollection(object):
             raise errors.IncoherentQueues(errs)
 
         self._validated = True
+        if self._last_validation is not None:
+            self._last_validation.queues = self._state()
+            self._last_validation.inclusions = self._checked_inclusions
+
+    def _resolve_shas(self):
+        """Resolve the tips of all queue and development branches in a
+        single git command."""
+        branches = {}
+        for queues in self._queues.values():
+            masterq = queues[QueueBranch]
+            if masterq:
+                branches[masterq.name] = masterq
+                branches[masterq.dst_branch.name] = masterq.dst_branch
+            for intq in queues[QueueIntegrationBranch]:
+                branches[intq.name] = intq
+        self._shas = {}
+        if not branches:
+            return
+        names = sorted(branches)
+        repo = branches[names[0]].repo
+        try:
+            output = repo.cmd('git rev-parse' + ' %s' * len(names), *names)
+        except git.CommandError:
+            # let _sha() resolve the branches one by one
+            return
+        shas = output.split()
+        if len(shas) == len(names):
+            self._shas = dict(zip(names, shas))
+
+    def _sha(self, branch):
+        """Return the sha1 of the tip of a branch."""
+        sha1 = self._shas.get(branch.name)
+        if sha1 is None:
+            sha1 = self._shas[branch.name] = branch.get_latest_commit()
+        return sha1
+
+    def _includes(self, branch, other):
+        """Whether `branch` includes the tip of `other`.
+
+        Positive answers are recorded, and reused from the last validation
+        when allowed.
+
+        """
+        try:
+            pair = (self._sha(branch), self._sha(other))
+        except git.CommandError:
+            # missing branch, nothing to record
+            return branch.includes_commit(other)
+        if (pair[0] == pair[1] or pair in self._checked_inclusions or
+                pair in self._known_inclusions):
+            self._checked_inclusions.add(pair)
+            return True
+        if not branch.includes_commit(other):
+            return False
+        self._checked_inclusions.add(pair)
+        return True
+
+    def _state(self):
+        """Return the pull requests and tips of the integration queues."""
+        return {
+            version: [(intq.pr_id, self._sha(intq))
+                      for intq in queues[QueueIntegrationBranch]]
+            for version, queues in self._queues.items()
+        }
+
+    def _copy_queues(self):
+        """Return a copy of the queues that can be popped from without
+        altering the collection."""
+        return OrderedDict(
+            (version, {
+                QueueBranch: queues[QueueBranch],
+                QueueIntegrationBranch: list(queues[QueueIntegrationBranch]),
+            })
+            for version, queues in self._queues.items()
+        )
 
     @property
     def failed_prs(self):
@@ -766,7 +907,7 @@ class QueueCollection(object):
         if not self.force_merge:
             for merge_path in self.merge_paths:
                 versions = [branch.version_t for branch in merge_path]
-                stack = deepcopy(self._queues)
+                stack = self._copy_queues()
                 # remove versions not on this merge_path from consideration
                 for version in list(stack.keys()):
                     # exclude hf version from this pop process
@@ -782,7 +923,7 @@ class QueueCollection(object):
                     mergeable_prs = path_mergeable_prs
 
         self._mergeable_prs = mergeable_prs
-        mergeable_queues = deepcopy(self._queues)
+        mergeable_queues = self._copy_queues()
         self._remove_unmergeable(mergeable_prs, mergeable_queues)
         self._mergeable_queues = mergeable_queues
 
@@ -859,16 +1000,85 @@ class QueueCollection(object):
                 is not None)
 
     def delete(self):
-        """Delete the queues entirely."""
+        """Delete the queues entirely.
+
+        The branches are only deleted locally, the deletions are sent with
+        the next push of the pruned branches.
+
+        """
 
         for branch in self._queues.values():
             queue: QueueBranch = branch[QueueBranch]
             queue.dst_branch.checkout()
-            queue.remove(do_push=True)
+            queue.remove()
             queue_integration: QueueIntegrationBranch | None = branch.get(
                 QueueIntegrationBranch)
             if queue_integration:
-                queue_integration.remove(do_push=True)
+                queue_integration.remove()
+
+
+class TagIndex(object):
+    """Index of the version tags of a repository.
+
+    Tags are parsed once. The index then answers "what is the latest
+    released micro of X.Y" or "the latest hotfix revision of X.Y.Z" with
+    dictionary lookups instead of a scan of the whole tag list.
+
+    """
+    pattern = re.compile(r"^v?(?P<major>\d+)\.(?P<minor>\d+)\.(?P<micro>\d+)"
+                         r"(\.(?P<hfrev>\d+)|)$")
+
+    def __init__(self, tags=()):
+        self._size = 0  # number of version tags
+        self._tags = {}  # (major, minor, micro) -> first tag seen
+        self._latest_minor = {}  # major -> minor
+        self._latest_micro = {}  # (major, minor) -> micro
+        self._latest_hfrev = {}  # (major, minor, micro) -> hfrev
+        for tag in tags:
+            self._add(tag)
+
+    def _add(self, tag):
+        match = self.pattern.match(tag)
+        if not match:
+            LOG.debug("Ignore tag: %s", tag)
+            return
+        major = int(match.group('major'))
+        minor = int(match.group('minor'))
+        micro = int(match.group('micro'))
+        hfrev = match.group('hfrev')
+        hfrev = int(hfrev) if hfrev is not None else 0
+
+        self._size += 1
+        self._tags.setdefault((major, minor, micro), tag)
+        self._latest_minor[major] = max(
+            minor, self._latest_minor.get(major, minor))
+        self._latest_micro[major, minor] = max(
+            micro, self._latest_micro.get((major, minor), micro))
+        self._latest_hfrev[major, minor, micro] = max(
+            hfrev, self._latest_hfrev.get((major, minor, micro), hfrev))
+
+    def latest_minor(self, major):
+        """Return the greatest tagged minor of a major version, or None."""
+        return self._latest_minor.get(major)
+
+    def latest_micro(self, major, minor):
+        """Return the greatest tagged micro of a minor version, or None."""
+        return self._latest_micro.get((major, minor))
+
+    def latest_hfrev(self, major, minor, micro):
+        """Return the greatest tagged hotfix revision of a release, or None.
+
+        A plain X.Y.Z tag counts as hotfix revision 0.
+
+        """
+        return self._latest_hfrev.get((major, minor, micro))
+
+    def tag(self, major, minor, micro):
+        """Return the first tag seen for a given X.Y.Z release, or None."""
+        return self._tags.get((major, minor, micro))
+
+    def __len__(self):
+        return self._size
 
 
 class BranchCascade(object):
@@ -925,8 +1135,8 @@ class BranchCascade(object):
                 continue
             self.add_branch(branch, dst_branch)
 
-        for tag in repo.cmd('git tag').split('\n')[:-1]:
-            self.update_versions(tag)
+        self.update_versions_from_index(
+            TagIndex(repo.cmd('git tag').split('\n')[:-1]))
 
         # Re-sort the cascade after update_versions may have changed keys
         self._cascade = OrderedDict(
@@ -1004,107 +1214,105 @@ class BranchCascade(object):
         self._cascade[key][branch.__class__] = branch
 
     def update_versions(self, tag):
-        """Update expected versions based on repository tags."""
-        pattern = r"^v?(?P<major>\d+)\.(?P<minor>\d+)\.(?P<micro>\d+)" \
-                  r"(\.(?P<hfrev>\d+)|)$"
-        match = re.match(pattern, tag)
-        if not match:
-            LOG.debug("Ignore tag: %s", tag)
-            return
-        LOG.debug("Consider tag: %s", tag)
-        major = int(match.groupdict()['major'])
-        minor = int(match.groupdict()['minor'])
-        micro = int(match.groupdict()['micro'])
-        hfrev = 0  # default hfrev
-        if match.groupdict()['hfrev'] is not None:
-            hfrev = int(match.groupdict()['hfrev'])
-
-        # Look for branches that match this version
-        # Check for exact (major, minor) match and major-only match
-        branches = self._cascade.get((major, minor), {})
-        major_branches = self._cascade.get((major, None), {})
-        micro_branches = self._cascade.get((major, minor, micro), {})
-
-        # Also look for hotfix branches with matching major.minor.micro
-        hf_branch = None
+        """Update expected versions based on a single repository tag."""
+        self.update_versions_from_index(TagIndex([tag]))
+
+    def _has_version_branches(self, major, minor, micro):
+        """Tell whether tags on X.Y.Z are relevant to this cascade."""
+        return ((major, minor) in self._cascade or
+                (major, None) in self._cascade or
+                self._hotfix_branch(major, minor, micro) is not None)
+
+    def _hotfix_branch(self, major, minor, micro):
         for key, branch_set in self._cascade.items():
-            if (len(key) >= 3 and key[0] == major and key[1] == minor and
-                    key[2] == micro and branch_set.get(HotfixBranch)):
-                hf_branch = branch_set[HotfixBranch]
-                break
+            if len(key) >= 3 and key[:3] == (major, minor, micro) and \
+                    branch_set.get(HotfixBranch):
+                return branch_set[HotfixBranch]
+        return None
+
+    @staticmethod
+    def _update_hfrev(hf_branch, tags):
+        hfrev = tags.latest_hfrev(hf_branch.major, hf_branch.minor,
+                                  hf_branch.micro)
+        if hfrev is None:
+            return
+        hf_branch.hfrev = max(hfrev + 1, hf_branch.hfrev)
+        hf_branch.version = '%d.%d.%d.%d' % (hf_branch.major,
+                                             hf_branch.minor,
+                                             hf_branch.micro,
+                                             hf_branch.hfrev)
 
-        if not branches and not major_branches and not hf_branch:
-            LOG.debug("Ignore tag: %s", tag)
+    def update_versions_from_index(self, tags):
+        """Update expected versions based on an index of repository tags.
+
+        Each branch of the cascade resolves its versions with lookups in
+        the index, so the cost depends on the number of branches rather
+        than on the number of tags.
+
+        Args:
+            tags (TagIndex): the repository's version tags.
+
+        Raises:
+            ReleaseAlreadyExists: if a X.Y.Z development branch was already
+                                  released.
+
+        """
+        if not tags:
             return
 
-        # If we didn't find hf_branch above, check in branches
-        if not hf_branch:
-            hf_branch = branches.get(HotfixBranch)
-        dev_branch: DevelopmentBranch = branches.get(DevelopmentBranch)
-        major_branch: DevelopmentBranch = major_branches.get(DevelopmentBranch)
-        micro_branch: DevelopmentBranch = micro_branches.get(DevelopmentBranch)
-
-        if hf_branch:
-            if hf_branch.micro == micro:
-                hf_branch.hfrev = max(hfrev + 1, hf_branch.hfrev)
-                hf_branch.version = '%d.%d.%d.%d' % (hf_branch.major,
-                                                     hf_branch.minor,
-                                                     hf_branch.micro,
-                                                     hf_branch.hfrev)
-
-        # Also update phantom hotfixes (stored outside _cascade for dev PRs).
-        # They are only consumed for their .minor today, but keeping .hfrev
-        # and .version current prevents stale data surprises in future callers.
-        for phantom in self._phantom_hotfixes:
-            if (phantom.major == major and phantom.minor == minor and
-                    phantom.micro == micro):
-                phantom.hfrev = max(hfrev + 1, phantom.hfrev)
-                phantom.version = '%d.%d.%d.%d' % (
-                    phantom.major, phantom.minor,
-                    phantom.micro, phantom.hfrev)
-
-        if micro_branch is not None and \
-           ([micro_branch.major, micro_branch.minor,
-             micro_branch.micro] == [major, minor, micro]):
+        conflicts = []
+        for key, branch_set in self._cascade.items():
+            micro_branch = branch_set[DevelopmentBranch]
+            if len(key) != 3 or micro_branch is None:
+                continue
+            tag = tags.tag(*key)
+            if tag is not None and self._has_version_branches(*key):
+                conflicts.append((tag, micro_branch))
+        if conflicts:
+            tag, micro_branch = min(conflicts, key=lambda item: item[0])
             raise errors.ReleaseAlreadyExists(micro_branch, tag)
 
-        if dev_branch:
-            # Only update if tag matches X.Y
-            # And is not a three-digit dev branch
+        for key, branch_set in self._cascade.items():
+            hf_branch = branch_set[HotfixBranch]
+            dev_branch = branch_set[DevelopmentBranch]
+            if hf_branch is not None:
+                self._update_hfrev(hf_branch, tags)
 
-            if dev_branch.major == major and dev_branch.minor == minor:
-                # Exclude tags whose micro is already
-                # A three-digit dev branch for this X.Y
-                three_digit_keys = [
-                    k for k in self._cascade.keys()
-                    if len(k) == 3 and k[0] == major and k[1] == minor
-                ]
+            if dev_branch is None or len(key) != 2:
+                continue
 
-                three_digit_micros = set(k[2] for k in three_digit_keys)
-                next_micro = micro + 1
-                while next_micro in three_digit_micros:
-                    next_micro += 1
-                if (not hasattr(dev_branch, '_next_micro') or
-                        dev_branch._next_micro is None):
-                    dev_branch._next_micro = next_micro
-                else:
-                    dev_branch._next_micro = max(
-                        next_micro,
-                        dev_branch._next_micro
-                    )
-        if major_branch:
-            major_branch.latest_minor = max(
-                minor,
-                major_branch.latest_minor
-            )
+            major, minor = key
+            if minor is None:
+                latest_minor = tags.latest_minor(major)
+                if latest_minor is not None:
+                    dev_branch.latest_minor = max(latest_minor,
+                                                  dev_branch.latest_minor)
+                continue
 
-        # Re-sort the cascade after any key changes
-        self._cascade = OrderedDict(
-            sorted(
-                self._cascade.items(),
-                key=cmp_to_key(compare_branches)
+            latest_micro = tags.latest_micro(major, minor)
+            if latest_micro is None:
+                continue
+            # Skip micros that already have their own X.Y.Z dev branch
+            three_digit_micros = set(
+                k[2] for k in self._cascade.keys()
+                if len(k) == 3 and k[0] == major and k[1] == minor
             )
-        )
+            next_micro = latest_micro + 1
+            while next_micro in three_digit_micros:
+                next_micro += 1
+            if getattr(dev_branch, '_next_micro', None) is None:
+                dev_branch._next_micro = next_micro
+            else:
+                dev_branch._next_micro = max(next_micro,
+                                             dev_branch._next_micro)
+
+        # Phantom hotfixes (stored outside _cascade for dev PRs) are only
+        # consumed for their .minor today, but keeping .hfrev and .version
+        # current prevents stale data surprises in future callers.
+        for phantom in self._phantom_hotfixes:
+            if self._has_version_branches(phantom.major, phantom.minor,
+                                          phantom.micro):
+                self._update_hfrev(phantom, tags)
 
     def validate(self):
         previous_dev_branch = None
@@ -1398,7 +1606,8 @@ def build_queue_collection(job):
         cascade.build(job.git.repo)
     queues = QueueCollection(job.project_repo, job.settings.build_key,
                              cascade.get_merge_paths(),
-                             getattr(job, 'force_merge', False))
+                             getattr(job, 'force_merge', False),
+                             getattr(job.bert_e, 'validated_queues', None))
     queues.build(job.git.repo)
     return queues
 
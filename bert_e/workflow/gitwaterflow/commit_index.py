@@ -0,0 +1,153 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Index of the branches and pull requests of the commits of a repository.
+
+Build statuses come in by dozens for each push, and the job each one
+triggers needs the pull request the commit belongs to. When the
+`commit_index` setting is set, Bert-E keeps:
+
+- the heads of the remote branches, by sha,
+- the open pull request of each source branch.
+
+so that these jobs find their pull request without listing the remote
+branches nor the pull requests. The index is maintained from:
+
+- the pull request webhooks, as they come in, and the pull requests
+  Bert-E handles (their source branch and commit),
+- the branches Bert-E pushes (integration and queue branches),
+- a periodic reconciliation with the remote heads and the open pull
+  requests, in idle time.
+
+Commits the index doesn't know are looked up as before, and so are the
+pull requests it maps to a branch but that are no longer open.
+
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from bert_e.lib.metrics import Counter
+
+LOG = logging.getLogger(__name__)
+
+COMMIT_INDEX_RESULTS = Counter(
+    'bert_e_commit_index_results_total',
+    'Lookups of the branches of a commit, by whether the index knew them.',
+    ['result'])
+
+
+class CommitIndex(object):
+    """Branches by head sha, and pull requests by source branch.
+
+    Args:
+        interval (float): time, in seconds, between two reconciliations.
+
+    """
+
+    def __init__(self, interval=600):
+        self.interval = interval
+        self.reconciled = None
+        # branch name -> sha of its head
+        self._heads = {}
+        # sha -> names of the branches it is the head of
+        self._branches = defaultdict(set)
+        # source branch name -> id of its open pull request
+        self._pull_requests = {}
+        self._lock = threading.Lock()
+
+    def branches(self, sha):
+        """Return the names of the branches `sha` is the head of, None if
+        the index doesn't know it."""
+        with self._lock:
+            branches = self._branches.get(sha)
+            if self.reconciled is None or not branches:
+                COMMIT_INDEX_RESULTS.inc(result='miss')
+                return None
+            COMMIT_INDEX_RESULTS.inc(result='hit')
+            return set(branches)
+
+    def pull_request(self, src_branches):
+        """Return the id of the oldest open pull request whose source branch
+        is one of `src_branches`, None if the index knows none."""
+        with self._lock:
+            ids = [self._pull_requests[name] for name in src_branches
+                   if name in self._pull_requests]
+        return min(ids) if ids else None
+
+    def update_pull_request(self, pull_request):
+        """Record the state of a pull request handled by Bert-E."""
+        src_branch = pull_request.src_branch
+        with self._lock:
+            known = self._pull_requests.get(src_branch)
+            if pull_request.status != 'OPEN':
+                if known == pull_request.id:
+                    del self._pull_requests[src_branch]
+                return
+            if known is None or pull_request.id < known:
+                self._pull_requests[src_branch] = pull_request.id
+            if len(pull_request.src_commit or '') == 40:
+                self._set_head(src_branch, pull_request.src_commit)
+
+    def update_heads(self, updates):
+        """Record the branches pushed by Bert-E.
+
+        Args:
+            updates: list of RefUpdate(name, old, new), see
+                git.Repository.push_changes.
+
+        """
+        with self._lock:
+            for update in updates:
+                self._set_head(update.name, update.new)
+
+    def due(self):
+        """Return True if the index should be reconciled."""
+        return self.reconciled is None or \
+            time.monotonic() - self.reconciled >= self.interval
+
+    def reconcile(self, heads, pull_requests):
+        """Rebuild the index from the remote heads and the open pull
+        requests.
+
+        Args:
+            heads (dict): full sha of the head of each branch, by name.
+            pull_requests: the open pull requests.
+
+        """
+        branches = defaultdict(set)
+        for name, sha in heads.items():
+            branches[sha].add(name)
+        src_branches = {}
+        for pull_request in pull_requests:
+            known = src_branches.get(pull_request.src_branch)
+            if known is None or pull_request.id < known:
+                src_branches[pull_request.src_branch] = pull_request.id
+        with self._lock:
+            self._heads = dict(heads)
+            self._branches = branches
+            self._pull_requests = src_branches
+            self.reconciled = time.monotonic()
+        LOG.debug('Indexed %d branches and %d pull requests',
+                  len(heads), len(src_branches))
+
+    def _set_head(self, name, sha):
+        previous = self._heads.pop(name, None)
+        if previous is not None:
+            self._branches[previous].discard(name)
+            if not self._branches[previous]:
+                del self._branches[previous]
+        if sha:
+            self._heads[name] = sha
+            self._branches[sha].add(name)
@@ -0,0 +1,158 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Short-circuit of the evaluation of pull requests whose state didn't change.
+
+Most jobs on a pull request end the way the previous one did: waiting for
+builds or approvals, queued, or with nothing to do. When the
+`evaluation_fingerprints` setting is set, Bert-E keeps, for each pull request,
+the outcome of its last evaluation along with a fingerprint of the inputs it
+depended on:
+
+- the heads of its source branch, of the development, hotfix and queue
+  branches, and of its integration branches,
+- the comments and reviews of its participants (those of the robot are its
+  own outputs),
+- the build statuses of its source and integration branches,
+- the settings of the job and of the repository,
+- the time its Jira issue was last updated.
+
+A job that finds the same fingerprint ends with the same outcome, before the
+repository is cloned. Any change of the inputs leads to a full evaluation.
+
+Reading the heads of the branches still costs an update of the cache of the
+repository (a `git ls-remote` when only some branches are fetched), and the
+build statuses and Jira issue a few API requests: a replayed outcome is not
+free. These are recorded in the 'remote heads' and 'fingerprint' phases of
+the job's trace, and are not wasted when the fingerprint doesn't match: the
+evaluation clones the repository from the updated cache.
+
+Jobs that update the integration branches change the fingerprint of the next
+one, which evaluates the pull request in full once again, and stores the
+fingerprint the following jobs match.
+
+"""
+import hashlib
+import logging
+
+from bert_e import exceptions
+from bert_e.lib.cache import Cache
+from bert_e.lib.metrics import Counter
+from .branches import branch_factory, is_cascade_consumer, is_cascade_producer
+from .jira import issue_updated
+
+LOG = logging.getLogger(__name__)
+
+FINGERPRINT_RESULTS = Counter(
+    'bert_e_fingerprint_results_total',
+    'Pull request jobs, by whether their fingerprint matched the outcome of '
+    'the previous evaluation.',
+    ['result'])
+
+# outcomes that depend on nothing else than the fingerprinted inputs
+REPLAYABLE = (
+    exceptions.ApprovalRequired,
+    exceptions.BuildFailed,
+    exceptions.BuildInProgress,
+    exceptions.BuildNotStarted,
+    exceptions.NothingToDo,
+    exceptions.Queued,
+)
+
+# branches whose heads are part of every fingerprint
+SHARED_BRANCHES = ('development/', 'hotfix/', 'q/')
+
+
+class Outcomes(object):
+    """Outcomes of the last evaluation of pull requests, with the fingerprint
+    of their inputs.
+
+    Args:
+        size (int): number of pull requests whose outcome is kept.
+
+    """
+
+    def __init__(self, size=1000):
+        self._outcomes = Cache(size)
+
+    def replay(self, pr_id, fingerprint):
+        """Raise the outcome of the last evaluation of a pull request, if its
+        fingerprint was the same."""
+        if fingerprint is None:
+            return
+        known, outcome = self._outcomes.get(pr_id, (None, None))
+        if known != fingerprint:
+            FINGERPRINT_RESULTS.inc(result='miss')
+            return
+        FINGERPRINT_RESULTS.inc(result='hit')
+        LOG.debug('Pull request #%s did not change since its last '
+                  'evaluation: %s', pr_id, type(outcome).__name__)
+        # start from a clean traceback, raising the same instance again would
+        # append the frames of this job to those of the previous ones
+        raise outcome.with_traceback(None)
+
+    def record(self, pr_id, fingerprint, outcome):
+        """Keep the outcome of the evaluation of a pull request, if it can be
+        replayed."""
+        if fingerprint is None or not isinstance(outcome, REPLAYABLE):
+            self._outcomes.set(pr_id, (None, None))
+            return
+        # don't keep the frames of the evaluation (job, clone, payloads) alive
+        outcome.__context__ = outcome.__cause__ = None
+        self._outcomes.set(pr_id, (fingerprint, outcome.with_traceback(None)))
+
+
+def compute(job):
+    """Return the fingerprint of the inputs of the job's pull request, None if
+    it has none (its evaluation stops early anyway).
+
+    Must be called once the job's options are read from the comments.
+
+    """
+    pull_request = job.pull_request
+    if pull_request.status != 'OPEN' or not (
+            is_cascade_producer(pull_request.src_branch) and
+            is_cascade_consumer(pull_request.dst_branch)):
+        return None
+    robot = job.settings.robot
+    src_name = pull_request.src_branch
+    job.trace.phase('remote heads')
+    remote_heads = job.git.repo.get_remote_heads()
+    job.trace.phase('fingerprint')
+    heads = sorted(
+        (name, sha) for name, sha in remote_heads.items()
+        if name.startswith(SHARED_BRANCHES) or name == src_name or (
+            name.startswith('w/') and name.endswith('/' + src_name)))
+    key = job.settings.build_key
+    build_statuses = []
+    if key:
+        shas = {pull_request.src_commit} | {
+            sha for name, sha in heads if name.startswith('w/')}
+        build_statuses = sorted(
+            (sha, job.project_repo.get_build_status(sha, key))
+            for sha in shas)
+    job.git.src_branch = branch_factory(job.git.repo, src_name)
+    inputs = (
+        pull_request.src_commit,
+        pull_request.dst_branch,
+        heads,
+        [(comment.id, comment.author, comment.text)
+         for comment in pull_request.comments if comment.author != robot],
+        sorted(pull_request.get_approvals()),
+        sorted(pull_request.get_change_requests()),
+        build_statuses,
+        sorted(job.settings.maps[0].items()),
+        [sorted(settings.items()) for settings in job.bert_e.settings.maps],
+        issue_updated(job),
+    )
+    return hashlib.sha1(repr(inputs).encode()).hexdigest()
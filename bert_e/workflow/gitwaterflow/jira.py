@@ -25,12 +25,22 @@ from jira.exceptions import JIRAError
 
 from bert_e import exceptions
 from bert_e.lib import jira as jira_api
-from ..pr_utils import find_comment, notify_user
+from bert_e.lib.metrics import Counter
+from .branches import FeatureBranch
+from ..pr_utils import notify_user, robot_messages
 from .utils import bypass_jira_check
 
 
 LOG = logging.getLogger(__name__)
 
+JIRA_PREFETCH_RESULTS = Counter(
+    'bert_e_jira_prefetch_results_total',
+    'Jira issues looked up by jobs, by whether they were prefetched.',
+    ['result'])
+
+# number of issues fetched by each search, within Jira's page size limit
+PREFETCH_BATCH = 50
+
 
 def jira_checks(job):
     """Performs consistency checks against associated Jira issue."""
@@ -66,20 +76,101 @@ def get_jira_issue(job):
         JiraIssueNotFound: if the issue doesn't exist.
 
     """
+    issue_id = job.git.src_branch.jira_issue_key
+    issue = getattr(job, 'jira_issue', None)
+    if issue is not None and issue.key == issue_id:
+        return issue
+    prefetched = getattr(job.bert_e, 'jira_issues', None)
+    if prefetched is not None:
+        # each prefetched issue serves a single job: the next job on the
+        # pull request gets the issue as it is then
+        issue = prefetched.pop(issue_id)
+        JIRA_PREFETCH_RESULTS.inc(result='miss' if issue is None else 'hit')
+        if issue is not None:
+            job.jira_issue = issue
+            return issue
     try:
-        return jira_api.JiraIssue(
+        job.jira_issue = jira_api.JiraIssue(
             account_url=job.settings.jira_account_url,
-            issue_id=job.git.src_branch.jira_issue_key,
+            issue_id=issue_id,
             email=job.settings.jira_email,
             token=job.settings.jira_token
         )
     except JIRAError as err:
         if err.status_code == 404:
             raise exceptions.JiraIssueNotFound(
-                issue=job.git.src_branch.jira_issue_key,
+                issue=issue_id,
                 active_options=job.active_options
             ) from err
         raise
+    return job.jira_issue
+
+
+def prefetch_issues(bert_e, pull_requests):
+    """Fetch the Jira issues of pull requests about to be evaluated.
+
+    The issues referenced by the source branches of the pull requests are
+    fetched with as few searches as possible, rather than one request per
+    job, and kept in `bert_e.jira_issues` for `get_jira_issue`. Issues
+    already prefetched aren't fetched again.
+
+    Returns:
+        int: the number of issues fetched.
+
+    """
+    settings = bert_e.settings
+    cache = getattr(bert_e, 'jira_issues', None)
+    if cache is None or not all([settings.jira_keys,
+                                 settings.jira_email,
+                                 settings.jira_account_url]):
+        return 0
+    keys = set()
+    for pull_request in pull_requests:
+        try:
+            src_branch = FeatureBranch(None, pull_request.src_branch)
+        except exceptions.BranchNameInvalid:
+            continue
+        if src_branch.jira_project in settings.jira_keys and \
+                cache.get(src_branch.jira_issue_key) is None:
+            keys.add(src_branch.jira_issue_key)
+    keys = sorted(keys)
+    fetched = 0
+    for index in range(0, len(keys), PREFETCH_BATCH):
+        batch = keys[index:index + PREFETCH_BATCH]
+        try:
+            issues = jira_api.search_issues(
+                account_url=settings.jira_account_url,
+                keys=batch,
+                email=settings.jira_email,
+                token=settings.jira_token)
+        except JIRAError as err:
+            LOG.warning('Failed to prefetch Jira issues %s: %s', batch, err)
+            return fetched
+        # issues not found (e.g. moved to another key) are fetched by their
+        # job as before
+        for issue in issues:
+            cache.set(issue.key, issue)
+        fetched += len(issues)
+    return fetched
+
+
+def issue_updated(job):
+    """Return the time the Jira issue associated with a pull request was last
+    updated, None if the issue isn't checked.
+
+    The issue is kept on the job, for the checks to come.
+
+    """
+    if bypass_jira_check(job) or \
+            job.git.src_branch.prefix in job.settings.bypass_prefixes:
+        return None
+    if not all([job.settings.jira_keys,
+                job.settings.jira_email,
+                job.settings.jira_account_url]):
+        return None
+    if not job.git.src_branch.jira_issue_key:
+        return None
+    return getattr(get_jira_issue(job).fields, 'updated', None)
 
 
 def check_issue_reference(job) -> bool:
@@ -204,12 +295,9 @@ def _notify_pending_hotfix_if_needed(job, issue):
     This is an informational message: it is posted at most once per PR
     and never blocks the flow.
 
-    The standard dont_repeat_if_in_history dedup uses the full rendered
-    message as the match key, which includes the active_options footer.
-    Because active_options can change between runs (e.g. when
-    create_integration_branches is added), the footer-sensitive match would
-    miss a comment posted in an earlier run and post again. We guard with
-    an explicit title-prefix check first, which is stable across runs.
+    The standard dont_repeat_if_in_history dedup matches the content of the
+    message, which changes with the hotfix versions of the ticket. We guard
+    with an explicit title check first, which is stable across runs.
     """
     phantom_versions = job.git.cascade.phantom_hotfix_versions
     if not phantom_versions:
@@ -219,8 +307,8 @@ def _notify_pending_hotfix_if_needed(job, issue):
     if not matching:
         return
     # Stable dedup: any previous comment with this title means skip.
-    if find_comment(job.pull_request, job.settings.robot,
-                    startswith=_PENDING_HOTFIX_TITLE):
+    if robot_messages(job.pull_request, job.settings.robot).has_title(
+            _PENDING_HOTFIX_TITLE):
         return
     reminder = exceptions.PendingHotfixVersionReminder(
         issue=issue,
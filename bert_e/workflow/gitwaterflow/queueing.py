@@ -83,7 +83,7 @@ def handle_merge_queues(job):
         close_queued_pull_request(job, pr_id, deepcopy(cascade))
         job.bert_e.add_merged_pr(pr_id)
 
-    # git push --all --force --prune
+    # push the development branches and the deletion of the queues
     push(job.git.repo, prune=True)
     raise exceptions.Merged()
 
@@ -92,13 +92,13 @@ def get_queue_branch(job, dev_branch: DevelopmentBranch, create=True
                      ) -> QueueBranch:
     """Get the q/x.y branch corresponding to development/x.y.
 
-    Create it if necessary.
+    Create it locally if necessary.
 
     """
     name = 'q/{}'.format(dev_branch.version)
     qbranch = branch_factory(job.git.repo, name)
     if not qbranch.exists() and create:
-        qbranch.create(dev_branch)
+        qbranch.create(dev_branch, do_push=False)
     return qbranch
 
 
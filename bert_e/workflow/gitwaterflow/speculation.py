@@ -0,0 +1,133 @@
+# Copyright 2016-2018 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Speculative evaluation of pull requests, in idle time.
+
+When the `speculative_evaluation` setting is set, Bert-E uses the time it
+has no job to process to pre-evaluate the pull requests it handled recently:
+their data is fetched from the git host again, which refreshes the caches
+of the client, and the merges of their integration branches are computed in
+a work copy that is thrown away. Nothing is pushed nor posted.
+
+The results of the merges are kept, keyed by the state of the pull request:
+the sha of its source branch and those of its destination branches. When a
+job then handles the pull request in the same state, it reuses them instead
+of merging again.
+
+"""
+import logging
+import time
+from collections import OrderedDict
+
+from bert_e.lib.cache import Cache
+from bert_e.lib.metrics import Counter
+
+LOG = logging.getLogger(__name__)
+
+SPECULATIVE_EVALUATIONS = Counter(
+    'bert_e_speculative_evaluations_total',
+    'Pull request states evaluated speculatively.')
+SPECULATIVE_RESULTS = Counter(
+    'bert_e_speculative_results_total',
+    'Pull request jobs, by whether they found their state pre-evaluated.',
+    ['result'])
+
+
+class Speculation(object):
+    """Results of the speculative evaluations of a repository's pull
+    requests.
+
+    Args:
+        size (int): number of states whose results are kept.
+        window (float): time, in seconds, during which a pull request is
+            evaluated after it was last handled.
+        interval (float): minimum time, in seconds, between two checks of
+            the state of a pull request.
+
+    """
+
+    def __init__(self, size=100, window=24 * 3600, interval=600):
+        self.results = Cache(size)
+        self.window = window
+        self.interval = interval
+        # pull requests handled recently, least recent first, with the time
+        # they were handled and checked at, and their last known state
+        self._active = OrderedDict()
+
+    def touch(self, pr_id, key):
+        """Record that a pull request is being handled, in state `key`."""
+        self._active.pop(pr_id, None)
+        now = time.monotonic()
+        self._active[pr_id] = [now, now, key]
+
+    def next_candidate(self):
+        """Return the id of the next pull request to check, the most
+        recently handled first, None if there is none."""
+        now = time.monotonic()
+        for pr_id, (handled, _, _) in list(self._active.items()):
+            if handled < now - self.window:
+                del self._active[pr_id]
+        for pr_id, entry in reversed(self._active.items()):
+            if entry[1] <= now - self.interval:
+                entry[1] = now
+                return pr_id
+        return None
+
+    def check(self, pr_id, key):
+        """Record the state of a pull request.
+
+        Returns:
+            bool: True if the state is new, and is to be evaluated.
+
+        """
+        entry = self._active.get(pr_id)
+        if entry is None:
+            return False
+        if entry[2] == key or self.results.get(key) is not None:
+            return False
+        entry[2] = key
+        return True
+
+    def store(self, key, merges):
+        """Keep the results of the merges evaluated in state `key`."""
+        self.results.set(key, merges)
+        SPECULATIVE_EVALUATIONS.inc()
+
+
+def state_key(job):
+    """Return the state of the job's pull request: the sha of its source
+    branch, and those of the destination branches of its cascade."""
+    names = [job.git.src_branch.name] + [
+        branch.name for branch in job.git.cascade.dst_branches]
+    src, *dst = job.git.repo.cmd(
+        'git rev-parse' + ' %s' * len(names), *names).split()
+    return src, tuple(dst)
+
+
+def reuse(job):
+    """Make the job reuse the pre-evaluated merges of its pull request, if
+    its state was evaluated.
+
+    Must be called once the cascade of the job is built.
+
+    """
+    speculation = getattr(job.bert_e, 'speculation', None)
+    if speculation is None:
+        return
+    key = state_key(job)
+    speculation.touch(job.pull_request.id, key)
+    merges = speculation.results.get(key)
+    SPECULATIVE_RESULTS.inc(result='miss' if merges is None else 'hit')
+    if merges is not None:
+        LOG.debug('Reusing %d merge(s) evaluated for %s', len(merges), key)
+        job.git.repo.merge_results = dict(merges)
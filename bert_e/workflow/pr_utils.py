@@ -12,42 +12,113 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Pull Requests messaging utility functions."""
-import itertools
+import hashlib
 import logging
 
 from bert_e import exceptions
-from bert_e.git_host.base import AbstractComment, AbstractPullRequest
+from bert_e.git_host.base import AbstractPullRequest
 from bert_e.lib.cli import confirm
 
 LOG = logging.getLogger(__name__)
 
 
-def find_comment(pull_request: AbstractPullRequest, username=None,
-                 startswith=None, max_history=None) -> AbstractComment:
-    """Look for the most recent pull request comment satisfying given
-    criteria.
+# first line of the footer of the messages, see templates/message.md
+FOOTER = '*The following options are set:*'
 
-    Args:
-        username: comment's author.
-        starswith: preamble of the comment.
-        max_history: limit of the comment history to look backwards.
 
-    Returns:
-        The latest comment if it was found. None otherwise.
+def _normalize(text):
+    """Return the text of a message without its footer, which lists the
+    active options and may change from a job to the next, and without
+    trailing spaces."""
+    lines = [line.rstrip() for line in text.strip().splitlines()]
+    return '\n'.join(
+        line for line in lines if not line.startswith(FOOTER)).strip()
+
+
+class RobotMessages(object):
+    """Index of the messages the robot posted in a pull request.
+
+    The messages are identified by their title, which is the template's,
+    and a hash of their content, regardless of their footer. The robot's
+    last message is compared with its footer though: a message is posted
+    again when the active options changed. The index is built once from
+    the comments of the pull request, and updated with the messages posted
+    since.
+
+    Args:
+        comments: comments of the pull request.
+        robot (str): username of the robot.
 
     """
-    # check last commits
-    comments = reversed(pull_request.comments)
-    if max_history not in (None, -1):
-        comments = itertools.islice(comments, 0, max_history)
-    for comment in comments:
-        if comment.author != username:
-            continue
-        if startswith and not comment.text.startswith(startswith):
-            if max_history == -1:
-                return
-            continue
-        return comment
+
+    def __init__(self, comments, robot):
+        self.robot = robot
+        # number of comments in the pull request
+        self.count = 0
+        # position of the latest message with each key, and each title
+        self._positions = {}
+        self._titles = {}
+        # hash of the robot's last message, footer included
+        self._last = None
+        for comment in comments:
+            self.add(comment.author, comment.text)
+
+    @staticmethod
+    def key(text):
+        normalized = _normalize(text)
+        return (normalized.split('\n', 1)[0],
+                hashlib.sha1(normalized.encode()).hexdigest())
+
+    @staticmethod
+    def _digest(text):
+        lines = [line.rstrip() for line in text.strip().splitlines()]
+        return hashlib.sha1('\n'.join(lines).encode()).hexdigest()
+
+    def add(self, author, text):
+        """Index a comment posted in the pull request."""
+        position = self.count
+        self.count += 1
+        if author != self.robot:
+            return
+        key = self.key(text)
+        self._positions[key] = position
+        self._titles[key[0]] = position
+        self._last = self._digest(text)
+
+    def find(self, text, max_history=None):
+        """Tell whether the robot already posted a message.
+
+        Args:
+            text (str): the message.
+            max_history (int): only consider the last `max_history` comments
+                if positive, the robot's last message if -1.
+
+        """
+        if max_history == -1:
+            return self._last == self._digest(text)
+        key = self.key(text)
+        position = self._positions.get(key)
+        if position is None:
+            return False
+        return max_history is None or position >= self.count - max_history
+
+    def has_title(self, title):
+        """Tell whether the robot posted a message with this title."""
+        return title in self._titles
+
+    def __bool__(self):
+        return self._last is not None
+
+
+def robot_messages(pull_request: AbstractPullRequest,
+                   robot: str) -> RobotMessages:
+    """Return the index of the robot's messages in a pull request, built
+    on first use from its comments."""
+    index = getattr(pull_request, '_robot_messages', None)
+    if index is None or index.robot != robot:
+        index = RobotMessages(pull_request.comments, robot)
+        pull_request._robot_messages = index
+    return index
 
 
 def _send_comment(settings, pull_request: AbstractPullRequest, msg: str,
@@ -68,9 +139,9 @@ def _send_comment(settings, pull_request: AbstractPullRequest, msg: str,
         LOG.debug('Not sending message (no_comment==True).')
         return
 
+    messages = robot_messages(pull_request, settings.robot)
     if dont_repeat_if_in_history != 0:
-        if find_comment(pull_request, settings.robot, msg,
-                        dont_repeat_if_in_history):
+        if messages.find(msg, dont_repeat_if_in_history):
             raise exceptions.CommentAlreadyExists(
                 "The same comment has already been posted in the history."
             )
@@ -82,6 +153,7 @@ def _send_comment(settings, pull_request: AbstractPullRequest, msg: str,
 
     LOG.debug('SENDING MESSAGE %s', msg)
     pull_request.add_comment(msg)
+    messages.add(settings.robot, msg)
 
 
 def _send_bot_status(settings, pull_request: AbstractPullRequest,